@@ -2,28 +2,52 @@ from __future__ import annotations
 
 import time
 
+from app.common import access
+from app.common import background
+from app.common import cache
+from app.common import invalidation
+from app.common import metrics
+from app.common import profiling
 from app.common import settings
+from app.common.context import ServiceContext
 from app.services import database
 from app.services import osu_api
+from app.services import rate_limit
 from app.services import redis
 from fastapi import FastAPI
+from fastapi import Header
 from fastapi import Request
+from fastapi import Response
+from fastapi.responses import FileResponse
+from prometheus_client import CONTENT_TYPE_LATEST
+from prometheus_client import generate_latest
 from shared_modules import logger
 
 
+def init_background_tasks(api: FastAPI) -> None:
+    @api.on_event("shutdown")
+    async def shutdown_background_tasks() -> None:
+        logger.info("Shutting down background tasks")
+        await background.shutdown()
+        logger.info("Background tasks shut down")
+
+
 def init_db(api: FastAPI) -> None:
     @api.on_event("startup")
     async def startup_db() -> None:
         logger.info("Starting up database pool")
         service_database = database.ServiceDatabase(
-            read_dsn=database.dsn(
-                driver=settings.WRITE_DB_DRIVER,
-                user=settings.READ_DB_USER,
-                password=settings.READ_DB_PASS,
-                host=settings.READ_DB_HOST,
-                port=settings.READ_DB_PORT,
-                database=settings.READ_DB_NAME,
-            ),
+            read_dsns=[
+                database.dsn(
+                    driver=settings.READ_DB_DRIVER,
+                    user=settings.READ_DB_USER,
+                    password=settings.READ_DB_PASS,
+                    host=host,
+                    port=port,
+                    database=settings.READ_DB_NAME,
+                )
+                for host, port in settings.READ_DB_REPLICAS
+            ],
             write_dsn=database.dsn(
                 driver=settings.WRITE_DB_DRIVER,
                 user=settings.WRITE_DB_USER,
@@ -35,6 +59,7 @@ def init_db(api: FastAPI) -> None:
             min_pool_size=settings.MIN_DB_POOL_SIZE,
             max_pool_size=settings.MAX_DB_POOL_SIZE,
             ssl=settings.DB_USE_SSL,
+            read_your_writes_window=settings.DB_READ_YOUR_WRITES_WINDOW,
         )
         await service_database.connect()
         api.state.db = service_database
@@ -80,6 +105,16 @@ def init_osu_api_client(api: FastAPI) -> None:
             password=settings.OSU_API_PASSWORD,
             request_interval=settings.OSU_API_REQUEST_INTERVAL,
             max_requests_per_minute=settings.OSU_API_MAX_REQUESTS_PER_MINUTE,
+            batch_size=settings.OSU_API_BATCH_SIZE,
+            batch_window=settings.OSU_API_BATCH_WINDOW,
+            base_url=settings.OSU_API_BASE_URL,
+            rate_limiter=rate_limit.create(
+                backend=settings.OSU_API_RATE_LIMIT_BACKEND,
+                redis=api.state.redis,
+                key="beatmaps-service:osu-api:rate-limit",
+                rate=settings.OSU_API_MAX_REQUESTS_PER_MINUTE / 60,
+                capacity=settings.OSU_API_RATE_LIMIT_BURST,
+            ),
         )
         api.state.osu_api_client = osu_api_client
         logger.info("osu!api client started up")
@@ -92,16 +127,81 @@ def init_osu_api_client(api: FastAPI) -> None:
         logger.info("osu!api client shut down")
 
 
+def init_access_tracking(api: FastAPI) -> None:
+    @api.on_event("startup")
+    async def startup_access_tracking() -> None:
+        ctx = ServiceContext(db=api.state.db, redis=api.state.redis,
+                             osu_api_client=api.state.osu_api_client)
+        background.spawn(access.flush_periodically(ctx),
+                         name="flush-access-counts")
+
+
+def init_invalidations(api: FastAPI) -> None:
+    @api.on_event("startup")
+    async def startup_invalidations() -> None:
+        ctx = ServiceContext(db=api.state.db, redis=api.state.redis,
+                             osu_api_client=api.state.osu_api_client)
+        background.spawn(invalidation.listen(ctx),
+                         name="listen-for-invalidations")
+
+
+def init_metrics(api: FastAPI) -> None:
+    def db_pool_connections() -> metrics.Samples:
+        if not hasattr(api.state, "db"):
+            return
+        for pool, stats in api.state.db.pool_stats().items():
+            yield [pool, "in_use"], stats["size"] - stats["free"]
+            yield [pool, "idle"], stats["free"]
+
+    def db_pool_max_connections() -> metrics.Samples:
+        if not hasattr(api.state, "db"):
+            return
+        for pool, stats in api.state.db.pool_stats().items():
+            yield [pool], stats["max"]
+
+    def cache_hits() -> metrics.Samples:
+        for namespace, stats in cache.all_stats().items():
+            yield [namespace], stats.hits
+
+    def cache_misses() -> metrics.Samples:
+        for namespace, stats in cache.all_stats().items():
+            yield [namespace], stats.misses
+
+    def l1_cache_size() -> metrics.Samples:
+        stats = cache.local_stats()
+        yield ["entries"], stats["entries"]
+        yield ["bytes"], stats["bytes"]
+
+    def l1_cache_events() -> metrics.Samples:
+        stats = cache.local_stats()
+        for event in ("hits", "misses", "evictions", "expirations", "rejections"):
+            yield [event], stats[event]
+
+    metrics.register_callback("db_pool_connections",
+                              "Database pool connections, by state.",
+                              ["pool", "state"], db_pool_connections)
+    metrics.register_callback("db_pool_max_connections",
+                              "Database pool connection limits.",
+                              ["pool"], db_pool_max_connections)
+    metrics.register_callback("cache_hits",
+                              "Redis cache hits (after l1 misses), by namespace.",
+                              ["namespace"], cache_hits, counter=True)
+    metrics.register_callback("cache_misses",
+                              "Redis cache misses (after l1 misses), by namespace.",
+                              ["namespace"], cache_misses, counter=True)
+    metrics.register_callback("l1_cache_size", "In-process cache size.",
+                              ["unit"], l1_cache_size)
+    metrics.register_callback("l1_cache_events", "In-process cache events.",
+                              ["event"], l1_cache_events, counter=True)
+
+    @api.get("/metrics", include_in_schema=False)
+    async def fetch_metrics() -> Response:
+        return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 def init_middlewares(api: FastAPI) -> None:
     # NOTE: these run bottom to top
 
-    @api.middleware("http")
-    async def add_db_to_request(request: Request, call_next):
-        async with request.app.state.db.connection() as conn:
-            request.state.db = conn
-            response = await call_next(request)
-        return response
-
     @api.middleware("http")
     async def add_redis_to_request(request: Request, call_next):
         request.state.redis = request.app.state.redis
@@ -114,6 +214,21 @@ def init_middlewares(api: FastAPI) -> None:
         response = await call_next(request)
         return response
 
+    @api.middleware("http")
+    async def record_request_metrics(request: Request, call_next):
+        start_time = time.perf_counter()
+        response = await call_next(request)
+
+        # label by route template (e.g. /v1/beatmaps/{beatmap_id}) rather
+        # than by path, to keep the number of series bounded
+        route = request.scope.get("route")
+        metrics.HTTP_REQUEST_DURATION.labels(
+            method=request.method,
+            route=route.path if route is not None else "unmatched",
+            status=response.status_code,
+        ).observe(time.perf_counter() - start_time)
+        return response
+
     @api.middleware("http")
     async def add_process_time_header(request: Request, call_next):
         start_time = time.perf_counter_ns()
@@ -123,6 +238,51 @@ def init_middlewares(api: FastAPI) -> None:
         return response
 
 
+def init_profiling(api: FastAPI) -> None:
+    # when profiling is disabled, don't add the middleware at all
+    if not profiling.enabled():
+        return
+
+    @api.middleware("http")
+    async def profile_request(request: Request, call_next):
+        token = request.headers.get(profiling.HEADER)
+        if not profiling.should_profile(token):
+            return await call_next(request)
+
+        profiler = profiling.start()
+        try:
+            response = await call_next(request)
+        finally:
+            profiler.stop()
+
+        profile_id = await profiling.save(profiler)
+        summary = profiling.summary(profiler)
+        logger.info("Profiled request", method=request.method,
+                    path=request.url.path, profile_id=profile_id,
+                    summary=summary)
+
+        # sampled profiles are only written to the sink
+        if profiling.authorized(token):
+            response.headers["X-Profile-Id"] = profile_id
+            response.headers["X-Profile-Summary"] = summary
+        return response
+
+    @api.get("/profiles/{profile_id}", include_in_schema=False)
+    async def fetch_profile(
+        profile_id: str,
+        token: str | None = Header(None, alias=profiling.HEADER),
+    ) -> Response:
+        if not profiling.authorized(token):
+            return Response(status_code=403)
+
+        path = profiling.path_for(profile_id)
+        if path is None or not path.exists():
+            return Response(status_code=404)
+
+        return FileResponse(path, media_type="application/json",
+                            filename=path.name)
+
+
 def init_routes(api: FastAPI) -> None:
     from .v1 import router as v1_router
 
@@ -132,10 +292,17 @@ def init_routes(api: FastAPI) -> None:
 def init_api():
     api = FastAPI()
 
+    # NOTE: shutdown handlers run in the order they're registered;
+    # background tasks must stop before the services they depend on
+    init_background_tasks(api)
     init_db(api)
     init_redis(api)
     init_osu_api_client(api)
+    init_access_tracking(api)
+    init_invalidations(api)
+    init_metrics(api)
     init_middlewares(api)
+    init_profiling(api)
     init_routes(api)
 
     return api
@@ -1,4 +1,5 @@
 from app.common.context import Context
+from app.common.context import ServiceContext
 from app.services import database
 from app.services import osu_api
 from app.services import redis
@@ -11,7 +12,9 @@ class RequestContext(Context):
 
     @property
     def db(self) -> database.ServiceDatabase:
-        return self.request.state.db
+        # connections are checked out of the pool per query (or transaction),
+        # rather than held for the whole request
+        return self.request.app.state.db
 
     @property
     def redis(self) -> redis.ServiceRedis:
@@ -20,3 +23,9 @@ class RequestContext(Context):
     @property
     def osu_api_client(self) -> osu_api.OsuAPIClient:
         return self.request.state.osu_api_client
+
+    def detached(self) -> Context:
+        # don't keep the request (& it's state) alive past the response
+        return ServiceContext(db=self.request.app.state.db,
+                              redis=self.request.app.state.redis,
+                              osu_api_client=self.request.app.state.osu_api_client)
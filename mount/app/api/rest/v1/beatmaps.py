@@ -1,15 +1,22 @@
+from datetime import datetime
 from typing import Literal
 
 from app.api.rest.context import RequestContext
+from app.common import compression
 from app.common import responses
 from app.common import settings
 from app.common.errors import ServiceError
 from app.common.responses import Success
 from app.models.beatmaps import Beatmap
 from app.models.beatmaps import BeatmapInput
+from app.models.beatmaps import BeatmapLookup
+from app.models.beatmaps import BeatmapLookupInput
+from app.models.beatmaps import BeatmapSearchInput
 from app.usecases import beatmaps
 from fastapi import APIRouter
 from fastapi import Depends
+from fastapi import Header
+from fastapi.responses import StreamingResponse
 
 router = APIRouter()
 
@@ -42,18 +49,81 @@ async def create(args: BeatmapInput, ctx: RequestContext = Depends()):
     if isinstance(data, ServiceError):
         return responses.failure(data, "Failed to create beatmap")
 
-    resp = Beatmap.from_mapping(data)
+    resp = Beatmap.serialize(data)
     return responses.success(resp)
 
 
+@router.post("/v1/beatmaps/lookup", response_model=Success[BeatmapLookup])
+async def lookup(args: BeatmapLookupInput, ctx: RequestContext = Depends()):
+    data = await beatmaps.lookup(ctx, beatmap_ids=args.beatmap_ids,
+                                 md5_hashes=args.md5_hashes)
+    if isinstance(data, ServiceError):
+        return responses.failure(data, "Failed to lookup beatmaps")
+
+    resp = {
+        "beatmaps": {key: Beatmap.serialize(rec) for key, rec in data.items()
+                     if not isinstance(rec, ServiceError)},
+        "errors": {key: rec for key, rec in data.items()
+                   if isinstance(rec, ServiceError)},
+    }
+    return responses.success(resp)
+
+
+@router.get("/v1/beatmaps/search", response_model=Success[list[Beatmap]])
+async def search(args: BeatmapSearchInput = Depends(),
+                 ctx: RequestContext = Depends()):
+    data = await beatmaps.search(ctx, mode=args.mode,
+                                 ranked_status=args.ranked_status,
+                                 status=args.status,
+                                 ranges=args.ranges(),
+                                 sort_by=args.sort_by,
+                                 order=args.order,
+                                 page=args.page,
+                                 page_size=args.page_size)
+    if isinstance(data, ServiceError):
+        return responses.failure(data, "Failed to search beatmaps")
+
+    resp = [Beatmap.serialize(rec) for rec in data]
+    return responses.success(resp)
+
+
+@router.get("/v1/beatmaps/export", response_class=StreamingResponse)
+async def export(updated_since: datetime | None = None,
+                 accept_encoding: str | None = Header(None),
+                 ctx: RequestContext = Depends()):
+    # one beatmap per line; clients should pass X-Export-Watermark as
+    # `updated_since` to their next (incremental) export
+    headers = {}
+    watermark = await beatmaps.export_watermark(ctx)
+    if watermark is not None:
+        headers["X-Export-Watermark"] = watermark.isoformat()
+
+    chunks = beatmaps.export(ctx, updated_since=updated_since)
+    return responses.streamed_ndjson(
+        chunks, Beatmap.serialize,
+        coding=compression.negotiate(accept_encoding),
+        headers=headers,
+    )
+
+
 @router.get("/v1/beatmaps/{beatmap_id}", response_model=Success[Beatmap])
 async def fetch_one(beatmap_id: int, ctx: RequestContext = Depends()):
+    body, generation = await beatmaps.fetch_cached_response(ctx, beatmap_id=beatmap_id)
+    if body is not None:
+        return responses.encoded(body)
+
     data = await beatmaps.fetch_one(ctx, beatmap_id=beatmap_id)
     if isinstance(data, ServiceError):
         return responses.failure(data, "Failed to fetch beatmap")
 
-    resp = Beatmap.from_mapping(data)
-    return responses.success(resp)
+    if beatmaps.is_expired(data):
+        # expired data may be served while it's refreshed in the background
+        resp = Beatmap.serialize(data)
+        return responses.success(resp, headers={"X-Stale": "true"})
+
+    response = responses.success(Beatmap.serialize(data))
+    await beatmaps.cache_response(ctx, data, response.body, generation)
+    return response
 
 
 @router.get("/v1/beatmaps", response_model=Success[list[Beatmap]])
@@ -63,6 +133,9 @@ async def fetch_many(set_id: int | None = None,
                                    'fruits', 'mania'] | None = None,
                      ranked_status: int | None = None,
                      status: str | None = None,
+                     sort_by: Literal["beatmap_id",
+                                      "updated_at"] = "beatmap_id",
+                     cursor: str | None = None,
                      page: int = 1,
                      page_size: int = settings.DEFAULT_PAGE_SIZE,
                      ctx: RequestContext = Depends()):
@@ -71,13 +144,15 @@ async def fetch_many(set_id: int | None = None,
                                      mode=mode,
                                      ranked_status=ranked_status,
                                      status=status,
+                                     sort_by=sort_by,
+                                     cursor=cursor,
                                      page=page,
                                      page_size=page_size)
     if isinstance(data, ServiceError):
         return responses.failure(data, "Failed to fetch beatmaps")
 
-    resp = [Beatmap.from_mapping(rec) for rec in data]
-    return responses.success(resp)
+    resp = [Beatmap.serialize(rec) for rec in data["beatmaps"]]
+    return responses.success(resp, meta={"next_cursor": data["next_cursor"]})
 
 
 # TODO: partial_update
@@ -89,5 +164,5 @@ async def delete(beatmap_id: int, ctx: RequestContext = Depends()):
     if isinstance(data, ServiceError):
         return responses.failure(data, "Failed to delete beatmap")
 
-    resp = Beatmap.from_mapping(data)
+    resp = Beatmap.serialize(data)
     return responses.success(resp)
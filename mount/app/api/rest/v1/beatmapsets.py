@@ -1,4 +1,8 @@
+from datetime import datetime
+from typing import Literal
+
 from app.api.rest.context import RequestContext
+from app.common import compression
 from app.common import responses
 from app.common import settings
 from app.common.errors import ServiceError
@@ -8,6 +12,9 @@ from app.models.beatmapsets import BeatmapsetInput
 from app.usecases import beatmapsets
 from fastapi import APIRouter
 from fastapi import Depends
+from fastapi import Header
+from fastapi import Query
+from fastapi.responses import StreamingResponse
 
 router = APIRouter()
 
@@ -50,18 +57,69 @@ async def create(args: BeatmapsetInput, ctx: RequestContext = Depends()):
     if isinstance(data, ServiceError):
         return responses.failure(data, "Failed to create beatmapset")
 
-    resp = Beatmapset.from_mapping(data)
+    resp = Beatmapset.serialize(data)
     return responses.success(resp)
 
 
+@router.get("/v1/beatmapsets/search", response_model=Success[list[Beatmapset]])
+async def search(query: str = Query(..., min_length=1),
+                 nsfw: bool | None = None,
+                 ranked_status: int | None = None,
+                 mode: Literal['osu', 'taiko',
+                               'fruits', 'mania'] | None = None,
+                 status: str | None = None,
+                 page: int = 1,
+                 page_size: int = settings.DEFAULT_PAGE_SIZE,
+                 ctx: RequestContext = Depends()):
+    data = await beatmapsets.search(ctx, query=query, nsfw=nsfw,
+                                    ranked_status=ranked_status,
+                                    mode=mode, status=status,
+                                    page=page, page_size=page_size)
+    if isinstance(data, ServiceError):
+        return responses.failure(data, "Failed to search beatmapsets")
+
+    resp = [Beatmapset.serialize(rec) for rec in data]
+    return responses.success(resp)
+
+
+@router.get("/v1/beatmapsets/export", response_class=StreamingResponse)
+async def export(updated_since: datetime | None = None,
+                 accept_encoding: str | None = Header(None),
+                 ctx: RequestContext = Depends()):
+    # one beatmapset per line; clients should pass X-Export-Watermark as
+    # `updated_since` to their next (incremental) export
+    headers = {}
+    watermark = await beatmapsets.export_watermark(ctx)
+    if watermark is not None:
+        headers["X-Export-Watermark"] = watermark.isoformat()
+
+    chunks = beatmapsets.export(ctx, updated_since=updated_since)
+    return responses.streamed_ndjson(
+        chunks, Beatmapset.serialize,
+        coding=compression.negotiate(accept_encoding),
+        headers=headers,
+    )
+
+
 @router.get("/v1/beatmapsets/{beatmapset_id}", response_model=Success[Beatmapset])
 async def fetch_one(beatmapset_id: int, ctx: RequestContext = Depends()):
+    body, generation = await beatmapsets.fetch_cached_response(
+        ctx, beatmapset_id=beatmapset_id)
+    if body is not None:
+        return responses.encoded(body)
+
     data = await beatmapsets.fetch_one(ctx, beatmapset_id=beatmapset_id)
     if isinstance(data, ServiceError):
         return responses.failure(data, "Failed to fetch beatmapset")
 
-    resp = Beatmapset.from_mapping(data)
-    return responses.success(resp)
+    if beatmapsets.is_expired(data):
+        # expired data may be served while it's refreshed in the background
+        resp = Beatmapset.serialize(data)
+        return responses.success(resp, headers={"X-Stale": "true"})
+
+    response = responses.success(Beatmapset.serialize(data))
+    await beatmapsets.cache_response(ctx, data, response.body, generation)
+    return response
 
 
 @router.get("/v1/beatmapsets", response_model=Success[list[Beatmapset]])
@@ -71,6 +129,9 @@ async def fetch_many(artist: str | None = None,
                      nsfw: bool | None = None,
                      ranked_status: int | None = None,
                      status: str | None = None,
+                     sort_by: Literal["beatmapset_id",
+                                      "updated_at"] = "beatmapset_id",
+                     cursor: str | None = None,
                      page: int = 1,
                      page_size: int = settings.DEFAULT_PAGE_SIZE,
                      ctx: RequestContext = Depends()):
@@ -78,13 +139,15 @@ async def fetch_many(artist: str | None = None,
                                         title=title, nsfw=nsfw,
                                         ranked_status=ranked_status,
                                         status=status,
+                                        sort_by=sort_by,
+                                        cursor=cursor,
                                         page=page,
                                         page_size=page_size)
     if isinstance(data, ServiceError):
         return responses.failure(data, "Failed to fetch beatmapsets")
 
-    resp = [Beatmapset.from_mapping(rec) for rec in data]
-    return responses.success(resp)
+    resp = [Beatmapset.serialize(rec) for rec in data["beatmapsets"]]
+    return responses.success(resp, meta={"next_cursor": data["next_cursor"]})
 
 
 # TODO: partial_update
@@ -96,5 +159,5 @@ async def delete(beatmapset_id: int, ctx: RequestContext = Depends()):
     if isinstance(data, ServiceError):
         return responses.failure(data, "Failed to delete beatmapset")
 
-    resp = Beatmapset.from_mapping(data)
+    resp = Beatmapset.serialize(data)
     return responses.success(resp)
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+from collections import defaultdict
+
+from aioredis.exceptions import RedisError
+from app.common import settings
+from app.common.context import Context
+from shared_modules import logger
+
+# per-process access counts, periodically flushed into redis sorted sets
+_counts: defaultdict[str, Counter[int]] = defaultdict(Counter)
+
+
+def _key(namespace: str) -> str:
+    return f"beatmaps-service:access:{namespace}"
+
+
+def record(namespace: str, id: int) -> None:
+    _counts[namespace][id] += 1
+
+
+async def flush(ctx: Context) -> None:
+    global _counts
+    counts, _counts = _counts, defaultdict(Counter)
+
+    if not counts:
+        return
+
+    try:
+        async with ctx.redis.pipeline(transaction=False) as pipe:
+            for namespace, namespace_counts in counts.items():
+                for id, count in namespace_counts.items():
+                    pipe.zincrby(_key(namespace), count, id)
+            await pipe.execute()
+    except RedisError as exc:
+        logger.warning("Failed to flush access counts", error=str(exc))
+
+
+async def flush_periodically(ctx: Context) -> None:
+    while True:
+        await asyncio.sleep(settings.ACCESS_FLUSH_INTERVAL)
+        await flush(ctx)
+
+
+async def fetch_most_accessed(ctx: Context, namespace: str, limit: int
+                              ) -> list[int]:
+    ids = await ctx.redis.zrevrange(_key(namespace), 0, limit - 1)
+    return [int(id) for id in ids]
+
+
+async def forget(ctx: Context, namespace: str, *ids: int) -> None:
+    """Stop tracking accesses to ids, e.g. those which no longer exist."""
+    if not ids:
+        return
+
+    await ctx.redis.zrem(_key(namespace), *ids)
+
+
+async def decay(ctx: Context, namespace: str) -> None:
+    """Age out old accesses, and bound the number of tracked ids."""
+    key = _key(namespace)
+    async with ctx.redis.pipeline(transaction=True) as pipe:
+        pipe.zunionstore(key, {key: settings.ACCESS_DECAY})
+        pipe.zremrangebyrank(key, 0, -(settings.ACCESS_MAX_TRACKED + 1))
+        await pipe.execute()
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+from typing import Any
+from typing import Coroutine
+
+from shared_modules import logger
+
+# strong references to running tasks; the event loop only keeps weak ones
+_tasks: set[asyncio.Task[Any]] = set()
+
+
+def _on_done(task: asyncio.Task[Any]) -> None:
+    _tasks.discard(task)
+
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Background task failed", task=task.get_name(),
+                     error=repr(task.exception()))
+
+
+def spawn(coro: Coroutine[Any, Any, Any], name: str | None = None
+          ) -> asyncio.Task[Any]:
+    """Run a coroutine in the background, outside of the current request."""
+    # start from an empty contextvars context, so the task doesn't share
+    # request-scoped state (e.g. the databases library's connections)
+    task = contextvars.Context().run(asyncio.create_task, coro, name=name)
+    _tasks.add(task)
+    task.add_done_callback(_on_done)
+    return task
+
+
+async def shutdown() -> None:
+    """Cancel & await any background tasks which are still running."""
+    for task in list(_tasks):
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any
+from typing import Mapping
+from typing import Sequence
+
+from aioredis.exceptions import RedisError
+from app.common import json
+from app.common import settings
+from app.common.context import Context
+from app.common.local_cache import LocalCache
+from shared_modules import logger
+
+
+class CacheStats:
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def dict(self) -> dict[str, Any]:
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hit_ratio}
+
+
+_stats: dict[str, CacheStats] = {}
+
+
+def stats(namespace: str) -> CacheStats:
+    """\
+    Fetch the redis cache's hit/miss counters for a namespace (per process).
+
+    Only lookups which the in-process (l1) cache missed reach redis, so each
+    lookup is counted once per tier it reached; see `local_stats()`.
+    """
+    namespace_stats = _stats.get(namespace)
+    if namespace_stats is None:
+        namespace_stats = _stats[namespace] = CacheStats()
+    return namespace_stats
+
+
+def all_stats() -> dict[str, CacheStats]:
+    return dict(_stats)
+
+
+# rows are kept in-process in front of redis; writes on any worker evict
+# them everywhere via app.common.invalidation, & they expire regardless
+_local = LocalCache(max_entries=settings.L1_CACHE_MAX_ENTRIES,
+                    max_bytes=settings.L1_CACHE_MAX_BYTES,
+                    ttl=settings.L1_CACHE_TTL,
+                    admission=settings.L1_CACHE_ADMISSION)
+
+
+def local_stats() -> dict[str, Any]:
+    """Fetch the in-process (l1) cache's counters."""
+    return _local.stats()
+
+
+def evict_local(namespace: str, *ids: int) -> None:
+    for id in ids:
+        _local.evict(_key(namespace, id))
+
+
+def clear_local() -> None:
+    _local.clear()
+
+
+def _key(namespace: str, id: int) -> str:
+    return f"beatmaps-service:{namespace}:{id}"
+
+
+def encode_row(row: Mapping[str, Any]) -> bytes:
+    return json.dumps(dict(row))
+
+
+def parse_datetimes(row: dict[str, Any]) -> dict[str, Any]:
+    # datetimes are serialized as iso-8601 strings; all of our
+    # datetime columns follow the `*_at` naming convention
+    for k, v in row.items():
+        if k.endswith("_at") and v is not None:
+            row[k] = datetime.fromisoformat(v)
+    return row
+
+
+def decode_row(data: bytes) -> dict[str, Any]:
+    return parse_datetimes(json.loads(data))
+
+
+async def fetch_one(ctx: Context, namespace: str, id: int
+                    ) -> Mapping[str, Any] | None:
+    key = _key(namespace, id)
+
+    row = _local.get(key)
+    if row is not None:
+        return row
+
+    try:
+        data = await ctx.redis.get(key)
+    except RedisError as exc:
+        logger.warning("Failed to read from cache", namespace=namespace,
+                       id=id, error=str(exc))
+        data = None
+
+    if data is None:
+        stats(namespace).misses += 1
+        return None
+
+    stats(namespace).hits += 1
+    row = decode_row(data)
+    _local.put(key, row, size=len(data))
+    return row
+
+
+async def fetch_many(ctx: Context, namespace: str, ids: Sequence[int]
+                     ) -> dict[int, Mapping[str, Any]]:
+    if not ids:
+        return {}
+
+    rows: dict[int, Mapping[str, Any]] = {}
+    for id in ids:
+        row = _local.get(_key(namespace, id))
+        if row is not None:
+            rows[id] = row
+
+    uncached_ids = [id for id in ids if id not in rows]
+    if not uncached_ids:
+        return rows
+
+    try:
+        values = await ctx.redis.mget([_key(namespace, id)
+                                       for id in uncached_ids])
+    except RedisError as exc:
+        logger.warning("Failed to read from cache", namespace=namespace,
+                       ids=uncached_ids, error=str(exc))
+        values = [None] * len(uncached_ids)
+
+    hits = 0
+    for id, data in zip(uncached_ids, values):
+        if data is not None:
+            rows[id] = decode_row(data)
+            _local.put(_key(namespace, id), rows[id], size=len(data))
+            hits += 1
+
+    namespace_stats = stats(namespace)
+    namespace_stats.hits += hits
+    namespace_stats.misses += len(uncached_ids) - hits
+    return rows
+
+
+async def store(ctx: Context, namespace: str, id: int,
+                row: Mapping[str, Any], ttl: int) -> None:
+    if ttl <= 0:  # caching disabled for this namespace
+        return
+
+    key = _key(namespace, id)
+    data = encode_row(row)
+
+    try:
+        await ctx.redis.set(key, data, ex=ttl)
+    except RedisError as exc:
+        logger.warning("Failed to write to cache", namespace=namespace,
+                       id=id, error=str(exc))
+
+    _local.put(key, row, size=len(data), ttl=ttl)
+
+
+async def store_many(ctx: Context, namespace: str,
+                     rows: Mapping[int, Mapping[str, Any]], ttl: int) -> None:
+    if ttl <= 0 or not rows:
+        return
+
+    encoded = {id: encode_row(row) for id, row in rows.items()}
+
+    try:
+        async with ctx.redis.pipeline(transaction=False) as pipe:
+            for id, data in encoded.items():
+                pipe.set(_key(namespace, id), data, ex=ttl)
+            await pipe.execute()
+    except RedisError as exc:
+        logger.warning("Failed to write to cache", namespace=namespace,
+                       ids=list(rows), error=str(exc))
+
+    for id, row in rows.items():
+        _local.put(_key(namespace, id), row, size=len(encoded[id]), ttl=ttl)
+
+
+async def invalidate(ctx: Context, namespace: str, *ids: int) -> None:
+    if not ids:
+        return
+
+    evict_local(namespace, *ids)
+
+    try:
+        await ctx.redis.delete(*(_key(namespace, id) for id in ids))
+    except RedisError as exc:
+        logger.warning("Failed to invalidate cache", namespace=namespace,
+                       ids=ids, error=str(exc))
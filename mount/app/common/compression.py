@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import zlib
+from typing import Protocol
+
+import zstandard
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# content codings we can produce, most preferred first
+SUPPORTED = ("zstd", "gzip")
+
+
+class Compressor(Protocol):
+    def compress(self, data: bytes) -> bytes:
+        ...
+
+    def flush(self) -> bytes:
+        ...
+
+
+def negotiate(accept_encoding: str | None) -> str | None:
+    """The preferred coding accepted by an Accept-Encoding header, if any."""
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.partition(";")
+        quality = params.replace(" ", "").removeprefix("q=")
+        try:
+            if params and float(quality) <= 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(coding.strip().lower())
+
+    for coding in SUPPORTED:
+        if coding in accepted:
+            return coding
+    return None
+
+
+def compressor(coding: str) -> Compressor:
+    """A streaming compressor for a content coding."""
+    if coding == "gzip":
+        # wbits of 16 + 15 writes a gzip header & trailer
+        return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    if coding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    raise ValueError(f"Unsupported content coding {coding!r}")
@@ -23,3 +23,29 @@ class Context(ABC):
     @abstractmethod
     def osu_api_client(self) -> osu_api.OsuAPIClient:
         ...
+
+    def detached(self) -> Context:
+        """A context which remains usable once the current unit of work ends."""
+        return self
+
+
+class ServiceContext(Context):
+    """A context backed directly by long-lived services (e.g. for background work)."""
+
+    def __init__(self, db: database.ServiceDatabase, redis: redis.ServiceRedis,
+                 osu_api_client: osu_api.OsuAPIClient) -> None:
+        self._db = db
+        self._redis = redis
+        self._osu_api_client = osu_api_client
+
+    @property
+    def db(self) -> database.ServiceDatabase:
+        return self._db
+
+    @property
+    def redis(self) -> redis.ServiceRedis:
+        return self._redis
+
+    @property
+    def osu_api_client(self) -> osu_api.OsuAPIClient:
+        return self._osu_api_client
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import base64
+import binascii
+from datetime import datetime
+from typing import Any
+from typing import Mapping
+from typing import Sequence
+
+from app.common import json
+
+# a cursor marks a position in a keyset-paginated listing, as the
+# (sort column value, primary key) of the last row of the previous page
+
+
+def encode(sort_by: str, after: tuple[Any, int]) -> str:
+    data = json.dumps({"sort": sort_by, "after": list(after)})
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode(cursor: str, sort_by: str) -> tuple[Any, int] | None:
+    """Decode a cursor for the given sort column; None if it's invalid."""
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(data)
+        value, id = payload["after"]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        return None
+
+    # cursors are only valid for the ordering they were created with
+    if payload.get("sort") != sort_by or not isinstance(id, int):
+        return None
+
+    # datetimes are serialized as iso-8601 strings; all of our
+    # datetime columns follow the `*_at` naming convention
+    if sort_by.endswith("_at"):
+        try:
+            value = datetime.fromisoformat(value)
+        except (ValueError, TypeError):
+            return None
+
+    return value, id
+
+
+def next_cursor(rows: Sequence[Mapping[str, Any]], sort_by: str,
+                id_column: str, page_size: int) -> str | None:
+    """The cursor to the page after `rows`; None if it's the last page."""
+    # a short page means we've reached the end
+    if not rows or len(rows) < page_size:
+        return None
+
+    last = rows[-1]
+    return encode(sort_by, (last[sort_by], last[id_column]))
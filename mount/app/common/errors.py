@@ -8,8 +8,11 @@ class ServiceError(str, Enum):
     BEATMAPS_CANNOT_UPDATE = "beatmaps.cannot_update"
     BEATMAPS_CANNOT_DELETE = "beatmaps.cannot_delete"
     BEATMAPS_NOT_FOUND = "beatmaps.not_found"
+    BEATMAPS_TOO_MANY_KEYS = "beatmaps.too_many_keys"
+    BEATMAPS_INVALID_CURSOR = "beatmaps.invalid_cursor"
 
     BEATMAPSETS_CANNOT_CREATE = "beatmapsets.cannot_create"
     BEATMAPSETS_CANNOT_UPDATE = "beatmapsets.cannot_update"
     BEATMAPSETS_CANNOT_DELETE = "beatmapsets.cannot_delete"
     BEATMAPSETS_NOT_FOUND = "beatmapsets.not_found"
+    BEATMAPSETS_INVALID_CURSOR = "beatmapsets.invalid_cursor"
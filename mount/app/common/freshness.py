@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import zlib
+from datetime import datetime
+from datetime import timedelta
+
+from app.common import settings
+from app.models import RankedStatus
+
+
+def _status_ttl(ranked_status: int) -> int:
+    if ranked_status in (RankedStatus.RANKED, RankedStatus.APPROVED,
+                         RankedStatus.LOVED):
+        # effectively immutable upstream
+        return settings.FRESHNESS_TTL_RANKED
+    elif ranked_status == RankedStatus.QUALIFIED:
+        return settings.FRESHNESS_TTL_QUALIFIED
+    elif ranked_status in (RankedStatus.PENDING,
+                           RankedStatus.WORK_IN_PROGRESS):
+        return settings.FRESHNESS_TTL_PENDING
+    elif ranked_status == RankedStatus.GRAVEYARD:
+        return settings.FRESHNESS_TTL_GRAVEYARD
+    else:
+        return settings.FRESHNESS_TTL_DEFAULT
+
+
+def ttl(ranked_status: int, osu_updated_at: datetime | None = None
+        ) -> timedelta:
+    """How long data with the given ranked status should be considered fresh."""
+    seconds = _status_ttl(ranked_status)
+
+    # content which was recently changed upstream is likely to change again
+    if osu_updated_at is not None:
+        since_update = datetime.now() - osu_updated_at
+        if since_update < timedelta(seconds=settings.FRESHNESS_RECENT_UPDATE_WINDOW):
+            seconds = min(seconds, settings.FRESHNESS_TTL_RECENTLY_UPDATED)
+
+    return timedelta(seconds=seconds)
+
+
+def _jitter(key: str) -> float:
+    """A stable pseudo-random fraction in [0, 1) for the key."""
+    return zlib.crc32(key.encode()) / 2**32
+
+
+def expires_at(key: str, updated_at: datetime, ranked_status: int,
+               osu_updated_at: datetime | None = None) -> datetime:
+    # shorten each entity's ttl by a stable, per-key amount so that rows
+    # written together don't all expire (and get refetched) together
+    jitter = 1 - settings.FRESHNESS_JITTER * _jitter(key)
+
+    return updated_at + ttl(ranked_status, osu_updated_at) * jitter
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+from aioredis.exceptions import RedisError
+from app.common import cache
+from app.common import json
+from app.common import response_cache
+from app.common.context import Context
+from shared_modules import logger
+
+# every worker evicts it's in-process copies of rows (& their encoded
+# responses) when any worker publishes that they've been written
+CHANNEL = "beatmaps-service:invalidations"
+
+RECONNECT_INTERVAL = 1.0
+
+
+def _evict_local(namespace: str, ids: list[int]) -> None:
+    cache.evict_local(namespace, *ids)
+    response_cache.evict_local(namespace, *ids)
+
+
+async def publish(ctx: Context, namespace: str, *ids: int) -> None:
+    """Invalidate derived copies of rows which have been written, on all workers."""
+    if not ids:
+        return
+
+    await response_cache.invalidate(ctx, namespace, *ids)
+    cache.evict_local(namespace, *ids)
+
+    message = json.dumps({"namespace": namespace, "ids": list(ids)})
+    try:
+        await ctx.redis.publish(CHANNEL, message)
+    except RedisError as exc:
+        logger.warning("Failed to publish invalidation", namespace=namespace,
+                       ids=ids, error=str(exc))
+
+
+def _handle_message(message: dict[str, Any]) -> None:
+    try:
+        data = json.loads(message["data"])
+        _evict_local(data["namespace"], data["ids"])
+    except (ValueError, KeyError, TypeError) as exc:
+        logger.warning("Received an invalid invalidation message",
+                       message=message, error=repr(exc))
+
+
+async def listen(ctx: Context) -> None:
+    """Evict in-process copies of rows as invalidations are published."""
+    while True:
+        try:
+            async with ctx.redis.pubsub(ignore_subscribe_messages=True) as pubsub:
+                await pubsub.subscribe(CHANNEL)
+
+                # we may have missed invalidations while we weren't subscribed
+                cache.clear_local()
+                response_cache.clear_local()
+
+                async for message in pubsub.listen():
+                    if message is not None and message["type"] == "message":
+                        _handle_message(message)
+        except RedisError as exc:
+            logger.warning("Lost invalidation subscription; reconnecting",
+                           error=str(exc))
+            await asyncio.sleep(RECONNECT_INTERVAL)
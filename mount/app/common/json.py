@@ -1,4 +1,3 @@
-import uuid
 from typing import Any
 
 import orjson
@@ -7,16 +6,11 @@ from pydantic import BaseModel
 
 
 def _default_processor(data: Any) -> Any:
+    # orjson natively handles dicts, lists, datetimes, enums, uuids & such;
+    # this is only called for the types it doesn't know about
     if isinstance(data, BaseModel):
-        return _default_processor(data.dict())
-    elif isinstance(data, dict):
-        return {k: _default_processor(v) for k, v in data.items()}
-    elif isinstance(data, list):
-        return [_default_processor(v) for v in data]
-    elif isinstance(data, uuid.UUID):
-        return str(data)
-    else:
-        return data
+        return data.dict()
+    raise TypeError(f"Type is not JSON serializable: {type(data).__name__}")
 
 
 def dumps(data: Any) -> bytes:
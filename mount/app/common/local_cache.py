@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Any
+
+
+class LocalCache:
+    """\
+    A bounded, per-process LRU cache with expiring entries.
+
+    Entries are bounded both by count & by (caller-estimated) size in bytes.
+    With admission control enabled, a key is only admitted the second time
+    it's stored within the doorkeeper's window, so one-off reads (e.g. from
+    a crawler) don't evict the hot working set.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float,
+                 admission: bool = True) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.admission = admission
+
+        # key -> (monotonic deadline, size, value)
+        self._entries: OrderedDict[str, tuple[float, int, Any]] = OrderedDict()
+        self._bytes = 0
+
+        # keys which have been offered once, but not yet admitted
+        self._doorkeeper: OrderedDict[str, None] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.rejections = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0 and self.ttl > 0
+
+    def get(self, key: str) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        deadline, _, value = entry
+        if time.monotonic() >= deadline:
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: Any, size: int, ttl: float | None = None
+            ) -> None:
+        if not self.enabled:
+            return
+
+        if size > self.max_bytes:
+            self.rejections += 1
+            return
+
+        if self.admission and key not in self._entries:
+            if key not in self._doorkeeper:
+                self._doorkeeper[key] = None
+                if len(self._doorkeeper) > self.max_entries:
+                    self._doorkeeper.popitem(last=False)
+                self.rejections += 1
+                return
+
+            del self._doorkeeper[key]
+
+        ttl = self.ttl if ttl is None else min(self.ttl, ttl)
+
+        self._remove(key)
+        self._entries[key] = (time.monotonic() + ttl, size, value)
+        self._bytes += size
+
+        while (len(self._entries) > self.max_entries or
+               self._bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def evict(self, key: str) -> None:
+        self._remove(key)
+        self._doorkeeper.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._doorkeeper.clear()
+        self._bytes = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def stats(self) -> dict[str, Any]:
+        total = self.hits + self.misses
+        return {"entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "rejections": self.rejections}
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import functools
+import inspect
+import time
+from typing import Any
+from typing import Callable
+from typing import Iterator
+from typing import TypeVar
+
+from prometheus_client import Counter
+from prometheus_client import Histogram
+from prometheus_client.core import CounterMetricFamily
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.core import REGISTRY
+from prometheus_client.registry import Collector
+
+T = TypeVar("T")
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling http requests.",
+    ["method", "route", "status"],
+)
+
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "Time spent in repository methods.",
+    ["repository", "method"],
+)
+
+OSU_API_REQUESTS = Counter(
+    "osu_api_requests_total",
+    "Requests made to the osu!api.",
+    ["endpoint", "status"],
+)
+
+OSU_API_REQUEST_DURATION = Histogram(
+    "osu_api_request_duration_seconds",
+    "Time spent awaiting osu!api responses.",
+    ["endpoint"],
+)
+
+OSU_API_RATE_LIMIT_WAIT = Histogram(
+    "osu_api_rate_limit_wait_seconds",
+    "Time spent waiting on the osu!api rate limiter.",
+    buckets=(0, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+
+
+def instrument_repository(cls: type[T]) -> type[T]:
+    """Time every public async method of a repository class."""
+    for name, method in inspect.getmembers(cls, inspect.iscoroutinefunction):
+        if name.startswith("_"):
+            continue
+
+        histogram = DB_QUERY_DURATION.labels(repository=cls.__name__,
+                                             method=name)
+        setattr(cls, name, _timed(method, histogram))
+
+    return cls
+
+
+def _timed(fn: Callable[..., Any], histogram: Histogram) -> Callable[..., Any]:
+    @functools.wraps(fn)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        start_time = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - start_time)
+
+    return wrapper
+
+
+Samples = Iterator[tuple[list[str], float]]
+
+
+class CallbackCollector(Collector):
+    """Expose values read at scrape time from a callback (e.g. pool sizes)."""
+
+    def __init__(self, name: str, documentation: str, labels: list[str],
+                 callback: Callable[[], Samples],
+                 counter: bool = False) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.callback = callback
+        self.counter = counter
+
+    def collect(self) -> Iterator[GaugeMetricFamily | CounterMetricFamily]:
+        family_cls = CounterMetricFamily if self.counter else GaugeMetricFamily
+        family = family_cls(self.name, self.documentation, labels=self.labels)
+        for label_values, value in self.callback():
+            family.add_metric(label_values, value)
+        yield family
+
+
+_callback_collectors: dict[str, CallbackCollector] = {}
+
+
+def register_callback(name: str, documentation: str, labels: list[str],
+                      callback: Callable[[], Samples],
+                      counter: bool = False) -> CallbackCollector:
+    """Register a callback collector; re-registering a name replaces it's callback."""
+    collector = _callback_collectors.get(name)
+    if collector is not None:
+        collector.callback = callback
+        return collector
+
+    collector = CallbackCollector(name, documentation, labels, callback,
+                                  counter)
+    REGISTRY.register(collector)
+    _callback_collectors[name] = collector
+    return collector
@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+from typing import AsyncIterator
+from typing import Callable
+from typing import Iterable
+from typing import Mapping
+
+from app.common import compression
+from app.common import json
+
+
+async def encode(chunks: AsyncIterator[Iterable[Mapping[str, Any]]],
+                 serialize: Callable[[Mapping[str, Any]], Any],
+                 coding: str | None = None) -> AsyncIterator[bytes]:
+    """Encode chunks of rows as newline-delimited json, optionally compressed."""
+    compressor = compression.compressor(coding) if coding is not None else None
+
+    async for rows in chunks:
+        data = b"".join([json.dumps(serialize(row)) + b"\n" for row in rows])
+        if compressor is not None:
+            # zlib & zstd release the gil; keep the event loop responsive
+            data = await asyncio.to_thread(compressor.compress, data)
+        if data:
+            yield data
+
+    if compressor is not None:
+        yield compressor.flush()
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+from typing import Sequence
+
+from aioredis.exceptions import RedisError
+from app.common import settings
+from app.common.context import Context
+from shared_modules import logger
+
+# rows are pinned (in redis) before they're written, for the read-your-writes
+# window; until it ends, they're read from the primary & not cached, as the
+# next read may come from another request or worker than the write did
+
+
+def _key(namespace: str, id: int) -> str:
+    return f"beatmaps-service:pins:{namespace}:{id}"
+
+
+async def pin(ctx: Context, namespace: str, *ids: int) -> None:
+    """Pin rows which are about to be written to the primary."""
+    if not ids:
+        return
+
+    window = int(settings.DB_READ_YOUR_WRITES_WINDOW * 1000)
+    try:
+        async with ctx.redis.pipeline(transaction=False) as pipe:
+            for id in ids:
+                pipe.set(_key(namespace, id), 1, px=window)
+            await pipe.execute()
+    except RedisError as exc:
+        logger.warning("Failed to pin rows", namespace=namespace, ids=ids,
+                       error=str(exc))
+
+
+async def pinned(ctx: Context, namespace: str, ids: Sequence[int]) -> set[int]:
+    """Fetch which of the rows are pinned to the primary."""
+    if not ids:
+        return set()
+
+    try:
+        values = await ctx.redis.mget([_key(namespace, id) for id in ids])
+    except RedisError as exc:
+        logger.warning("Failed to read pins", namespace=namespace,
+                       ids=ids, error=str(exc))
+        return set()
+
+    return {id for id, value in zip(ids, values) if value is not None}
+
+
+async def is_pinned(ctx: Context, namespace: str, id: int) -> bool:
+    return bool(await pinned(ctx, namespace, [id]))
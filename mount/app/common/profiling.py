@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import asyncio
+import hmac
+import random
+import re
+import time
+import uuid
+from pathlib import Path
+
+from app.common import settings
+from pyinstrument import Profiler
+from pyinstrument.renderers import SpeedscopeRenderer
+
+# requests carrying the profiling token in this header are always profiled
+HEADER = "X-Profile-Token"
+
+PROFILE_ID_PATTERN = re.compile(r"^[0-9]+-[0-9a-f]{12}$")
+
+
+def enabled() -> bool:
+    return bool(settings.PROFILING_TOKEN) or settings.PROFILING_SAMPLE_RATE > 0
+
+
+def authorized(token: str | None) -> bool:
+    if token is None or not settings.PROFILING_TOKEN:
+        return False
+    return hmac.compare_digest(token.encode(), settings.PROFILING_TOKEN.encode())
+
+
+def should_profile(token: str | None) -> bool:
+    return (authorized(token) or
+            random.random() < settings.PROFILING_SAMPLE_RATE)
+
+
+def start() -> Profiler:
+    # async mode attributes time spent awaiting to the awaiting frame,
+    # so time waiting on the db pool or the osu!api shows up
+    profiler = Profiler(interval=settings.PROFILING_INTERVAL,
+                        async_mode="enabled")
+    profiler.start()
+    return profiler
+
+
+def summary(profiler: Profiler) -> str:
+    session = profiler.last_session
+    if session is None:
+        return ""
+    return (f"duration={session.duration * 1000:.2f}ms; "
+            f"cpu={session.cpu_time * 1000:.2f}ms; "
+            f"samples={session.sample_count}")
+
+
+def path_for(profile_id: str) -> Path | None:
+    # profiles are written as speedscope json (https://speedscope.app),
+    # which renders them as flamegraphs
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        return None
+    return Path(settings.PROFILING_SINK_DIR) / f"{profile_id}.speedscope.json"
+
+
+def _write(profiler: Profiler, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(profiler.output(SpeedscopeRenderer()))
+
+
+async def save(profiler: Profiler) -> str:
+    """Write a stopped profiler's session to the sink; returns it's id."""
+    profile_id = f"{int(time.time())}-{uuid.uuid4().hex[:12]}"
+    path = path_for(profile_id)
+    assert path is not None
+
+    # rendering walks the whole call tree; keep it off the event loop
+    await asyncio.to_thread(_write, profiler, path)
+    return profile_id
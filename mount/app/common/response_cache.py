@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import NamedTuple
+
+from aioredis.exceptions import RedisError
+from app.common import settings
+from app.common.context import Context
+from shared_modules import logger
+
+# encoded response bodies, which are served as-is while their data is fresh.
+# entries are kept in a per-process lru (for at most RESPONSE_CACHE_LOCAL_TTL,
+# in case an invalidation from another worker is missed), and optionally in
+# redis (for at most RESPONSE_CACHE_REDIS_TTL)
+
+# key -> (monotonic deadline, body)
+_entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+
+# a body is serialized from data read after a miss, which may be invalidated
+# before the body is stored; so invalidations bump a generation per key, and
+# a body is only stored if it's key's generation is unchanged since the miss.
+# locally, generations are striped over a fixed number of counters, so that
+# they're bounded in size; a collision only skips storing a body.
+GENERATION_STRIPES = 4096
+_generations = [0] * GENERATION_STRIPES
+
+# generations in redis outlive any request which may have read them
+GENERATION_TTL = 3600
+
+# set the body only if the key's generation is unchanged
+_STORE_SCRIPT = """\
+if (redis.call("get", KEYS[2]) or "0") == ARGV[1] then
+    return redis.call("set", KEYS[1], ARGV[2], "PX", ARGV[3])
+else
+    return 0
+end
+"""
+
+
+class Generation(NamedTuple):
+    local: int
+    shared: int  # in redis; 0 unless RESPONSE_CACHE_REDIS
+
+
+def _key(namespace: str, id: int) -> str:
+    return f"beatmaps-service:responses:{namespace}:{id}"
+
+
+def _generation_key(key: str) -> str:
+    return f"{key}:generation"
+
+
+def _stripe(key: str) -> int:
+    return zlib.crc32(key.encode()) % GENERATION_STRIPES
+
+
+def _fetch_local(key: str) -> bytes | None:
+    entry = _entries.get(key)
+    if entry is None:
+        return None
+
+    deadline, body = entry
+    if time.monotonic() >= deadline:
+        del _entries[key]
+        return None
+
+    _entries.move_to_end(key)
+    return body
+
+
+def _store_local(key: str, body: bytes, ttl: float) -> None:
+    _entries[key] = (time.monotonic() + ttl, body)
+    _entries.move_to_end(key)
+
+    while len(_entries) > settings.RESPONSE_CACHE_SIZE:
+        _entries.popitem(last=False)
+
+
+async def fetch(ctx: Context, namespace: str, id: int
+                ) -> tuple[bytes | None, Generation]:
+    """\
+    Fetch a response body, if we have one, along with the key's generation;
+    pass the generation to `store()` when storing a body built after a miss.
+    """
+    key = _key(namespace, id)
+    local_generation = _generations[_stripe(key)]
+
+    body = _fetch_local(key)
+    if body is not None or not settings.RESPONSE_CACHE_REDIS:
+        return body, Generation(local_generation, 0)
+
+    try:
+        async with ctx.redis.pipeline(transaction=False) as pipe:
+            pipe.get(key)
+            pipe.pttl(key)
+            pipe.get(_generation_key(key))
+            body, ttl, shared_generation = await pipe.execute()
+    except RedisError as exc:
+        logger.warning("Failed to read from response cache",
+                       namespace=namespace, id=id, error=str(exc))
+        # an unknown generation; we won't store to redis after this miss
+        return None, Generation(local_generation, -1)
+
+    if (body is not None and ttl > 0 and settings.RESPONSE_CACHE_SIZE > 0 and
+            _generations[_stripe(key)] == local_generation):
+        # never keep it locally past it's expiry in redis
+        _store_local(key, body, min(settings.RESPONSE_CACHE_LOCAL_TTL,
+                                    ttl / 1000))
+
+    return body, Generation(local_generation, int(shared_generation or 0))
+
+
+async def store(ctx: Context, namespace: str, id: int, body: bytes,
+                expires_at: datetime, generation: Generation) -> None:
+    """\
+    Store a response body, to be served until the data's `expires_at`;
+    unless the key was invalidated since it's `generation` was fetched.
+    """
+    ttl = (expires_at - datetime.now()).total_seconds()
+    if ttl <= 0:
+        return
+
+    key = _key(namespace, id)
+
+    if (settings.RESPONSE_CACHE_SIZE > 0 and
+            _generations[_stripe(key)] == generation.local):
+        _store_local(key, body, min(settings.RESPONSE_CACHE_LOCAL_TTL, ttl))
+
+    if settings.RESPONSE_CACHE_REDIS and generation.shared >= 0:
+        ttl = min(settings.RESPONSE_CACHE_REDIS_TTL, ttl)
+        try:
+            await ctx.redis.eval(_STORE_SCRIPT, 2, key, _generation_key(key),
+                                 generation.shared, body, int(ttl * 1000))
+        except RedisError as exc:
+            logger.warning("Failed to write to response cache",
+                           namespace=namespace, id=id, error=str(exc))
+
+
+def evict_local(namespace: str, *ids: int) -> None:
+    for id in ids:
+        key = _key(namespace, id)
+        _entries.pop(key, None)
+        _generations[_stripe(key)] += 1
+
+
+def clear_local() -> None:
+    _entries.clear()
+    for stripe in range(GENERATION_STRIPES):
+        _generations[stripe] += 1
+
+
+async def invalidate(ctx: Context, namespace: str, *ids: int) -> None:
+    if not ids:
+        return
+
+    evict_local(namespace, *ids)
+
+    keys = [_key(namespace, id) for id in ids]
+
+    if settings.RESPONSE_CACHE_REDIS:
+        try:
+            async with ctx.redis.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.incr(_generation_key(key))
+                    pipe.expire(_generation_key(key), GENERATION_TTL)
+                pipe.delete(*keys)
+                await pipe.execute()
+        except RedisError as exc:
+            logger.warning("Failed to invalidate response cache",
+                           namespace=namespace, ids=ids, error=str(exc))
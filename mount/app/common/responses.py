@@ -1,10 +1,17 @@
 from typing import Any
+from typing import AsyncIterator
+from typing import Callable
 from typing import Generic
+from typing import Iterable
 from typing import Literal
+from typing import Mapping
 from typing import TypeVar
 
 from app.common import json
+from app.common import ndjson
 from app.common.errors import ServiceError
+from fastapi import Response
+from fastapi.responses import StreamingResponse
 from pydantic.generics import GenericModel
 
 T = TypeVar("T")
@@ -13,13 +20,37 @@ T = TypeVar("T")
 class Success(GenericModel, Generic[T]):
     status: Literal["success"]
     data: T
+    meta: dict[str, Any] | None = None
 
 
-def success(content: Any, status_code: int = 200, headers: dict | None = None) -> json.ORJSONResponse:
+def success(content: Any, status_code: int = 200, headers: dict | None = None,
+            meta: dict[str, Any] | None = None) -> json.ORJSONResponse:
     data = {"status": "success", "data": content}
+    if meta is not None:
+        data["meta"] = meta
     return json.ORJSONResponse(data, status_code, headers)
 
 
+def encoded(body: bytes, status_code: int = 200, headers: dict | None = None
+            ) -> Response:
+    """Respond with an already-encoded (e.g. cached) response body."""
+    return Response(body, status_code, headers, media_type="application/json")
+
+
+def streamed_ndjson(chunks: AsyncIterator[Iterable[Mapping[str, Any]]],
+                    serialize: Callable[[Mapping[str, Any]], Any],
+                    coding: str | None = None, headers: dict | None = None,
+                    ) -> StreamingResponse:
+    """Stream chunks of rows as newline-delimited json."""
+    headers = {**(headers or {}), "Vary": "Accept-Encoding"}
+    if coding is not None:
+        headers["Content-Encoding"] = coding
+
+    return StreamingResponse(ndjson.encode(chunks, serialize, coding),
+                             headers=headers,
+                             media_type="application/x-ndjson")
+
+
 class ErrorResponse(GenericModel, Generic[T]):
     status: Literal["error"]
     error: T
@@ -21,6 +21,13 @@ READ_DB_HOST = os.environ["READ_DB_HOST"]
 READ_DB_PORT = int(os.environ["READ_DB_PORT"])
 READ_DB_NAME = os.environ["READ_DB_NAME"]
 
+# comma-separated host:port pairs of replicas to balance reads across
+READ_DB_REPLICAS = [
+    (host, int(port)) for host, _, port in (
+        replica.strip().rpartition(":") for replica in os.environ.get(
+            "READ_DB_REPLICAS", f"{READ_DB_HOST}:{READ_DB_PORT}").split(","))
+]
+
 WRITE_DB_DRIVER = os.environ["WRITE_DB_DRIVER"]
 WRITE_DB_USER = os.environ["WRITE_DB_USER"]
 WRITE_DB_PASS = os.environ["WRITE_DB_PASS"]
@@ -32,6 +39,10 @@ MIN_DB_POOL_SIZE = int(os.environ["MIN_DB_POOL_SIZE"])
 MAX_DB_POOL_SIZE = int(os.environ["MAX_DB_POOL_SIZE"])
 DB_USE_SSL = os.environ["DB_USE_SSL"].lower() == "true"
 
+# seconds after a write during which the writer reads from the primary
+DB_READ_YOUR_WRITES_WINDOW = float(
+    os.environ.get("DB_READ_YOUR_WRITES_WINDOW", "5"))
+
 # redis
 REDIS_HOST = os.environ["REDIS_HOST"]
 REDIS_PORT = int(os.environ["REDIS_PORT"])
@@ -45,7 +56,12 @@ AMQP_PASS = os.environ["AMQP_PASS"]
 # pagination
 DEFAULT_PAGE_SIZE = int(os.environ["DEFAULT_PAGE_SIZE"])
 
+# bulk lookups
+BEATMAPS_LOOKUP_MAX_KEYS = int(
+    os.environ.get("BEATMAPS_LOOKUP_MAX_KEYS", "500"))
+
 # osu! api connection
+OSU_API_BASE_URL = os.environ.get("OSU_API_BASE_URL", "https://osu.ppy.sh")
 OSU_API_CLIENT_ID = int(os.environ["OSU_API_CLIENT_ID"])
 OSU_API_CLIENT_SECRET = os.environ["OSU_API_CLIENT_SECRET"]
 OSU_API_SCOPE = os.environ["OSU_API_SCOPE"]
@@ -54,3 +70,84 @@ OSU_API_PASSWORD = os.environ["OSU_API_PASSWORD"]
 OSU_API_REQUEST_INTERVAL = float(os.environ["OSU_API_REQUEST_INTERVAL"])
 OSU_API_MAX_REQUESTS_PER_MINUTE = int(
     os.environ["OSU_API_MAX_REQUESTS_PER_MINUTE"])
+OSU_API_BATCH_SIZE = int(os.environ.get("OSU_API_BATCH_SIZE", "50"))
+OSU_API_BATCH_WINDOW = float(os.environ.get("OSU_API_BATCH_WINDOW", "0.005"))
+
+# "local" limits each process on it's own, "redis" shares the limit across replicas
+OSU_API_RATE_LIMIT_BACKEND = os.environ.get(
+    "OSU_API_RATE_LIMIT_BACKEND", "local")
+OSU_API_RATE_LIMIT_BURST = int(os.environ.get("OSU_API_RATE_LIMIT_BURST", "1"))
+
+# caching (seconds; <= 0 disables caching for the entity)
+BEATMAPS_CACHE_TTL = int(os.environ.get("BEATMAPS_CACHE_TTL", "3600"))
+BEATMAPSETS_CACHE_TTL = int(os.environ.get("BEATMAPSETS_CACHE_TTL", "3600"))
+
+# request coalescing (seconds)
+SINGLEFLIGHT_DISTRIBUTED = os.environ.get(
+    "SINGLEFLIGHT_DISTRIBUTED", "false").lower() == "true"
+SINGLEFLIGHT_LOCK_TIMEOUT = float(
+    os.environ.get("SINGLEFLIGHT_LOCK_TIMEOUT", "60"))
+SINGLEFLIGHT_RESULT_TTL = float(os.environ.get("SINGLEFLIGHT_RESULT_TTL", "5"))
+SINGLEFLIGHT_POLL_INTERVAL = float(
+    os.environ.get("SINGLEFLIGHT_POLL_INTERVAL", "0.05"))
+
+# stale-while-revalidate (seconds served past expiry, at most)
+STALE_WHILE_REVALIDATE = os.environ.get(
+    "STALE_WHILE_REVALIDATE", "true").lower() == "true"
+BEATMAPS_MAX_STALENESS = int(os.environ.get("BEATMAPS_MAX_STALENESS", "86400"))
+BEATMAPSETS_MAX_STALENESS = int(
+    os.environ.get("BEATMAPSETS_MAX_STALENESS", "86400"))
+
+# freshness policy (seconds), by ranked status
+FRESHNESS_TTL_RANKED = int(os.environ.get("FRESHNESS_TTL_RANKED", "2592000"))
+FRESHNESS_TTL_QUALIFIED = int(
+    os.environ.get("FRESHNESS_TTL_QUALIFIED", "3600"))
+FRESHNESS_TTL_PENDING = int(os.environ.get("FRESHNESS_TTL_PENDING", "7200"))
+FRESHNESS_TTL_GRAVEYARD = int(
+    os.environ.get("FRESHNESS_TTL_GRAVEYARD", "604800"))
+FRESHNESS_TTL_DEFAULT = int(os.environ.get("FRESHNESS_TTL_DEFAULT", "86400"))
+FRESHNESS_TTL_RECENTLY_UPDATED = int(
+    os.environ.get("FRESHNESS_TTL_RECENTLY_UPDATED", "3600"))
+FRESHNESS_RECENT_UPDATE_WINDOW = int(
+    os.environ.get("FRESHNESS_RECENT_UPDATE_WINDOW", "604800"))
+FRESHNESS_JITTER = float(os.environ.get("FRESHNESS_JITTER", "0.1"))
+
+# access tracking
+ACCESS_FLUSH_INTERVAL = float(os.environ.get("ACCESS_FLUSH_INTERVAL", "10"))
+ACCESS_DECAY = float(os.environ.get("ACCESS_DECAY", "0.9"))
+ACCESS_MAX_TRACKED = int(os.environ.get("ACCESS_MAX_TRACKED", "100000"))
+
+# proactive refresher
+REFRESHER_INTERVAL = float(os.environ.get("REFRESHER_INTERVAL", "60"))
+REFRESHER_LOOKAHEAD = int(os.environ.get("REFRESHER_LOOKAHEAD", "3600"))
+REFRESHER_CANDIDATES = int(os.environ.get("REFRESHER_CANDIDATES", "2000"))
+REFRESHER_BUDGET_SHARE = float(
+    os.environ.get("REFRESHER_BUDGET_SHARE", "0.25"))
+
+# pre-serialized response bodies
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "10000"))
+RESPONSE_CACHE_LOCAL_TTL = float(
+    os.environ.get("RESPONSE_CACHE_LOCAL_TTL", "60"))
+RESPONSE_CACHE_REDIS = os.environ.get(
+    "RESPONSE_CACHE_REDIS", "false").lower() == "true"
+RESPONSE_CACHE_REDIS_TTL = float(
+    os.environ.get("RESPONSE_CACHE_REDIS_TTL", "300"))
+
+# per-process l1 cache, in front of redis
+L1_CACHE_MAX_ENTRIES = int(os.environ.get("L1_CACHE_MAX_ENTRIES", "50000"))
+L1_CACHE_MAX_BYTES = int(os.environ.get("L1_CACHE_MAX_BYTES", "67108864"))
+L1_CACHE_TTL = float(os.environ.get("L1_CACHE_TTL", "60"))
+L1_CACHE_ADMISSION = os.environ.get(
+    "L1_CACHE_ADMISSION", "true").lower() == "true"
+
+# per-request profiling; requests are profiled if they carry the token,
+# or at random at the sample rate (0 to 1). disabled when neither is set
+PROFILING_TOKEN = os.environ.get("PROFILING_TOKEN", "")
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_INTERVAL = float(os.environ.get("PROFILING_INTERVAL", "0.001"))
+PROFILING_SINK_DIR = os.environ.get("PROFILING_SINK_DIR", "/tmp/profiles")
+
+# catalog exports
+EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", "1000"))
+# seconds the export watermark is set back by; at least the replica lag
+EXPORT_WATERMARK_MARGIN = int(os.environ.get("EXPORT_WATERMARK_MARGIN", "60"))
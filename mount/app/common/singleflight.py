@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import asyncio
+import time
+import uuid
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Mapping
+
+from aioredis.exceptions import RedisError
+from app.common import cache
+from app.common import json
+from app.common import settings
+from app.common.context import Context
+from app.common.errors import ServiceError
+from shared_modules import logger
+
+Result = Mapping[str, Any] | ServiceError
+
+# compare-and-delete, so we never release a lock taken over by someone else
+_RELEASE_LOCK_SCRIPT = """\
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+else
+    return 0
+end
+"""
+
+_inflight: dict[str, asyncio.Task[Result]] = {}
+
+
+def _encode_result(result: Result) -> bytes:
+    if isinstance(result, ServiceError):
+        return json.dumps({"error": result.value})
+    return json.dumps({"data": dict(result)})
+
+
+def _decode_result(data: bytes) -> Result:
+    result = json.loads(data)
+    if "error" in result:
+        return ServiceError(result["error"])
+    return cache.parse_datetimes(result["data"])
+
+
+async def _publish_result(ctx: Context, result_key: str, result: Result
+                          ) -> None:
+    try:
+        await ctx.redis.set(result_key, _encode_result(result),
+                            px=int(settings.SINGLEFLIGHT_RESULT_TTL * 1000))
+    except RedisError as exc:
+        logger.warning("Failed to publish singleflight result",
+                       key=result_key, error=str(exc))
+
+
+def _result_key(key: str, token: str) -> str:
+    # results are keyed by the leader's lock token, so that followers of a
+    # later flight never read the (possibly stale) result of an earlier one
+    return f"beatmaps-service:singleflight:{key}:result:{token}"
+
+
+async def _run_distributed(ctx: Context, key: str,
+                           fn: Callable[[], Awaitable[Result]]) -> Result:
+    lock_key = f"beatmaps-service:singleflight:{key}:lock"
+    lock_timeout = settings.SINGLEFLIGHT_LOCK_TIMEOUT
+    token = uuid.uuid4().hex
+
+    try:
+        acquired = await ctx.redis.set(lock_key, token, nx=True,
+                                       px=int(lock_timeout * 1000))
+    except RedisError as exc:
+        logger.warning("Failed to acquire singleflight lock", key=key,
+                       error=str(exc))
+        return await fn()
+
+    if acquired:
+        try:
+            result = await fn()
+            await _publish_result(ctx, _result_key(key, token), result)
+        finally:
+            try:
+                await ctx.redis.eval(_RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+            except RedisError as exc:
+                logger.warning("Failed to release singleflight lock", key=key,
+                               error=str(exc))
+        return result
+
+    # another replica is fetching; wait for it to publish its result
+    try:
+        leader_token = await ctx.redis.get(lock_key)
+        if leader_token is None:
+            # the leader finished before we could tell who it was
+            return await fn()
+
+        result_key = _result_key(key, leader_token.decode())
+        deadline = time.monotonic() + lock_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(settings.SINGLEFLIGHT_POLL_INTERVAL)
+
+            data = await ctx.redis.get(result_key)
+            if data is not None:
+                return _decode_result(data)
+
+            if await ctx.redis.get(lock_key) != leader_token:
+                # the leader gave up without publishing a result
+                break
+    except RedisError as exc:
+        logger.warning("Failed to await singleflight result", key=key,
+                       error=str(exc))
+
+    return await fn()
+
+
+def in_flight(namespace: str, id: int | str) -> bool:
+    return f"{namespace}:{id}" in _inflight
+
+
+async def run(ctx: Context, namespace: str, id: int | str,
+              fn: Callable[[], Awaitable[Result]]) -> Result:
+    """\
+    Run `fn` at most once at a time per (namespace, id).
+
+    Concurrent callers for the same key await the in-flight call and share its
+    result. With `SINGLEFLIGHT_DISTRIBUTED` enabled, this is extended across
+    processes & replicas using a redis lock & result key.
+    """
+    key = f"{namespace}:{id}"
+
+    task = _inflight.get(key)
+    if task is None:
+        if settings.SINGLEFLIGHT_DISTRIBUTED:
+            task = asyncio.create_task(_run_distributed(ctx, key, fn))
+        else:
+            task = asyncio.create_task(fn())  # type: ignore
+
+        _inflight[key] = task
+
+        def _on_done(_: asyncio.Task[Result]) -> None:
+            if _inflight.get(key) is task:
+                del _inflight[key]
+
+        task.add_done_callback(_on_done)
+
+    # shielded so one caller's cancellation does not cancel the others
+    return await asyncio.shield(task)
@@ -0,0 +1,158 @@
+"""\
+Export the beatmap or beatmapset catalog as newline-delimited json.
+
+Usage: python -m app.export_boot {beatmaps,beatmapsets}
+                                 [--updated-since 2022-01-01T00:00:00]
+                                 [--output beatmaps.ndjson.gz]
+                                 [--compression {gzip,zstd,none}]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime
+from typing import Any
+from typing import AsyncIterator
+from typing import BinaryIO
+from typing import Mapping
+
+from app.common import compression
+from app.common import ndjson
+from app.common import settings
+from app.common.context import Context
+from app.models.beatmaps import Beatmap
+from app.models.beatmapsets import Beatmapset
+from app.services import database
+from app.services import osu_api
+from app.services import redis
+from app.usecases import beatmaps
+from app.usecases import beatmapsets
+from shared_modules import logger
+
+logger.configure_logging(app_env=settings.APP_ENV,
+                         log_level=settings.LOG_LEVEL)
+
+EXPORTS = {
+    "beatmaps": (beatmaps.export, beatmaps.export_watermark, Beatmap.serialize),
+    "beatmapsets": (beatmapsets.export, beatmapsets.export_watermark,
+                    Beatmapset.serialize),
+}
+
+# content coding, by output file suffix
+SUFFIXES = {".gz": "gzip", ".zst": "zstd"}
+
+
+class ExportContext(Context):
+    """A context with only a database; exports don't use redis or the osu!api."""
+
+    def __init__(self, db: database.ServiceDatabase) -> None:
+        self._db = db
+
+    @property
+    def db(self) -> database.ServiceDatabase:
+        return self._db
+
+    @property
+    def redis(self) -> redis.ServiceRedis:
+        raise RuntimeError("Redis is not available to exports")
+
+    @property
+    def osu_api_client(self) -> osu_api.OsuAPIClient:
+        raise RuntimeError("The osu!api is not available to exports")
+
+
+async def export(ctx: Context, entity: str, updated_since: datetime | None,
+                 coding: str | None, output: BinaryIO) -> int:
+    export_fn, _, serialize = EXPORTS[entity]
+
+    rows = 0
+
+    async def counted(chunks: AsyncIterator[list[Mapping[str, Any]]]
+                      ) -> AsyncIterator[list[Mapping[str, Any]]]:
+        nonlocal rows
+        async for chunk in chunks:
+            rows += len(chunk)
+            yield chunk
+
+    chunks = counted(export_fn(ctx, updated_since=updated_since))
+    async for data in ndjson.encode(chunks, serialize, coding):
+        output.write(data)
+
+    return rows
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("entity", choices=EXPORTS)
+    parser.add_argument("--updated-since", type=datetime.fromisoformat,
+                        default=None)
+    parser.add_argument("--output", default="-",
+                        help="path to write to; - for stdout")
+    parser.add_argument("--compression", default=None,
+                        choices=(*compression.SUPPORTED, "none"),
+                        help="defaults to the output file's suffix")
+    args = parser.parse_args()
+
+    coding = args.compression
+    if coding is None:
+        coding = next((coding for suffix, coding in SUFFIXES.items()
+                       if args.output.endswith(suffix)), None)
+    elif coding == "none":
+        coding = None
+
+    async with database.ServiceDatabase(
+        read_dsns=[
+            database.dsn(
+                driver=settings.READ_DB_DRIVER,
+                user=settings.READ_DB_USER,
+                password=settings.READ_DB_PASS,
+                host=host,
+                port=port,
+                database=settings.READ_DB_NAME,
+            )
+            for host, port in settings.READ_DB_REPLICAS
+        ],
+        write_dsn=database.dsn(
+            driver=settings.WRITE_DB_DRIVER,
+            user=settings.WRITE_DB_USER,
+            password=settings.WRITE_DB_PASS,
+            host=settings.WRITE_DB_HOST,
+            port=settings.WRITE_DB_PORT,
+            database=settings.WRITE_DB_NAME,
+        ),
+        min_pool_size=settings.MIN_DB_POOL_SIZE,
+        max_pool_size=settings.MAX_DB_POOL_SIZE,
+        ssl=settings.DB_USE_SSL,
+        read_your_writes_window=settings.DB_READ_YOUR_WRITES_WINDOW,
+    ) as db:
+        ctx = ExportContext(db)
+
+        _, watermark_fn, _ = EXPORTS[args.entity]
+        watermark = await watermark_fn(ctx)
+        start_time = time.perf_counter()
+
+        if args.output == "-":
+            rows = await export(ctx, args.entity, args.updated_since, coding,
+                                sys.stdout.buffer)
+            sys.stdout.buffer.flush()
+        else:
+            with open(args.output, "wb") as output:
+                rows = await export(ctx, args.entity, args.updated_since,
+                                    coding, output)
+
+    # logs go to stdout; don't interleave them with the export itself
+    if args.output != "-":
+        logger.info("Export complete", entity=args.entity, rows=rows,
+                    output=args.output, compression=coding,
+                    elapsed=time.perf_counter() - start_time,
+                    # pass as --updated-since to the next export
+                    watermark=(watermark.isoformat()
+                               if watermark is not None else None))
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(main()))
@@ -3,10 +3,12 @@ from __future__ import annotations
 from enum import Enum
 from enum import IntEnum
 from typing import Any
+from typing import Callable
 from typing import Mapping
 from typing import TypeVar
 
 from pydantic import BaseModel as _pydantic_BaseModel
+from pydantic.fields import SHAPE_SINGLETON
 
 
 class Status(str, Enum):
@@ -27,6 +29,24 @@ class RankedStatus(IntEnum):
 
 T = TypeVar('T', bound=type['BaseModel'])
 
+# per-model (field name, cast) pairs used when serializing trusted rows;
+# mysql hands us tinyints for booleans, and may hand us ints for floats.
+# strings are stripped, as `anystr_strip_whitespace` would during validation
+_row_casts: dict[type, list[tuple[str, Callable[[Any], Any] | None]]] = {}
+_casts: dict[type, Callable[[Any], Any]] = {bool: bool, float: float,
+                                            str: str.strip}
+
+
+def _casts_for(model: type[BaseModel]) -> list[tuple[str, Callable[[Any], Any] | None]]:
+    casts = _row_casts.get(model)
+    if casts is None:
+        casts = _row_casts[model] = [
+            (name, _casts.get(field.type_)
+             if field.shape == SHAPE_SINGLETON else None)
+            for name, field in model.__fields__.items()
+        ]
+    return casts
+
 
 class BaseModel(_pydantic_BaseModel):
     class Config:
@@ -35,3 +55,18 @@ class BaseModel(_pydantic_BaseModel):
     @classmethod
     def from_mapping(cls: T, mapping: Mapping[str, Any]) -> T:
         return cls(**{k: mapping[k] for k in cls.__fields__})
+
+    @classmethod
+    def serialize(cls, mapping: Mapping[str, Any]) -> dict[str, Any]:
+        """\
+        Shape a trusted mapping (e.g. a database row) for a response.
+
+        Unlike `from_mapping`, this builds no model & performs no validation;
+        only booleans & floats are cast, and strings stripped. Use it for data
+        we've stored ourselves.
+        """
+        data = {}
+        for k, cast in _casts_for(cls):
+            v = mapping[k]
+            data[k] = v if cast is None or v is None else cast(v)
+        return data
@@ -1,6 +1,8 @@
 from datetime import datetime
 from typing import Literal
 
+from app.common import settings
+from app.common.errors import ServiceError
 from app.models import BaseModel
 from app.models import RankedStatus
 from app.models import Status
@@ -60,6 +62,67 @@ class Beatmap(BaseModel):
     updated_at: datetime
 
 
+class BeatmapLookupInput(BaseModel):
+    beatmap_ids: list[int] = []
+    md5_hashes: list[str] = []
+
+
+class BeatmapLookup(BaseModel):
+    beatmaps: dict[str, Beatmap]  # keyed by the requested id or md5 hash
+    errors: dict[str, ServiceError]
+
+
+# attributes which searches may filter by (inclusive) range, & sort by;
+# each is indexed for searches (see the beatmaps search index migration)
+SEARCH_RANGE_ATTRIBUTES = (
+    "difficulty_rating", "bpm", "ar", "od", "cs", "hp", "hit_length",
+    "total_length", "count_circles", "count_sliders", "count_spinners",
+)
+SearchSortColumn = Literal["beatmap_id", "difficulty_rating", "bpm",
+                           "hit_length", "total_length", "play_count",
+                           "pass_count"]
+
+
+class BeatmapSearchInput(BaseModel):
+    mode: Literal['osu', 'taiko', 'fruits', 'mania'] | None = None
+    ranked_status: int | None = None
+    status: str | None = None
+
+    # inclusive bounds
+    min_difficulty_rating: float | None = None
+    max_difficulty_rating: float | None = None
+    min_bpm: float | None = None
+    max_bpm: float | None = None
+    min_ar: float | None = None
+    max_ar: float | None = None
+    min_od: float | None = None
+    max_od: float | None = None
+    min_cs: float | None = None
+    max_cs: float | None = None
+    min_hp: float | None = None
+    max_hp: float | None = None
+    min_hit_length: int | None = None
+    max_hit_length: int | None = None
+    min_total_length: int | None = None
+    max_total_length: int | None = None
+    min_count_circles: int | None = None
+    max_count_circles: int | None = None
+    min_count_sliders: int | None = None
+    max_count_sliders: int | None = None
+    min_count_spinners: int | None = None
+    max_count_spinners: int | None = None
+
+    sort_by: SearchSortColumn = "beatmap_id"
+    order: Literal["asc", "desc"] = "asc"
+
+    page: int = 1
+    page_size: int = settings.DEFAULT_PAGE_SIZE
+
+    def ranges(self) -> dict[str, tuple[float | None, float | None]]:
+        return {attr: (getattr(self, f"min_{attr}"), getattr(self, f"max_{attr}"))
+                for attr in SEARCH_RANGE_ATTRIBUTES}
+
+
 # TODO: think more about whether we want our initial impl to support custom maps
 class BeatmapUpdate(BaseModel):
     ...
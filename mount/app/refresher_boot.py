@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import asyncio
+
+from app.common import settings
+from app.common.context import ServiceContext
+from app.services import database
+from app.services import osu_api
+from app.services import rate_limit
+from app.services import redis
+from app.workers import refresher
+from shared_modules import logger
+
+logger.configure_logging(app_env=settings.APP_ENV,
+                         log_level=settings.LOG_LEVEL)
+
+
+async def main() -> None:
+    if settings.OSU_API_RATE_LIMIT_BACKEND != "redis":
+        # with a per-process bucket, the refresher's requests would come on
+        # top of every api process' own, and could exceed our upstream quota
+        logger.error("The refresher requires OSU_API_RATE_LIMIT_BACKEND=redis",
+                     backend=settings.OSU_API_RATE_LIMIT_BACKEND)
+        raise SystemExit(1)
+
+    async with (
+        database.ServiceDatabase(
+            read_dsns=[
+                database.dsn(
+                    driver=settings.READ_DB_DRIVER,
+                    user=settings.READ_DB_USER,
+                    password=settings.READ_DB_PASS,
+                    host=host,
+                    port=port,
+                    database=settings.READ_DB_NAME,
+                )
+                for host, port in settings.READ_DB_REPLICAS
+            ],
+            write_dsn=database.dsn(
+                driver=settings.WRITE_DB_DRIVER,
+                user=settings.WRITE_DB_USER,
+                password=settings.WRITE_DB_PASS,
+                host=settings.WRITE_DB_HOST,
+                port=settings.WRITE_DB_PORT,
+                database=settings.WRITE_DB_NAME,
+            ),
+            min_pool_size=settings.MIN_DB_POOL_SIZE,
+            max_pool_size=settings.MAX_DB_POOL_SIZE,
+            ssl=settings.DB_USE_SSL,
+            read_your_writes_window=settings.DB_READ_YOUR_WRITES_WINDOW,
+        ) as db,
+        redis.ServiceRedis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+        ) as service_redis,
+        osu_api.OsuAPIClient(
+            client_id=settings.OSU_API_CLIENT_ID,
+            client_secret=settings.OSU_API_CLIENT_SECRET,
+            scope=settings.OSU_API_SCOPE,
+            username=settings.OSU_API_USERNAME,
+            password=settings.OSU_API_PASSWORD,
+            request_interval=settings.OSU_API_REQUEST_INTERVAL,
+            max_requests_per_minute=settings.OSU_API_MAX_REQUESTS_PER_MINUTE,
+            batch_size=settings.OSU_API_BATCH_SIZE,
+            batch_window=settings.OSU_API_BATCH_WINDOW,
+            base_url=settings.OSU_API_BASE_URL,
+            rate_limiter=rate_limit.create(
+                backend=settings.OSU_API_RATE_LIMIT_BACKEND,
+                redis=service_redis,
+                key="beatmaps-service:osu-api:rate-limit",
+                rate=settings.OSU_API_MAX_REQUESTS_PER_MINUTE / 60,
+                capacity=settings.OSU_API_RATE_LIMIT_BURST,
+            ),
+        ) as osu_api_client,
+    ):
+        ctx = ServiceContext(db=db, redis=service_redis,
+                             osu_api_client=osu_api_client)
+
+        logger.info("Starting refresher")
+        await refresher.run(ctx)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
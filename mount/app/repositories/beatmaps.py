@@ -1,10 +1,18 @@
+from datetime import datetime
 from typing import Any
+from typing import get_args
 from typing import Mapping
+from typing import Sequence
 
+from app.common import metrics
 from app.common import settings
 from app.common.context import Context
+from app.models.beatmaps import SEARCH_RANGE_ATTRIBUTES
+from app.models.beatmaps import SearchSortColumn
+from app.repositories.query import WhereClause
 
 
+@metrics.instrument_repository
 class BeatmapsRepo:
     # https://osu.ppy.sh/docs/index.html#beatmapcompact
     # https://osu.ppy.sh/docs/index.html#beatmap
@@ -17,6 +25,13 @@ class BeatmapsRepo:
         version, mapper_id, ranked_status, status, created_at, updated_at
     """
 
+    # columns which listings may be ordered (& keyset paginated) by
+    SORT_COLUMNS = ("beatmap_id", "updated_at")
+
+    # columns which searches may filter by range & sort by
+    RANGE_COLUMNS = SEARCH_RANGE_ATTRIBUTES
+    SEARCH_SORT_COLUMNS = get_args(SearchSortColumn)
+
     def __init__(self, ctx: Context) -> None:
         self.ctx = ctx
 
@@ -33,15 +48,17 @@ class BeatmapsRepo:
                 beatmap_id, md5_hash, set_id, mode, `convert`, od, ar, cs, hp,
                 bpm, hit_length, total_length, count_circles, count_sliders,
                 count_spinners, difficulty_rating, is_scoreable, pass_count,
-                play_count, version, mapper_id, ranked_status, status
+                play_count, version, mapper_id, ranked_status, status,
+                created_at, updated_at
             ) VALUES (
                 :beatmap_id, :md5_hash, :set_id, :mode, :convert, :od, :ar,
                 :cs, :hp, :bpm, :hit_length, :total_length, :count_circles,
                 :count_sliders, :count_spinners, :difficulty_rating,
                 :is_scoreable, :pass_count, :play_count, :version, :mapper_id,
-                :ranked_status, :status
+                :ranked_status, :status, :created_at, :updated_at
             )
         """
+        now = datetime.now().replace(microsecond=0)
         params = {
             "beatmap_id": beatmap_id,
             "md5_hash": md5_hash,
@@ -66,9 +83,101 @@ class BeatmapsRepo:
             "mapper_id": mapper_id,
             "ranked_status": ranked_status,
             "status": status,
+            "created_at": now,
+            "updated_at": now,
         }
         await self.ctx.db.execute(query, params)
 
+        # the written params are the row; no need to read it back
+        return params
+
+    async def upsert(self, beatmap_id: int, md5_hash: str, set_id: int,
+                     convert: bool, mode: str, od: float, ar: float, cs: float,
+                     hp: float, bpm: float, hit_length: int, total_length: int,
+                     count_circles: int, count_sliders: int, count_spinners: int,
+                     difficulty_rating: float, is_scoreable: bool, pass_count: int,
+                     play_count: int, version: str, mapper_id: int,
+                     ranked_status: int, status: str,
+                     created_at: datetime | None = None,
+                     ) -> Mapping[str, Any]:
+        beatmaps = await self.upsert_many([{
+            "beatmap_id": beatmap_id,
+            "md5_hash": md5_hash,
+            "set_id": set_id,
+            "mode": mode,
+            "convert": convert,
+            "od": od,
+            "ar": ar,
+            "cs": cs,
+            "hp": hp,
+            "bpm": bpm,
+            "hit_length": hit_length,
+            "total_length": total_length,
+            "count_circles": count_circles,
+            "count_sliders": count_sliders,
+            "count_spinners": count_spinners,
+            "difficulty_rating": difficulty_rating,
+            "is_scoreable": is_scoreable,
+            "pass_count": pass_count,
+            "play_count": play_count,
+            "version": version,
+            "mapper_id": mapper_id,
+            "ranked_status": ranked_status,
+            "status": status,
+            "created_at": created_at,
+        }])
+        return beatmaps[0]
+
+    async def upsert_many(self, beatmaps: Sequence[Mapping[str, Any]]
+                          ) -> list[Mapping[str, Any]]:
+        """\
+        Insert, or refresh existing, beatmaps using a single statement.
+
+        A refreshed row keeps it's stored `created_at`; callers refreshing a
+        row they hold pass it's `created_at` along, so that what's returned
+        matches what's stored without reading it back. Rows without one are
+        assumed to be new.
+        """
+        if not beatmaps:
+            return []
+
+        columns = (
+            "beatmap_id", "md5_hash", "set_id", "mode", "convert", "od", "ar",
+            "cs", "hp", "bpm", "hit_length", "total_length", "count_circles",
+            "count_sliders", "count_spinners", "difficulty_rating",
+            "is_scoreable", "pass_count", "play_count", "version", "mapper_id",
+            "ranked_status", "status", "created_at", "updated_at",
+        )
+
+        now = datetime.now().replace(microsecond=0)
+        written = [{**beatmap,
+                    "created_at": beatmap.get("created_at") or now,
+                    "updated_at": now}
+                   for beatmap in beatmaps]
+
+        params: dict[str, Any] = {}
+        rows: list[str] = []
+        for i, beatmap in enumerate(written):
+            params.update({f"{col}_{i}": beatmap[col] for col in columns})
+            rows.append(f"({', '.join(f':{col}_{i}' for col in columns)})")
+
+        query = f"""\
+            INSERT INTO beatmaps ({", ".join(f"`{col}`" for col in columns)})
+                 VALUES {", ".join(rows)}
+                     ON DUPLICATE KEY UPDATE
+                        {", ".join(f"`{col}` = VALUES(`{col}`)"
+                                   for col in columns
+                                   if col not in ("beatmap_id", "created_at"))}
+        """
+        await self.ctx.db.execute(query, params)
+        return written
+
+    async def fetch_last_updated_at(self) -> datetime | None:
+        query = "SELECT MAX(updated_at) FROM beatmaps"
+        last_updated_at = await self.ctx.db.fetch_val(query)
+        return last_updated_at
+
+    async def fetch_one(self, beatmap_id: int) -> Mapping[str, Any] | None:
         query = f"""\
             SELECT {self.READ_PARAMS}
               FROM beatmaps
@@ -78,41 +187,133 @@ class BeatmapsRepo:
         beatmap = await self.ctx.db.fetch_one(query, params)
         return beatmap
 
-    async def fetch_one(self, beatmap_id: int) -> Mapping[str, Any] | None:
+    async def fetch_many_by_ids(self, beatmap_ids: Sequence[int]
+                                ) -> list[Mapping[str, Any]]:
+        if not beatmap_ids:
+            return []
+
+        params = {f"beatmap_id_{i}": beatmap_id
+                  for i, beatmap_id in enumerate(beatmap_ids)}
         query = f"""\
             SELECT {self.READ_PARAMS}
               FROM beatmaps
-             WHERE beatmap_id = :beatmap_id
+             WHERE beatmap_id IN ({", ".join(f":{k}" for k in params)})
         """
-        params = {"beatmap_id": beatmap_id}
-        beatmap = await self.ctx.db.fetch_one(query, params)
-        return beatmap
+        beatmaps = await self.ctx.db.fetch_all(query, params)
+        return beatmaps
+
+    async def fetch_many_by_md5s(self, md5_hashes: Sequence[str]
+                                 ) -> list[Mapping[str, Any]]:
+        if not md5_hashes:
+            return []
+
+        params = {f"md5_hash_{i}": md5_hash
+                  for i, md5_hash in enumerate(md5_hashes)}
+        query = f"""\
+            SELECT {self.READ_PARAMS}
+              FROM beatmaps
+             WHERE md5_hash IN ({", ".join(f":{k}" for k in params)})
+        """
+        beatmaps = await self.ctx.db.fetch_all(query, params)
+        return beatmaps
 
     async def fetch_many(self, set_id: int | None = None,
                          md5_hash: str | None = None,
                          mode: str | None = None,
                          ranked_status: int | None = None,
                          status: str | None = None,
+                         updated_since: datetime | None = None,
+                         sort_by: str = "beatmap_id",
+                         after: tuple[Any, int] | None = None,
                          page: int = 1,
                          page_size: int = settings.DEFAULT_PAGE_SIZE,
                          ) -> list[Mapping[str, Any]]:
+        if sort_by not in self.SORT_COLUMNS:
+            raise ValueError(f"Cannot sort beatmaps by {sort_by!r}")
+
+        where = (WhereClause()
+                 .equals("set_id", set_id)
+                 .equals("md5_hash", md5_hash)
+                 .equals("mode", mode)
+                 .equals("ranked_status", ranked_status)
+                 .equals("status", status))
+
+        if updated_since is not None:
+            where.add("updated_at >= :updated_since",
+                      updated_since=updated_since)
+
+        # the primary key breaks ties, so the order is total
+        order_by = "beatmap_id" if sort_by == "beatmap_id" else f"{sort_by}, beatmap_id"
+
+        params: dict[str, Any] = {"limit": page_size}
+
+        if after is not None:
+            # keyset pagination; seek directly past the previous page
+            if sort_by == "beatmap_id":
+                where.add("beatmap_id > :after_id", after_id=after[1])
+            else:
+                where.add(f"({sort_by} > :after_value OR "
+                          f"({sort_by} = :after_value AND beatmap_id > :after_id))",
+                          after_value=after[0], after_id=after[1])
+            offset_clause = ""
+        else:
+            offset_clause = "OFFSET :offset"
+            params["offset"] = (page - 1) * page_size
+
         query = f"""\
             SELECT {self.READ_PARAMS}
               FROM beatmaps
-             WHERE set_id = COALESCE(:set_id, set_id)
-               AND md5_hash = COALESCE(:md5_hash, md5_hash)
-               AND mode = COALESCE(:mode, mode)
-               AND ranked_status = COALESCE(:ranked_status, ranked_status)
-               AND status = COALESCE(:status, status)
+             {where}
+             ORDER BY {order_by}
+             LIMIT :limit
+            {offset_clause}
+        """
+        params.update(where.params)
+        beatmaps = await self.ctx.db.fetch_all(query, params)
+        return beatmaps
+
+    async def search(self, mode: str | None = None,
+                     ranked_status: int | None = None,
+                     status: str | None = None,
+                     ranges: Mapping[str, tuple[Any, Any]] | None = None,
+                     sort_by: str = "beatmap_id",
+                     order: str = "asc",
+                     page: int = 1,
+                     page_size: int = settings.DEFAULT_PAGE_SIZE,
+                     ) -> list[Mapping[str, Any]]:
+        """Search beatmaps by (inclusive) ranges over their attributes."""
+        if ranges is None:
+            ranges = {}
+
+        if sort_by not in self.SEARCH_SORT_COLUMNS:
+            raise ValueError(f"Cannot sort beatmaps by {sort_by!r}")
+        if order not in ("asc", "desc"):
+            raise ValueError(f"Invalid sort order {order!r}")
+
+        where = (WhereClause()
+                 .equals("mode", mode)
+                 .equals("ranked_status", ranked_status)
+                 .equals("status", status))
+
+        for column, (min, max) in ranges.items():
+            if column not in self.RANGE_COLUMNS:
+                raise ValueError(f"Cannot filter beatmaps by {column!r}")
+            where.between(column, min, max)
+
+        # the primary key breaks ties, so the order is total
+        order_by = (f"beatmap_id {order}" if sort_by == "beatmap_id"
+                    else f"{sort_by} {order}, beatmap_id {order}")
+
+        query = f"""\
+            SELECT {self.READ_PARAMS}
+              FROM beatmaps
+             {where}
+             ORDER BY {order_by}
              LIMIT :limit
             OFFSET :offset
         """
         params = {
-            "set_id": set_id,
-            "md5_hash": md5_hash,
-            "mode": mode,
-            "ranked_status": ranked_status,
-            "status": status,
+            **where.params,
             "limit": page_size,
             "offset": (page - 1) * page_size,
         }
@@ -121,39 +322,26 @@ class BeatmapsRepo:
 
     # TODO: fetch_count for pagination metadata?
 
-    async def partial_update(self, beatmap_id: int, **kwargs: Any
-                             ) -> Mapping[str, Any] | None:
+    async def partial_update(self, beatmap: Mapping[str, Any], **kwargs: Any
+                             ) -> Mapping[str, Any]:
+        """Update fields of a beatmap the caller holds, & return it updated."""
         # TODO: use null coalescence to update fields
+        updates = {**kwargs,
+                   "updated_at": datetime.now().replace(microsecond=0)}
         query = f"""\
             UPDATE beatmaps
-               SET {", ".join(f"{k} = :{k}" for k in kwargs)}
+               SET {", ".join(f"{k} = :{k}" for k in updates)}
              WHERE beatmap_id = :beatmap_id
         """
-        params = {"beatmap_id": beatmap_id, **kwargs}
+        params = {"beatmap_id": beatmap["beatmap_id"], **updates}
         await self.ctx.db.execute(query, params)
 
-        query = f"""\
-            SELECT {self.READ_PARAMS}
-              FROM beatmaps
-             WHERE beatmap_id = :beatmap_id
-        """
-        params = {"beatmap_id": beatmap_id}
-        beatmap = await self.ctx.db.fetch_one(query, params)
-        return beatmap
+        return {**beatmap, **updates}
 
-    async def delete(self, beatmap_id: int) -> Mapping[str, Any] | None:
+    async def delete(self, beatmap_id: int) -> None:
         query = """\
             DELETE FROM beatmaps
                   WHERE beatmap_id = :beatmap_id
         """
         params = {"beatmap_id": beatmap_id}
         await self.ctx.db.execute(query, params)
-
-        query = f"""\
-            SELECT {self.READ_PARAMS}
-              FROM beatmaps
-             WHERE beatmap_id = :beatmap_id
-        """
-        params = {"beatmap_id": beatmap_id}
-        beatmap = await self.ctx.db.fetch_one(query, params)
-        return beatmap
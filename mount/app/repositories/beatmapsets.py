@@ -1,12 +1,16 @@
 from datetime import datetime
 from typing import Any
 from typing import Mapping
+from typing import Sequence
 
 from app.common import json
+from app.common import metrics
 from app.common import settings
 from app.common.context import Context
+from app.repositories.query import WhereClause
 
 
+@metrics.instrument_repository
 class BeatmapsetsRepo:
     # https://osu.ppy.sh/docs/index.html#beatmapsetcompact
     # https://osu.ppy.sh/docs/index.html#beatmapset
@@ -21,6 +25,12 @@ class BeatmapsetsRepo:
         tags, status, created_at, updated_at
     """
 
+    # columns covered by the fulltext index; MATCH must name exactly these
+    SEARCH_PARAMS = "artist, artist_unicode, title, title_unicode, source, tags, creator"
+
+    # columns which listings may be ordered (& keyset paginated) by
+    SORT_COLUMNS = ("beatmapset_id", "updated_at")
+
     def __init__(self, ctx: Context) -> None:
         self.ctx = ctx
 
@@ -47,7 +57,7 @@ class BeatmapsetsRepo:
                 discussion_locked, current_hype, required_hype, is_scoreable,
                 legacy_thread_url, current_nominations, required_nominations,
                 ranked_status, storyboard, tags, osu_submitted_at,
-                osu_updated_at, osu_ranked_at, status
+                osu_updated_at, osu_ranked_at, status, created_at, updated_at
             ) VALUES (
                 :beatmapset_id, :artist, :artist_unicode, :covers, :creator,
                 :favourite_count, :nsfw, :osu_play_count, :preview_url, :source,
@@ -57,9 +67,93 @@ class BeatmapsetsRepo:
                 :required_hype, :is_scoreable, :legacy_thread_url,
                 :current_nominations, :required_nominations, :ranked_status,
                 :storyboard, :tags, :osu_submitted_at, :osu_updated_at,
-                :osu_ranked_at, :status
+                :osu_ranked_at, :status, :created_at, :updated_at
             )
         """
+        now = datetime.now().replace(microsecond=0)
+        params = {
+            "beatmapset_id": beatmapset_id,
+            "artist": artist,
+            "artist_unicode": artist_unicode,
+            "covers": json.dumps(covers).decode(),
+            "creator": creator,
+            "favourite_count": favourite_count,
+            "nsfw": nsfw,
+            "osu_play_count": osu_play_count,
+            "preview_url": preview_url,
+            "source": source,
+            "title": title,
+            "title_unicode": title_unicode,
+            "mapper_id": mapper_id,
+            "mapper_name": mapper_name,
+            "video": video,
+            "download_disabled": download_disabled,
+            "availability_information": availability_information,
+            "bpm": bpm,
+            "can_be_hyped": can_be_hyped,
+            "discussion_locked": discussion_locked,
+            "current_hype": current_hype,
+            "required_hype": required_hype,
+            "is_scoreable": is_scoreable,
+            "legacy_thread_url": legacy_thread_url,
+            "current_nominations": current_nominations,
+            "required_nominations": required_nominations,
+            "ranked_status": ranked_status,
+            "storyboard": storyboard,
+            "tags": tags,
+            "osu_submitted_at": osu_submitted_at,
+            "osu_updated_at": osu_updated_at,
+            "osu_ranked_at": osu_ranked_at,
+            "status": status,
+            "created_at": now,
+            "updated_at": now,
+        }
+        await self.ctx.db.execute(query, params)
+
+        # the written params are the row; no need to read it back
+        return {**params, "covers": covers}
+
+    async def upsert(self, beatmapset_id: int, artist: str, artist_unicode: str,
+                     covers: dict[str, Any], creator: str, favourite_count: int,
+                     nsfw: bool, osu_play_count: int, preview_url: str,
+                     source: str, title: str, title_unicode: str,
+                     mapper_id: int, mapper_name: str, video: bool, download_disabled: bool,
+                     availability_information: str | None, bpm: float,
+                     can_be_hyped: bool, discussion_locked: bool,
+                     current_hype: int, required_hype: int, is_scoreable: bool,
+                     legacy_thread_url: str,
+                     current_nominations: int, required_nominations: int,
+                     ranked_status: int, storyboard: bool, tags: str,
+                     osu_submitted_at: datetime, osu_updated_at: datetime,
+                     osu_ranked_at: datetime | None, status: str,
+                     created_at: datetime | None = None,
+                     ) -> Mapping[str, Any]:
+        """\
+        Insert, or refresh an existing, beatmapset using a single statement.
+
+        A refreshed row keeps it's stored `created_at`, which callers holding
+        the row pass along; without one, the row is assumed to be new.
+        """
+        columns = (
+            "beatmapset_id", "artist", "artist_unicode", "covers", "creator",
+            "favourite_count", "nsfw", "osu_play_count", "preview_url",
+            "source", "title", "title_unicode", "mapper_id", "mapper_name",
+            "video", "download_disabled", "availability_information", "bpm",
+            "can_be_hyped", "discussion_locked", "current_hype",
+            "required_hype", "is_scoreable", "legacy_thread_url",
+            "current_nominations", "required_nominations", "ranked_status",
+            "storyboard", "tags", "osu_submitted_at", "osu_updated_at",
+            "osu_ranked_at", "status", "created_at", "updated_at",
+        )
+        query = f"""\
+            INSERT INTO beatmapsets ({", ".join(columns)})
+                 VALUES ({", ".join(f":{col}" for col in columns)})
+                     ON DUPLICATE KEY UPDATE
+                        {", ".join(f"{col} = VALUES({col})"
+                                   for col in columns
+                                   if col not in ("beatmapset_id", "created_at"))}
+        """
+        now = datetime.now().replace(microsecond=0)
         params = {
             "beatmapset_id": beatmapset_id,
             "artist": artist,
@@ -94,9 +188,19 @@ class BeatmapsetsRepo:
             "osu_updated_at": osu_updated_at,
             "osu_ranked_at": osu_ranked_at,
             "status": status,
+            "created_at": created_at or now,
+            "updated_at": now,
         }
         await self.ctx.db.execute(query, params)
 
+        return {**params, "covers": covers}
+
+    async def fetch_last_updated_at(self) -> datetime | None:
+        query = "SELECT MAX(updated_at) FROM beatmapsets"
+        last_updated_at = await self.ctx.db.fetch_val(query)
+        return last_updated_at
+
+    async def fetch_one(self, beatmapset_id: int) -> Mapping[str, Any] | None:
         query = f"""\
             SELECT {self.READ_PARAMS}
               FROM beatmapsets
@@ -106,15 +210,20 @@ class BeatmapsetsRepo:
         beatmapset = await self.ctx.db.fetch_one(query, params)
         return beatmapset
 
-    async def fetch_one(self, beatmapset_id: int) -> Mapping[str, Any] | None:
+    async def fetch_many_by_ids(self, beatmapset_ids: Sequence[int]
+                                ) -> list[Mapping[str, Any]]:
+        if not beatmapset_ids:
+            return []
+
+        params = {f"beatmapset_id_{i}": beatmapset_id
+                  for i, beatmapset_id in enumerate(beatmapset_ids)}
         query = f"""\
             SELECT {self.READ_PARAMS}
               FROM beatmapsets
-             WHERE beatmapset_id = :beatmapset_id
+             WHERE beatmapset_id IN ({", ".join(f":{k}" for k in params)})
         """
-        params = {"beatmapset_id": beatmapset_id}
-        beatmapset = await self.ctx.db.fetch_one(query, params)
-        return beatmapset
+        beatmapsets = await self.ctx.db.fetch_all(query, params)
+        return beatmapsets
 
     async def fetch_many(self, artist: str | None = None,
                          creator: str | None = None,
@@ -122,28 +231,93 @@ class BeatmapsetsRepo:
                          nsfw: bool | None = None,
                          ranked_status: int | None = None,
                          status: str | None = None,
+                         updated_since: datetime | None = None,
+                         sort_by: str = "beatmapset_id",
+                         after: tuple[Any, int] | None = None,
                          page: int = 1,
                          page_size: int = settings.DEFAULT_PAGE_SIZE,
                          ) -> list[Mapping[str, Any]]:
+        if sort_by not in self.SORT_COLUMNS:
+            raise ValueError(f"Cannot sort beatmapsets by {sort_by!r}")
+
+        where = (WhereClause()
+                 .equals("artist", artist)
+                 .equals("creator", creator)
+                 .equals("title", title)
+                 .equals("nsfw", nsfw)
+                 .equals("ranked_status", ranked_status)
+                 .equals("status", status))
+
+        if updated_since is not None:
+            where.add("updated_at >= :updated_since",
+                      updated_since=updated_since)
+
+        # the primary key breaks ties, so the order is total
+        order_by = "beatmapset_id" if sort_by == "beatmapset_id" else f"{sort_by}, beatmapset_id"
+
+        params: dict[str, Any] = {"limit": page_size}
+
+        if after is not None:
+            # keyset pagination; seek directly past the previous page
+            if sort_by == "beatmapset_id":
+                where.add("beatmapset_id > :after_id", after_id=after[1])
+            else:
+                where.add(f"({sort_by} > :after_value OR "
+                          f"({sort_by} = :after_value AND beatmapset_id > :after_id))",
+                          after_value=after[0], after_id=after[1])
+            offset_clause = ""
+        else:
+            offset_clause = "OFFSET :offset"
+            params["offset"] = (page - 1) * page_size
+
         query = f"""\
             SELECT {self.READ_PARAMS}
               FROM beatmapsets
-             WHERE artist = COALESCE(:artist, artist)
-               AND creator = COALESCE(:creator, creator)
-               AND title = COALESCE(:title, title)
-               AND nsfw = COALESCE(:nsfw, nsfw)
-               AND ranked_status = COALESCE(:ranked_status, ranked_status)
-               AND status = COALESCE(:status, status)
+             {where}
+             ORDER BY {order_by}
+             LIMIT :limit
+            {offset_clause}
+        """
+        params.update(where.params)
+        beatmapsets = await self.ctx.db.fetch_all(query, params)
+        return beatmapsets
+
+    async def search(self, text: str,
+                     nsfw: bool | None = None,
+                     ranked_status: int | None = None,
+                     mode: str | None = None,
+                     status: str | None = None,
+                     page: int = 1,
+                     page_size: int = settings.DEFAULT_PAGE_SIZE,
+                     ) -> list[Mapping[str, Any]]:
+        """Full-text search beatmapsets, ordered by relevance."""
+        match = f"MATCH ({self.SEARCH_PARAMS}) AGAINST (:text IN NATURAL LANGUAGE MODE)"
+
+        where = (WhereClause()
+                 .add(match, text=text)
+                 .equals("nsfw", nsfw)
+                 .equals("ranked_status", ranked_status)
+                 .equals("status", status))
+
+        if mode is not None:
+            # a set matches if any of it's difficulties are of the mode
+            where.add("""EXISTS (
+                SELECT 1
+                  FROM beatmaps
+                 WHERE beatmaps.set_id = beatmapsets.beatmapset_id
+                   AND beatmaps.mode = :mode
+             )""", mode=mode)
+
+        query = f"""\
+            SELECT {self.READ_PARAMS}
+              FROM beatmapsets
+             {where}
+             ORDER BY {match} DESC, beatmapset_id
              LIMIT :limit
             OFFSET :offset
         """
         params = {
-            "artist": artist,
-            "creator": creator,
-            "title": title,
-            "nsfw": nsfw,
-            "ranked_status": ranked_status,
-            "status": status,
+            **where.params,
             "limit": page_size,
             "offset": (page - 1) * page_size,
         }
@@ -152,39 +326,26 @@ class BeatmapsetsRepo:
 
     # TODO: fetch_count for pagination metadata?
 
-    async def partial_update(self, beatmapset_id: int, **kwargs: Any
-                             ) -> Mapping[str, Any] | None:
+    async def partial_update(self, beatmapset: Mapping[str, Any], **kwargs: Any
+                             ) -> Mapping[str, Any]:
+        """Update fields of a beatmapset the caller holds, & return it updated."""
         # TODO: use null coalescence to update fields
+        updates = {**kwargs,
+                   "updated_at": datetime.now().replace(microsecond=0)}
         query = f"""\
             UPDATE beatmapsets
-               SET {", ".join(f"{k} = :{k}" for k in kwargs)}
+               SET {", ".join(f"{k} = :{k}" for k in updates)}
              WHERE beatmapset_id = :beatmapset_id
         """
-        params = {"beatmapset_id": beatmapset_id, **kwargs}
+        params = {"beatmapset_id": beatmapset["beatmapset_id"], **updates}
         await self.ctx.db.execute(query, params)
 
-        query = f"""\
-            SELECT {self.READ_PARAMS}
-              FROM beatmapsets
-             WHERE beatmapset_id = :beatmapset_id
-        """
-        params = {"beatmapset_id": beatmapset_id}
-        beatmapset = await self.ctx.db.fetch_one(query, params)
-        return beatmapset
+        return {**beatmapset, **updates}
 
-    async def delete(self, beatmapset_id: int) -> Mapping[str, Any] | None:
+    async def delete(self, beatmapset_id: int) -> None:
         query = """\
             DELETE FROM beatmapsets
                   WHERE beatmapset_id = :beatmapset_id
         """
         params = {"beatmapset_id": beatmapset_id}
         await self.ctx.db.execute(query, params)
-
-        query = f"""\
-            SELECT {self.READ_PARAMS}
-              FROM beatmapsets
-             WHERE beatmapset_id = :beatmapset_id
-        """
-        params = {"beatmapset_id": beatmapset_id}
-        beatmapset = await self.ctx.db.fetch_one(query, params)
-        return beatmapset
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from typing import Any
+
+
+class WhereClause:
+    """\
+    Build a WHERE clause from only the predicates which apply.
+
+    Optional filters are skipped entirely when they're None, rather than
+    being written as `col = COALESCE(:col, col)`, which mysql can't use
+    an index for.
+    """
+
+    def __init__(self) -> None:
+        self.predicates: list[str] = []
+        self.params: dict[str, Any] = {}
+
+    def add(self, predicate: str, **params: Any) -> WhereClause:
+        self.predicates.append(predicate)
+        self.params.update(params)
+        return self
+
+    def equals(self, column: str, value: Any) -> WhereClause:
+        if value is not None:
+            self.add(f"{column} = :{column}", **{column: value})
+        return self
+
+    def between(self, column: str, min: Any, max: Any) -> WhereClause:
+        """Filter on an inclusive range; either bound may be omitted."""
+        if min is not None:
+            self.add(f"{column} >= :min_{column}", **{f"min_{column}": min})
+        if max is not None:
+            self.add(f"{column} <= :max_{column}", **{f"max_{column}": max})
+        return self
+
+    def __str__(self) -> str:
+        if not self.predicates:
+            return ""
+        return "WHERE " + "\n   AND ".join(self.predicates)
@@ -1,8 +1,17 @@
 from __future__ import annotations
 
+import contextvars
+import itertools
+import time
+from contextlib import asynccontextmanager
+from contextlib import contextmanager
+from contextvars import ContextVar
 from types import TracebackType
 from typing import Any
+from typing import AsyncIterator
+from typing import Iterator
 from typing import Mapping
+from typing import Sequence
 from typing import Type
 
 from aiomysql.cursors import DeserializationCursor
@@ -27,18 +36,54 @@ def dsn(
     return f"{driver}://{user}:{password}@{host}:{port}/{database}"
 
 
+# reads are routed to the primary while the current task (& any tasks it
+# creates) has written recently; this gives read-your-writes semantics to
+# the caller, despite replication lag. writes made by other requests are
+# pinned per row (see app.common.pins), and read from the primary explicitly
+# with `primary_reads()`. within a transaction, all queries are sent over
+# the transaction's connection
+_transaction_connection: ContextVar[Connection | None] = ContextVar(
+    "transaction_connection", default=None)
+_primary_reads: ContextVar[bool] = ContextVar("primary_reads", default=False)
+_pinned_until: ContextVar[float] = ContextVar("pinned_until", default=0.0)
+
+
+def _raw_pool_stats(pool: Database) -> dict[str, int] | None:
+    """\
+    The size, free & max connections of the aiomysql pool underlying a pool;
+    None if it's not connected, or it's internals aren't laid out as expected.
+    """
+    # neither databases nor it's backends expose these, so we reach into
+    # their internals; an upgrade changing them must not break /metrics
+    try:
+        raw_pool = pool._backend._pool  # type: ignore
+        if raw_pool is None:
+            return None
+
+        return {"size": int(raw_pool.size),
+                "free": int(raw_pool.freesize),
+                "max": int(raw_pool.maxsize)}
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
 class ServiceDatabase:
-    def __init__(self, read_dsn: str, write_dsn: str,
+    def __init__(self, read_dsns: Sequence[str], write_dsn: str,
                  min_pool_size: int, max_pool_size: int,
-                 ssl: bool) -> None:
-        self.read_pool = _create_pool(read_dsn,
-                                      min_pool_size,
-                                      max_pool_size,
-                                      ssl)
+                 ssl: bool, read_your_writes_window: float = 5.0) -> None:
+        self.read_pools = [_create_pool(read_dsn,
+                                        min_pool_size,
+                                        max_pool_size,
+                                        ssl)
+                           for read_dsn in read_dsns]
         self.write_pool = _create_pool(write_dsn,
                                        min_pool_size,
                                        max_pool_size,
                                        ssl)
+        self.read_your_writes_window = read_your_writes_window
+
+        # balance reads across replicas, round-robin
+        self._next_read_pool = itertools.cycle(self.read_pools)
 
     async def __aenter__(self) -> ServiceDatabase:
         await self.connect()
@@ -49,36 +94,101 @@ class ServiceDatabase:
                         traceback:  TracebackType | None) -> None:
         await self.disconnect()
 
-    def connection(self) -> Connection:
-        return self.read_pool.connection()
+    def _pin_to_primary(self) -> None:
+        _pinned_until.set(time.monotonic() + self.read_your_writes_window)
+
+    def _read_connection(self) -> Connection:
+        connection = _transaction_connection.get()
+        if connection is not None:
+            return connection
 
-    def transaction(self) -> Transaction:
-        return self.write_pool.transaction()
+        if _primary_reads.get() or time.monotonic() < _pinned_until.get():
+            return self.write_pool.connection()
+        return next(self._next_read_pool).connection()
+
+    def _write_connection(self) -> Connection:
+        connection = _transaction_connection.get()
+        if connection is not None:
+            return connection
+        return self.write_pool.connection()
+
+    def connection(self) -> Connection:
+        return self._read_connection()
+
+    @contextmanager
+    def primary_reads(self) -> Iterator[None]:
+        """Route the reads made within the block to the primary."""
+        token = _primary_reads.set(True)
+        try:
+            yield
+        finally:
+            _primary_reads.reset(token)
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[Transaction]:
+        """\
+        Run the queries made within the block in a transaction on the primary.
+
+        `Database.transaction()` may begin it on another connection than the
+        one our queries are sent over (e.g. when the context already holds
+        one), so a connection is acquired for the transaction explicitly.
+        """
+        connection = _transaction_connection.get()
+        if connection is None:
+            # acquired outside of the current context, so it's not shared
+            # with any connection the context (or it's parent) already holds
+            connection = contextvars.Context().run(self.write_pool.connection)
+
+        token = _transaction_connection.set(connection)
+        try:
+            async with connection:
+                async with connection.transaction() as transaction:
+                    yield transaction
+        finally:
+            _transaction_connection.reset(token)
+            self._pin_to_primary()
 
     async def connect(self) -> None:
-        await self.read_pool.connect()
+        for read_pool in self.read_pools:
+            await read_pool.connect()
         await self.write_pool.connect()
 
     async def disconnect(self) -> None:
-        await self.read_pool.disconnect()
+        for read_pool in self.read_pools:
+            await read_pool.disconnect()
         await self.write_pool.disconnect()
 
+    def pool_stats(self) -> dict[str, dict[str, int]]:
+        """The size, free & max connections of each pool, by pool name."""
+        pools = {"primary": self.write_pool}
+        for i, read_pool in enumerate(self.read_pools):
+            pools[f"replica-{i}"] = read_pool
+
+        stats = {}
+        for name, pool in pools.items():
+            pool_stats = _raw_pool_stats(pool)
+            if pool_stats is not None:
+                stats[name] = pool_stats
+        return stats
+
     async def fetch_one(self, query: str, values: dict | None = None) -> Mapping[str, Any] | None:
-        async with self.read_pool.connection() as connection:
+        async with self._read_connection() as connection:
             return await connection.fetch_one(query, values)  # type: ignore
 
     async def fetch_all(self, query: str, values: dict | None = None) -> list[Mapping[str, Any]]:
-        async with self.read_pool.connection() as connection:
+        async with self._read_connection() as connection:
             return await connection.fetch_all(query, values)  # type: ignore
 
     async def fetch_val(self, query: str, values: dict | None = None) -> Any:
-        async with self.read_pool.connection() as connection:
+        async with self._read_connection() as connection:
             return await connection.fetch_val(query, values)  # type: ignore
 
     async def execute(self, query: str, values: dict | None = None) -> Any:
-        async with self.write_pool.connection() as connection:
+        self._pin_to_primary()
+        async with self._write_connection() as connection:
             return await connection.execute(query, values)  # type: ignore
 
     async def execute_many(self, query: str, values: list) -> None:
-        async with self.write_pool.connection() as connection:
+        self._pin_to_primary()
+        async with self._write_connection() as connection:
             return await connection.execute_many(query, values)
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import asyncio
+import re
 import time
 from types import TracebackType
 from typing import Any
@@ -8,6 +9,11 @@ from typing import Literal
 from typing import Sequence
 
 import httpx
+from app.common import metrics
+from app.common.batching import MicroBatcher
+from app.services.rate_limit import LocalTokenBucket
+from app.services.rate_limit import RateLimiter
+from shared_modules import logger
 
 
 class OsuAPIRequestError(Exception):
@@ -21,6 +27,12 @@ class OsuAPIRequestError(Exception):
             f"(message={self.message!r}, status_code={self.status_code!r})"
 
 
+def _endpoint(url: str) -> str:
+    # e.g. /api/v2/beatmaps/123 -> /api/v2/beatmaps/{id}
+    path = httpx.URL(url).path
+    return re.sub(r"/\d+", "/{id}", path)
+
+
 class OsuAPIClient:
     def __init__(
         self,
@@ -31,6 +43,11 @@ class OsuAPIClient:
         password: str,
         request_interval: float = 1.0,
         max_requests_per_minute: int = 60,
+        batch_size: int = 50,
+        batch_window: float = 0.005,
+        rate_limiter: RateLimiter | None = None,
+        base_url: str = "https://osu.ppy.sh",
+        transport: httpx.AsyncBaseTransport | None = None,
     ) -> None:
         self.client_id = client_id
         self.client_secret = client_secret
@@ -40,15 +57,25 @@ class OsuAPIClient:
         self.password = password
 
         self.request_interval_time = request_interval
-        self._last_request_time = 0.0
 
         self.max_requests_per_minute = max_requests_per_minute
-        self._requests_this_minute = 0
-        self._minute_start_time = 0.0
-
-        self._http_client = httpx.AsyncClient()
+        if rate_limiter is None:
+            rate_limiter = LocalTokenBucket(rate=max_requests_per_minute / 60,
+                                            capacity=1)
+        self.rate_limiter = rate_limiter
+
+        # the transport may be swapped out, e.g. to run against a simulator
+        self._http_client = httpx.AsyncClient(base_url=base_url,
+                                              transport=transport)
         self._auth_data = {"token": None, "timeout": 0}
 
+        # the osu!api accepts at most 50 ids per /beatmaps request
+        self._beatmaps_batcher: MicroBatcher[int, dict[str, Any]] = MicroBatcher(
+            batch_fn=self._get_beatmaps_by_id,
+            max_batch_size=min(batch_size, 50),
+            max_wait=batch_window,
+        )
+
     async def close(self) -> None:
         await self._http_client.aclose()
 
@@ -66,7 +93,7 @@ class OsuAPIClient:
     async def authorize(self) -> None:
         """Request authorization from the osu!api."""
         response = await self._http_client.post(
-            url=f"https://osu.ppy.sh/oauth/token",
+            url="/oauth/token",
             headers={"User-Agent": "osu!"},
             data={
                 "username": self.username,
@@ -78,7 +105,10 @@ class OsuAPIClient:
             },
         )
         if response.status_code != 200:
-            raise Exception("Failed to authorize with osu!api.")
+            raise OsuAPIRequestError(
+                message="Failed to authorize with osu!api.",
+                status_code=response.status_code,
+            )
 
         response_data = response.json()
 
@@ -104,20 +134,11 @@ class OsuAPIClient:
         headers: dict[str, Any] | None = None,
     ) -> Any:
         """Perform a request to the osu!api."""
-        time_since_last_minute_start = time.time() - self._minute_start_time
-        if time_since_last_minute_start > 60:
-            # minute is over - reset
-            self._minute_start_time = time.time()
-            self._requests_this_minute = 0
-        else:
-            # validate per/min request count
-            if self._requests_this_minute > self.max_requests_per_minute:
-                await asyncio.sleep(60 - time_since_last_minute_start)
-
-        time_since_last_request = time.time() - self._last_request_time
-
-        if time_since_last_request < self.request_interval_time:
-            await asyncio.sleep(self.request_interval_time - time_since_last_request)
+        wait_time = await self.rate_limiter.acquire()
+        metrics.OSU_API_RATE_LIMIT_WAIT.observe(wait_time)
+        if wait_time > 0:
+            logger.debug("Waited for osu!api rate limit",
+                         url=url, wait_time=wait_time)
 
         if time.time() > self._auth_data["timeout"]:
             await self.authorize()
@@ -128,16 +149,25 @@ class OsuAPIClient:
 
         headers["Authorization"] = f"Bearer {self._auth_data['access_token']}"
 
-        response = await self._http_client.request(
-            method,
-            url,
-            params=params,
-            headers=headers,
-            follow_redirects=True,
-        )
+        endpoint = _endpoint(url)
+        start_time = time.perf_counter()
+        try:
+            response = await self._http_client.request(
+                method,
+                url,
+                params=params,
+                headers=headers,
+                follow_redirects=True,
+            )
+        except httpx.HTTPError:
+            metrics.OSU_API_REQUESTS.labels(endpoint, "error").inc()
+            raise
+        finally:
+            metrics.OSU_API_REQUEST_DURATION.labels(endpoint).observe(
+                time.perf_counter() - start_time)
 
-        self._last_request_time = time.time()
-        self._requests_this_minute += 1
+        metrics.OSU_API_REQUESTS.labels(
+            endpoint, str(response.status_code)).inc()
 
         if response.status_code != 200:
             raise OsuAPIRequestError(
@@ -163,22 +193,50 @@ class OsuAPIClient:
 
     async def get_beatmapset(self, id: int) -> dict[str, Any]:
         """Fetch a beatmap set's metadata from it's id."""
-        url = f"https://osu.ppy.sh/api/v2/beatmapsets/{id}"
+        url = f"/api/v2/beatmapsets/{id}"
         return await self.request("GET", url)
 
     async def get_beatmap(self, id: int) -> dict[str, Any]:
         """Fetch a beatmap's metadata from it's id."""
-        url = f"https://osu.ppy.sh/api/v2/beatmaps/{id}"
+        url = f"/api/v2/beatmaps/{id}"
         return await self.request("GET", url)
 
+    async def lookup_beatmap(self, checksum: str) -> dict[str, Any]:
+        """Fetch a beatmap's metadata from it's md5 checksum."""
+        url = "/api/v2/beatmaps/lookup"
+        params = {"checksum": checksum}
+        return await self.request("GET", url, params)
+
     async def get_beatmaps(self, ids: Sequence[int]) -> list[dict[str, Any]]:
         """Fetch beatmaps' metadata from their ids."""
-        url = f"https://osu.ppy.sh/api/v2/beatmaps"
+        url = "/api/v2/beatmaps"
         params = {"ids[]": [str(id) for id in ids]}
         return (await self.request("GET", url, params))["beatmaps"]
 
+    async def _get_beatmaps_by_id(self, ids: Sequence[int]) -> dict[int, dict[str, Any]]:
+        # a failed batch is raised to every waiter on it; they each expect
+        # an OsuAPIRequestError, rather than the transport's exceptions
+        try:
+            beatmaps = await self.get_beatmaps(ids)
+        except httpx.HTTPError as exc:
+            raise OsuAPIRequestError(
+                message=f"Request failed: {exc!r}",
+                status_code=502,  # no response; treated as a bad gateway
+            ) from exc
+
+        return {beatmap["id"]: beatmap for beatmap in beatmaps}
+
+    async def get_beatmap_batched(self, id: int) -> dict[str, Any] | None:
+        """\
+        Fetch a beatmap's metadata from it's id.
+
+        Concurrent calls are batched into a single `get_beatmaps` request.
+        Unlike `get_beatmap`, a beatmap which does not exist returns None.
+        """
+        return await self._beatmaps_batcher.load(id)
+
     async def get_beatmap_osz(self, id: int) -> bytes:
         """Fetch a beatmapset's osu! file from it's id."""
-        url = f"https://osu.ppy.sh/api/v2/beatmapsets/{id}/download"
+        url = f"/api/v2/beatmapsets/{id}/download"
         headers = {"User-Agent": "osu-framework"}
         return await self.request("GET", url, headers=headers)
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from abc import ABC
+from abc import abstractmethod
+
+from aioredis.exceptions import RedisError
+from app.services.redis import ServiceRedis
+from shared_modules import logger
+
+# reserve a token, allowing the bucket to go into debt; the caller must
+# wait until the debt is repaid, so concurrent callers are served in order
+_RESERVE_SCRIPT = """\
+redis.replicate_commands()
+
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+
+local time = redis.call("time")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+local bucket = redis.call("hmget", KEYS[1], "tokens", "updated_at")
+local tokens = tonumber(bucket[1]) or capacity
+local updated_at = tonumber(bucket[2]) or now
+
+tokens = math.min(capacity, tokens + (now - updated_at) * rate) - 1
+
+redis.call("hset", KEYS[1], "tokens", tostring(tokens), "updated_at", tostring(now))
+redis.call("pexpire", KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+
+if tokens >= 0 then
+    return 0
+end
+return math.ceil(-tokens / rate * 1000000)
+"""
+
+
+class RateLimiter(ABC):
+    @abstractmethod
+    async def acquire(self) -> float:
+        """Wait for permission to make a request; returns the seconds waited."""
+        ...
+
+
+class LocalTokenBucket(RateLimiter):
+    """A token bucket enforced within a single process."""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate  # tokens per second
+        self.capacity = capacity
+
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+
+    def reserve(self) -> float:
+        """Reserve a token; returns the seconds until it may be used."""
+        now = time.monotonic()
+        elapsed = now - self._updated_at
+
+        self._tokens = min(self.capacity, self._tokens +
+                           elapsed * self.rate) - 1
+        self._updated_at = now
+
+        return max(0.0, -self._tokens / self.rate)
+
+    async def acquire(self) -> float:
+        wait_time = self.reserve()
+        if wait_time > 0:
+            await asyncio.sleep(wait_time)
+        return wait_time
+
+
+class RedisTokenBucket(RateLimiter):
+    """\
+    A token bucket shared by every process & replica using the same redis.
+
+    If redis is unavailable, we fall back to a per-process bucket.
+    """
+
+    def __init__(self, redis: ServiceRedis, key: str,
+                 rate: float, capacity: float) -> None:
+        self.redis = redis
+        self.key = key
+        self.rate = rate  # tokens per second
+        self.capacity = capacity
+
+        self._fallback = LocalTokenBucket(rate, capacity)
+
+    async def reserve(self) -> float:
+        """Reserve a token; returns the seconds until it may be used."""
+        try:
+            wait_us = await self.redis.eval(_RESERVE_SCRIPT, 1, self.key,
+                                            self.rate, self.capacity)
+        except RedisError as exc:
+            logger.warning("Failed to reserve rate limit token",
+                           key=self.key, error=str(exc))
+            return self._fallback.reserve()
+
+        return int(wait_us) / 1_000_000
+
+    async def acquire(self) -> float:
+        wait_time = await self.reserve()
+        if wait_time > 0:
+            await asyncio.sleep(wait_time)
+        return wait_time
+
+
+def create(backend: str, redis: ServiceRedis, key: str,
+           rate: float, capacity: float) -> RateLimiter:
+    if backend == "local":
+        return LocalTokenBucket(rate, capacity)
+    elif backend == "redis":
+        return RedisTokenBucket(redis, key, rate, capacity)
+    else:
+        raise ValueError(f"Unknown rate limiter backend: {backend!r}")
@@ -1,13 +1,29 @@
+import asyncio
 from datetime import datetime
+from datetime import timedelta
 from typing import Any
+from typing import AsyncIterator
+from typing import Awaitable
 from typing import Mapping
+from typing import Sequence
 
+from app.common import access
+from app.common import background
+from app.common import cache
+from app.common import cursors
+from app.common import freshness
+from app.common import invalidation
+from app.common import pins
+from app.common import response_cache
 from app.common import settings
+from app.common import singleflight
 from app.common.context import Context
 from app.common.errors import ServiceError
+from app.common.response_cache import Generation
 from app.models import Status
 from app.repositories.beatmaps import BeatmapsRepo
 from app.services.osu_api import OsuAPIRequestError
+from app.usecases import exports
 from shared_modules import logger
 
 
@@ -21,6 +37,7 @@ async def create(ctx: Context, beatmap_id: int, md5_hash: str, set_id: int,
                  ) -> Mapping[str, Any] | ServiceError:
     repo = BeatmapsRepo(ctx)
 
+    await pins.pin(ctx, "beatmaps", beatmap_id)
     beatmap = await repo.create(beatmap_id=beatmap_id, md5_hash=md5_hash,
                                 set_id=set_id, convert=convert, mode=mode,
                                 od=od, ar=ar, cs=cs, hp=hp, bpm=bpm,
@@ -36,85 +53,399 @@ async def create(ctx: Context, beatmap_id: int, md5_hash: str, set_id: int,
     if beatmap is None:
         return ServiceError.BEATMAPS_CANNOT_CREATE
 
+    await cache.invalidate(ctx, "beatmaps", beatmap_id)
+    await invalidation.publish(ctx, "beatmaps", beatmap_id)
+
     return beatmap
 
 
+def expires_at(beatmap: Mapping[str, Any]) -> datetime:
+    return freshness.expires_at(f"beatmaps:{beatmap['beatmap_id']}",
+                                updated_at=beatmap["updated_at"],
+                                ranked_status=beatmap["ranked_status"])
+
+
 def is_expired(beatmap: Mapping[str, Any]) -> bool:
-    last_update: datetime = beatmap["updated_at"]
+    return datetime.now() >= expires_at(beatmap)
+
+
+def can_serve_stale(beatmap: Mapping[str, Any]) -> bool:
+    """Whether an expired beatmap may be served while it's refreshed."""
+    max_staleness = timedelta(seconds=settings.BEATMAPS_MAX_STALENESS)
+
+    return (settings.STALE_WHILE_REVALIDATE and
+            datetime.now() < expires_at(beatmap) + max_staleness)
+
+
+def beatmap_from_osu_api(osu_beatmap: Mapping[str, Any]) -> dict[str, Any]:
+    """Map an osu!api beatmap object onto our beatmap columns."""
+    return {
+        "beatmap_id": osu_beatmap["id"],
+        "md5_hash": osu_beatmap["checksum"],
+        "set_id": osu_beatmap["beatmapset_id"],
+        "convert": osu_beatmap["convert"],
+        "mode": osu_beatmap["mode"],
+        "od": osu_beatmap["accuracy"],
+        "ar": osu_beatmap["ar"],
+        "cs": osu_beatmap["cs"],
+        "hp": osu_beatmap["drain"],
+        "bpm": osu_beatmap["bpm"],
+        "hit_length": osu_beatmap["hit_length"],
+        "total_length": osu_beatmap["total_length"],
+        "count_circles": osu_beatmap["count_circles"],
+        "count_sliders": osu_beatmap["count_sliders"],
+        "count_spinners": osu_beatmap["count_spinners"],
+        "difficulty_rating": osu_beatmap["difficulty_rating"],
+        "is_scoreable": osu_beatmap["is_scoreable"],
+        "pass_count": osu_beatmap["passcount"],
+        "play_count": osu_beatmap["playcount"],
+        "version": osu_beatmap["version"],
+        "mapper_id": osu_beatmap["user_id"],
+        "ranked_status": osu_beatmap["ranked"],
+        "status": Status.ACTIVE,
+    }
+
+
+async def _save_osu_beatmap(ctx: Context, osu_beatmap: Mapping[str, Any],
+                            current: Mapping[str, Any] | None,
+                            is_new: bool = True,
+                            ) -> Mapping[str, Any] | ServiceError:
+    """\
+    Store a beatmap from the osu! api; `current` is the row it refreshes.
+
+    Without `current`, a beatmap not known to be new may keep a different
+    `created_at` than the one returned; it's evicted rather than cached.
+    """
+    repo = BeatmapsRepo(ctx)
+
+    await pins.pin(ctx, "beatmaps", osu_beatmap["id"])
+    beatmap = await repo.upsert(
+        **beatmap_from_osu_api(osu_beatmap),
+        created_at=current["created_at"] if current is not None else None)
+
+    if current is not None or is_new:
+        await cache.store(ctx, "beatmaps", osu_beatmap["id"], beatmap,
+                          ttl=settings.BEATMAPS_CACHE_TTL)
+    else:
+        await cache.invalidate(ctx, "beatmaps", osu_beatmap["id"])
+    await invalidation.publish(ctx, "beatmaps", osu_beatmap["id"])
+
+    return beatmap
+
+
+async def _fetch_from_osu_api(ctx: Context, beatmap_id: int,
+                              current: Mapping[str, Any] | None,
+                              ) -> Mapping[str, Any] | ServiceError:
+    try:
+        osu_beatmap = await ctx.osu_api_client.get_beatmap_batched(beatmap_id)
+    except OsuAPIRequestError as exc:
+        logger.error("Failed to fetch beatmap from osu! api: ",
+                     response_code=exc.status_code, message=exc.message)
+        return ServiceError.BEATMAPS_NOT_FOUND
+
+    if osu_beatmap is None:
+        return ServiceError.BEATMAPS_NOT_FOUND
+
+    return await _save_osu_beatmap(ctx, osu_beatmap, current)
 
-    return (datetime.now() - last_update).total_seconds() >= 60 * 60 * 24
+
+async def _fetch_by_md5_from_osu_api(ctx: Context, md5_hash: str
+                                     ) -> Mapping[str, Any] | ServiceError:
+    try:
+        osu_beatmap = await ctx.osu_api_client.lookup_beatmap(checksum=md5_hash)
+    except OsuAPIRequestError as exc:
+        logger.error("Failed to lookup beatmap from osu! api: ",
+                     response_code=exc.status_code, message=exc.message)
+        return ServiceError.BEATMAPS_NOT_FOUND
+
+    # we missed it's md5, but may have an older version of the beatmap
+    current = await cache.fetch_one(ctx, "beatmaps", osu_beatmap["id"])
+    return await _save_osu_beatmap(ctx, osu_beatmap, current, is_new=False)
+
+
+async def refresh(ctx: Context, beatmap_id: int,
+                  current: Mapping[str, Any] | None = None,
+                  ) -> Mapping[str, Any] | ServiceError:
+    """\
+    Refetch a beatmap from the osu! api, and store it.
+
+    `current` is the stored row, when refreshing one we hold.
+    """
+    # concurrent misses for the same beatmap share a single upstream request
+    return await singleflight.run(
+        ctx, "beatmaps", beatmap_id,
+        lambda: _fetch_from_osu_api(ctx, beatmap_id, current))
+
+
+async def refresh_many(ctx: Context, beatmaps: Sequence[Mapping[str, Any]]
+                       ) -> list[Mapping[str, Any]]:
+    """Refetch up to 50 stored beatmaps from the osu! api in one request, and store them."""
+    repo = BeatmapsRepo(ctx)
+
+    current = {beatmap["beatmap_id"]: beatmap for beatmap in beatmaps}
+
+    try:
+        osu_beatmaps = await ctx.osu_api_client.get_beatmaps(list(current))
+    except OsuAPIRequestError as exc:
+        logger.error("Failed to fetch beatmaps from osu! api: ",
+                     response_code=exc.status_code, message=exc.message)
+        return []
+
+    await pins.pin(ctx, "beatmaps",
+                   *(osu_beatmap["id"] for osu_beatmap in osu_beatmaps))
+    refreshed = await repo.upsert_many([
+        {**beatmap_from_osu_api(osu_beatmap),
+         "created_at": current[osu_beatmap["id"]]["created_at"]}
+        for osu_beatmap in osu_beatmaps])
+
+    await cache.store_many(ctx, "beatmaps",
+                           {beatmap["beatmap_id"]: beatmap
+                            for beatmap in refreshed},
+                           ttl=settings.BEATMAPS_CACHE_TTL)
+    await invalidation.publish(ctx, "beatmaps",
+                               *(beatmap["beatmap_id"] for beatmap in refreshed))
+
+    return refreshed
+
+
+def _revalidate(ctx: Context, beatmap: Mapping[str, Any]) -> None:
+    beatmap_id = beatmap["beatmap_id"]
+    if singleflight.in_flight("beatmaps", beatmap_id):
+        return
+
+    background.spawn(refresh(ctx.detached(), beatmap_id, beatmap),
+                     name=f"revalidate-beatmap-{beatmap_id}")
+
+
+async def _read_through(ctx: Context, beatmap_ids: Sequence[int]
+                        ) -> dict[int, Mapping[str, Any]]:
+    """Read uncached beatmaps from the database, and cache them."""
+    repo = BeatmapsRepo(ctx)
+
+    beatmaps = {beatmap["beatmap_id"]: beatmap
+                for beatmap in await repo.fetch_many_by_ids(beatmap_ids)}
+    return await _settle_replica_reads(ctx, beatmap_ids, beatmaps)
+
+
+async def _settle_replica_reads(ctx: Context, beatmap_ids: Sequence[int],
+                                beatmaps: dict[int, Mapping[str, Any]],
+                                ) -> dict[int, Mapping[str, Any]]:
+    """\
+    Cache beatmaps just read from a replica, by id, & return them.
+
+    Beatmaps pinned by a recent write may be stale on the replica; they're
+    read again from the primary, and aren't cached.
+    """
+    repo = BeatmapsRepo(ctx)
+
+    # checked after reading, so a write beginning meanwhile is noticed
+    pinned = await pins.pinned(ctx, "beatmaps", beatmap_ids)
+    if pinned:
+        with ctx.db.primary_reads():
+            primary_beatmaps = await repo.fetch_many_by_ids(list(pinned))
+
+        for beatmap_id in pinned:
+            beatmaps.pop(beatmap_id, None)
+        beatmaps.update((beatmap["beatmap_id"], beatmap)
+                        for beatmap in primary_beatmaps)
+
+    await cache.store_many(ctx, "beatmaps",
+                           {beatmap_id: beatmap
+                            for beatmap_id, beatmap in beatmaps.items()
+                            if beatmap_id not in pinned},
+                           ttl=settings.BEATMAPS_CACHE_TTL)
+    return beatmaps
 
 
 async def fetch_one(ctx: Context, beatmap_id: int
                     ) -> Mapping[str, Any] | ServiceError:
-    repo = BeatmapsRepo(ctx)
+    access.record("beatmaps", beatmap_id)
 
-    beatmap = await repo.fetch_one(beatmap_id=beatmap_id)
+    beatmap = await cache.fetch_one(ctx, "beatmaps", beatmap_id)
     if beatmap is None:
-        expired = False
-    else:
-        expired = is_expired(beatmap)
-        if expired:
-            await repo.delete(beatmap_id)
+        beatmap = (await _read_through(ctx, [beatmap_id])).get(beatmap_id)
 
-    if beatmap is None or expired:
+    if beatmap is None:
         # try to get it from the osu! api
-        try:
-            osu_beatmap = await ctx.osu_api_client.get_beatmap(beatmap_id)
-        except OsuAPIRequestError as exc:
-            logger.error("Failed to fetch beatmap from osu! api: ",
-                         response_code=exc.status_code, message=exc.message)
-            return ServiceError.BEATMAPS_NOT_FOUND
-
-        print('osu beatmap', osu_beatmap)
-        beatmap = await repo.create(beatmap_id=osu_beatmap["id"],
-                                    md5_hash=osu_beatmap["checksum"],
-                                    set_id=osu_beatmap["beatmapset_id"],
-                                    convert=osu_beatmap["convert"],
-                                    mode=osu_beatmap["mode"],
-                                    od=osu_beatmap["accuracy"],
-                                    ar=osu_beatmap["ar"],
-                                    cs=osu_beatmap["cs"],
-                                    hp=osu_beatmap["drain"],
-                                    bpm=osu_beatmap["bpm"],
-                                    hit_length=osu_beatmap["hit_length"],
-                                    total_length=osu_beatmap["total_length"],
-                                    count_circles=osu_beatmap["count_circles"],
-                                    count_sliders=osu_beatmap["count_sliders"],
-                                    count_spinners=osu_beatmap["count_spinners"],
-                                    difficulty_rating=osu_beatmap["difficulty_rating"],
-                                    is_scoreable=osu_beatmap["is_scoreable"],
-                                    pass_count=osu_beatmap["passcount"],
-                                    play_count=osu_beatmap["playcount"],
-                                    version=osu_beatmap["version"],
-                                    mapper_id=osu_beatmap["user_id"],
-                                    ranked_status=osu_beatmap["ranked"],
-                                    status=Status.ACTIVE)
-        if beatmap is None:
-            # return ServiceError.BEATMAPS_CANNOT_CREATE
-            return ServiceError.BEATMAPS_NOT_FOUND
+        beatmap = await refresh(ctx, beatmap_id)
+    elif is_expired(beatmap):
+        if can_serve_stale(beatmap):
+            # serve it as-is, and refresh it in the background
+            _revalidate(ctx, beatmap)
+        else:
+            beatmap = await refresh(ctx, beatmap_id, beatmap)
 
     return beatmap
 
 
+async def fetch_cached_response(ctx: Context, beatmap_id: int
+                                ) -> tuple[bytes | None, Generation]:
+    """\
+    Fetch the encoded response for a fresh beatmap, if we have it; along with
+    the generation to pass to `cache_response()` on a miss.
+    """
+    body, generation = await response_cache.fetch(ctx, "beatmaps", beatmap_id)
+    if body is not None:
+        access.record("beatmaps", beatmap_id)
+    return body, generation
+
+
+async def cache_response(ctx: Context, beatmap: Mapping[str, Any], body: bytes,
+                         generation: Generation) -> None:
+    """Keep the encoded response for a beatmap, to serve while it's fresh."""
+    if await pins.is_pinned(ctx, "beatmaps", beatmap["beatmap_id"]):
+        return  # it may have been built from a replica read
+
+    await response_cache.store(ctx, "beatmaps", beatmap["beatmap_id"], body,
+                               expires_at=expires_at(beatmap),
+                               generation=generation)
+
+
+async def lookup(ctx: Context, beatmap_ids: Sequence[int],
+                 md5_hashes: Sequence[str],
+                 ) -> dict[str, Mapping[str, Any] | ServiceError] | ServiceError:
+    """Fetch many beatmaps by id and/or md5 hash, keyed by the given keys."""
+    repo = BeatmapsRepo(ctx)
+
+    # deduplicate, preserving order
+    beatmap_ids = list(dict.fromkeys(beatmap_ids))
+    md5_hashes = list(dict.fromkeys(md5_hashes))
+
+    if len(beatmap_ids) + len(md5_hashes) > settings.BEATMAPS_LOOKUP_MAX_KEYS:
+        return ServiceError.BEATMAPS_TOO_MANY_KEYS
+
+    by_id = await cache.fetch_many(ctx, "beatmaps", beatmap_ids)
+    uncached_ids = [id for id in beatmap_ids if id not in by_id]
+    if uncached_ids:
+        by_id.update(await _read_through(ctx, uncached_ids))
+
+    by_md5: dict[str, Mapping[str, Any]] = {}
+    if md5_hashes:
+        # resolve the ids (reading the rows as we do), then read them
+        # through the cache & pins as with lookups by id
+        resolved = {beatmap["beatmap_id"]: beatmap
+                    for beatmap in await repo.fetch_many_by_md5s(md5_hashes)}
+
+        beatmaps = await cache.fetch_many(ctx, "beatmaps", list(resolved))
+        uncached = {beatmap_id: beatmap
+                    for beatmap_id, beatmap in resolved.items()
+                    if beatmap_id not in beatmaps}
+        if uncached:
+            beatmaps.update(await _settle_replica_reads(ctx, list(uncached),
+                                                        uncached))
+
+        # a beatmap may have been updated (to a new md5) since it was resolved
+        requested = set(md5_hashes)
+        by_md5 = {beatmap["md5_hash"]: beatmap
+                  for beatmap in beatmaps.values()
+                  if beatmap["md5_hash"] in requested}
+
+    for beatmap_id in beatmap_ids:
+        access.record("beatmaps", beatmap_id)
+    for beatmap in by_md5.values():
+        access.record("beatmaps", beatmap["beatmap_id"])
+
+    results: dict[str, Mapping[str, Any] | ServiceError] = {}
+    pending: dict[str, Awaitable[Mapping[str, Any] | ServiceError]] = {}
+
+    for beatmap_id in beatmap_ids:
+        beatmap = by_id.get(beatmap_id)
+        if beatmap is None or (is_expired(beatmap) and
+                               not can_serve_stale(beatmap)):
+            pending[str(beatmap_id)] = refresh(ctx, beatmap_id, beatmap)
+        else:
+            if is_expired(beatmap):
+                _revalidate(ctx, beatmap)
+            results[str(beatmap_id)] = beatmap
+
+    for md5_hash in md5_hashes:
+        beatmap = by_md5.get(md5_hash)
+        if beatmap is None:
+            pending[md5_hash] = singleflight.run(
+                ctx, "beatmaps-md5", md5_hash,
+                lambda md5_hash=md5_hash: _fetch_by_md5_from_osu_api(ctx, md5_hash))
+        elif is_expired(beatmap) and not can_serve_stale(beatmap):
+            pending[md5_hash] = refresh(ctx, beatmap["beatmap_id"], beatmap)
+        else:
+            if is_expired(beatmap):
+                _revalidate(ctx, beatmap)
+            results[md5_hash] = beatmap
+
+    # resolve misses concurrently; beatmap ids are batched upstream
+    for key, result in zip(pending, await asyncio.gather(*pending.values())):
+        results[key] = result
+
+    return results
+
+
 async def fetch_many(ctx: Context, set_id: int | None = None,
                      md5_hash: str | None = None,
                      mode: str | None = None,
                      ranked_status: int | None = None,
                      status: str | None = None,
+                     sort_by: str = "beatmap_id",
+                     cursor: str | None = None,
                      page: int = 1,
                      page_size: int = settings.DEFAULT_PAGE_SIZE,
-                     ) -> list[Mapping[str, Any]]:
+                     ) -> Mapping[str, Any] | ServiceError:
+    """\
+    Fetch a page of beatmaps, along with a cursor to the next page.
+
+    When a cursor is given, the page is read from the cursor's position
+    (keyset pagination) and `page` is ignored; otherwise `page` is used.
+    """
     repo = BeatmapsRepo(ctx)
 
+    after = None
+    if cursor is not None:
+        after = cursors.decode(cursor, sort_by)
+        if after is None:
+            return ServiceError.BEATMAPS_INVALID_CURSOR
+
     beatmaps = await repo.fetch_many(set_id=set_id,
                                      md5_hash=md5_hash,
                                      mode=mode,
                                      ranked_status=ranked_status,
                                      status=status,
+                                     sort_by=sort_by,
+                                     after=after,
                                      page=page,
                                      page_size=page_size)
 
+    next_cursor = cursors.next_cursor(
+        beatmaps, sort_by, "beatmap_id", page_size)
+
+    return {"beatmaps": beatmaps, "next_cursor": next_cursor}
+
+
+async def export_watermark(ctx: Context) -> datetime | None:
+    """The `updated_since` a client should pass to it's next export."""
+    return await exports.watermark(BeatmapsRepo(ctx))
+
+
+def export(ctx: Context, updated_since: datetime | None = None,
+           chunk_size: int = settings.EXPORT_CHUNK_SIZE,
+           ) -> AsyncIterator[list[Mapping[str, Any]]]:
+    """Iterate over all beatmaps, or those updated since a time, in chunks."""
+    return exports.export(BeatmapsRepo(ctx), "beatmap_id", updated_since, chunk_size)
+
+
+async def search(ctx: Context, mode: str | None = None,
+                 ranked_status: int | None = None,
+                 status: str | None = None,
+                 ranges: Mapping[str, tuple[Any, Any]] | None = None,
+                 sort_by: str = "beatmap_id",
+                 order: str = "asc",
+                 page: int = 1,
+                 page_size: int = settings.DEFAULT_PAGE_SIZE,
+                 ) -> list[Mapping[str, Any]]:
+    repo = BeatmapsRepo(ctx)
+
+    beatmaps = await repo.search(mode=mode, ranked_status=ranked_status,
+                                 status=status, ranges=ranges,
+                                 sort_by=sort_by, order=order,
+                                 page=page, page_size=page_size)
+
     return beatmaps
 
 
@@ -122,8 +453,17 @@ async def delete(ctx: Context, beatmap_id: int
                  ) -> Mapping[str, Any] | ServiceError:
     repo = BeatmapsRepo(ctx)
 
-    beatmap = await repo.delete(beatmap_id=beatmap_id)
+    # the deleted beatmap is returned; read it from the primary on a miss
+    beatmap = await cache.fetch_one(ctx, "beatmaps", beatmap_id)
+    if beatmap is None:
+        with ctx.db.primary_reads():
+            beatmap = await repo.fetch_one(beatmap_id)
     if beatmap is None:
         return ServiceError.BEATMAPS_NOT_FOUND
 
+    await pins.pin(ctx, "beatmaps", beatmap_id)
+    await repo.delete(beatmap_id=beatmap_id)
+    await cache.invalidate(ctx, "beatmaps", beatmap_id)
+    await invalidation.publish(ctx, "beatmaps", beatmap_id)
+
     return beatmap
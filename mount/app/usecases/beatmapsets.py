@@ -1,14 +1,28 @@
 from datetime import datetime
+from datetime import timedelta
 from typing import Any
+from typing import AsyncIterator
 from typing import Mapping
 
+from app.common import access
+from app.common import background
+from app.common import cache
+from app.common import cursors
+from app.common import freshness
+from app.common import invalidation
+from app.common import pins
+from app.common import response_cache
 from app.common import settings
+from app.common import singleflight
 from app.common.context import Context
 from app.common.errors import ServiceError
+from app.common.response_cache import Generation
 from app.models import Status
 from app.repositories.beatmaps import BeatmapsRepo
 from app.repositories.beatmapsets import BeatmapsetsRepo
 from app.services.osu_api import OsuAPIRequestError
+from app.usecases import beatmaps
+from app.usecases import exports
 from shared_modules import logger
 
 
@@ -27,6 +41,7 @@ async def create(ctx: Context, beatmapset_id: int, artist: str, artist_unicode:
                  ) -> Mapping[str, Any] | ServiceError:
     repo = BeatmapsetsRepo(ctx)
 
+    await pins.pin(ctx, "beatmapsets", beatmapset_id)
     beatmapset = await repo.create(beatmapset_id=beatmapset_id, artist=artist,
                                    artist_unicode=artist_unicode,
                                    covers=covers, creator=creator,
@@ -55,153 +70,307 @@ async def create(ctx: Context, beatmapset_id: int, artist: str, artist_unicode:
     if beatmapset is None:
         return ServiceError.BEATMAPSETS_CANNOT_CREATE
 
+    await cache.invalidate(ctx, "beatmapsets", beatmapset_id)
+    await invalidation.publish(ctx, "beatmapsets", beatmapset_id)
+
     return beatmapset
 
 
+def expires_at(beatmapset: Mapping[str, Any]) -> datetime:
+    return freshness.expires_at(f"beatmapsets:{beatmapset['beatmapset_id']}",
+                                updated_at=beatmapset["updated_at"],
+                                ranked_status=beatmapset["ranked_status"],
+                                osu_updated_at=beatmapset["osu_updated_at"])
+
+
 def is_expired(beatmapset: Mapping[str, Any]) -> bool:
-    last_update: datetime = beatmapset["updated_at"]
+    return datetime.now() >= expires_at(beatmapset)
 
-    return (datetime.now() - last_update).total_seconds() >= 60 * 60 * 24
 
+def can_serve_stale(beatmapset: Mapping[str, Any]) -> bool:
+    """Whether an expired beatmapset may be served while it's refreshed."""
+    max_staleness = timedelta(seconds=settings.BEATMAPSETS_MAX_STALENESS)
 
-async def fetch_one(ctx: Context, beatmapset_id: int) -> Mapping[str, Any] | ServiceError:
+    return (settings.STALE_WHILE_REVALIDATE and
+            datetime.now() < expires_at(beatmapset) + max_staleness)
+
+
+def _parse_osu_datetime(value: str) -> datetime:
+    # the osu!api returns utc iso-8601 timestamps; we store them naive
+    return datetime.fromisoformat(value.removesuffix("Z")).replace(tzinfo=None)
+
+
+def beatmapset_from_osu_api(osu_beatmapset: Mapping[str, Any]) -> dict[str, Any]:
+    """Map an osu!api beatmapset object onto our beatmapset columns."""
+    if osu_beatmapset["can_be_hyped"]:
+        current_hype = osu_beatmapset["hype"]["current"]
+        required_hype = osu_beatmapset["hype"]["required"]
+    else:
+        current_hype = 0
+        required_hype = 0
+
+    return {
+        "beatmapset_id": osu_beatmapset["id"],
+        "artist": osu_beatmapset["artist"],
+        "artist_unicode": osu_beatmapset["artist_unicode"],
+        "covers": osu_beatmapset["covers"],
+        "creator": osu_beatmapset["creator"],
+        "favourite_count": osu_beatmapset["favourite_count"],
+        "nsfw": osu_beatmapset["nsfw"],
+        "osu_play_count": osu_beatmapset["play_count"],
+        "preview_url": osu_beatmapset["preview_url"],
+        "source": osu_beatmapset["source"],
+        "title": osu_beatmapset["title"],
+        "title_unicode": osu_beatmapset["title_unicode"],
+        "mapper_id": osu_beatmapset["user_id"],
+        "mapper_name": osu_beatmapset["user"]["username"],
+        "video": osu_beatmapset["video"],
+        "download_disabled": osu_beatmapset["availability"]["download_disabled"],
+        "availability_information": osu_beatmapset["availability"]["more_information"],
+        "bpm": osu_beatmapset["bpm"],
+        "can_be_hyped": osu_beatmapset["can_be_hyped"],
+        "discussion_locked": osu_beatmapset["discussion_locked"],
+        "current_hype": current_hype,
+        "required_hype": required_hype,
+        "is_scoreable": osu_beatmapset["is_scoreable"],
+        "legacy_thread_url": osu_beatmapset["legacy_thread_url"],
+        "current_nominations": osu_beatmapset["nominations_summary"]["current"],
+        "required_nominations": osu_beatmapset["nominations_summary"]["required"],
+        "ranked_status": osu_beatmapset["ranked"],
+        "storyboard": osu_beatmapset["storyboard"],
+        "tags": osu_beatmapset["tags"],
+        "osu_submitted_at": _parse_osu_datetime(osu_beatmapset["submitted_date"]),
+        "osu_updated_at": _parse_osu_datetime(osu_beatmapset["last_updated"]),
+        "osu_ranked_at": (_parse_osu_datetime(osu_beatmapset["ranked_date"])
+                          if osu_beatmapset["ranked_date"] is not None
+                          else None),
+        "status": Status.ACTIVE,
+    }
+
+
+async def _fetch_from_osu_api(ctx: Context, beatmapset_id: int,
+                              current: Mapping[str, Any] | None,
+                              ) -> Mapping[str, Any] | ServiceError:
     mapset_repo = BeatmapsetsRepo(ctx)
     map_repo = BeatmapsRepo(ctx)
 
-    beatmapset = await mapset_repo.fetch_one(beatmapset_id)
+    try:
+        osu_beatmapset = await ctx.osu_api_client.get_beatmapset(beatmapset_id)
+    except OsuAPIRequestError as exc:
+        logger.error("Failed to fetch beatmapset from osu! api: ",
+                     response_code=exc.status_code, message=exc.message)
+        return ServiceError.BEATMAPSETS_NOT_FOUND
+
+    map_ids = [osu_beatmap["id"] for osu_beatmap in osu_beatmapset["beatmaps"]]
+
+    # the difficulties' stored created_at are kept; we know those we've cached
+    current_maps = await cache.fetch_many(ctx, "beatmaps", map_ids)
+
+    await pins.pin(ctx, "beatmapsets", beatmapset_id)
+    await pins.pin(ctx, "beatmaps", *map_ids)
+
+    # persist the set & all of it's difficulties atomically,
+    # writing the difficulties with a single multi-row upsert
+    async with ctx.db.transaction():
+        beatmapset = await mapset_repo.upsert(
+            **beatmapset_from_osu_api(osu_beatmapset),
+            created_at=current["created_at"] if current is not None else None)
+
+        maps = await map_repo.upsert_many([
+            {**beatmaps.beatmap_from_osu_api(osu_beatmap),
+             "created_at": (current_maps[osu_beatmap["id"]]["created_at"]
+                            if osu_beatmap["id"] in current_maps else None)}
+            for osu_beatmap in osu_beatmapset["beatmaps"]])
+
+    # difficulties we hadn't cached may be stored with another created_at
+    # than we wrote (e.g. fetched on their own before); evict them instead
+    await cache.store_many(ctx, "beatmaps",
+                           {beatmap["beatmap_id"]: beatmap for beatmap in maps
+                            if beatmap["beatmap_id"] in current_maps},
+                           ttl=settings.BEATMAPS_CACHE_TTL)
+    await cache.invalidate(ctx, "beatmaps", *(map_id for map_id in map_ids
+                                              if map_id not in current_maps))
+    await cache.store(ctx, "beatmapsets", beatmapset_id, beatmapset,
+                      ttl=settings.BEATMAPSETS_CACHE_TTL)
+
+    await invalidation.publish(ctx, "beatmaps",
+                               *(beatmap["beatmap_id"] for beatmap in maps))
+    await invalidation.publish(ctx, "beatmapsets", beatmapset_id)
+
+    return beatmapset
+
+
+async def refresh(ctx: Context, beatmapset_id: int,
+                  current: Mapping[str, Any] | None = None,
+                  ) -> Mapping[str, Any] | ServiceError:
+    """\
+    Refetch a beatmapset (& it's beatmaps) from the osu! api, and store it.
+
+    `current` is the stored row, when refreshing one we hold.
+    """
+    # concurrent misses for the same set share a single upstream request
+    return await singleflight.run(
+        ctx, "beatmapsets", beatmapset_id,
+        lambda: _fetch_from_osu_api(ctx, beatmapset_id, current))
+
+
+def _revalidate(ctx: Context, beatmapset: Mapping[str, Any]) -> None:
+    beatmapset_id = beatmapset["beatmapset_id"]
+    if singleflight.in_flight("beatmapsets", beatmapset_id):
+        return
+
+    background.spawn(refresh(ctx.detached(), beatmapset_id, beatmapset),
+                     name=f"revalidate-beatmapset-{beatmapset_id}")
+
+
+async def _read_through(ctx: Context, beatmapset_id: int
+                        ) -> Mapping[str, Any] | None:
+    """\
+    Read an uncached beatmapset from the database, and cache it.
+
+    A beatmapset pinned by a recent write may be stale on the replica we
+    read from; it's read again from the primary, and isn't cached.
+    """
+    repo = BeatmapsetsRepo(ctx)
+
+    beatmapset = await repo.fetch_one(beatmapset_id)
+
+    # checked after reading, so a write beginning meanwhile is noticed
+    if await pins.is_pinned(ctx, "beatmapsets", beatmapset_id):
+        with ctx.db.primary_reads():
+            return await repo.fetch_one(beatmapset_id)
+
+    if beatmapset is not None:
+        await cache.store(ctx, "beatmapsets", beatmapset_id, beatmapset,
+                          ttl=settings.BEATMAPSETS_CACHE_TTL)
+    return beatmapset
+
+
+async def fetch_one(ctx: Context, beatmapset_id: int) -> Mapping[str, Any] | ServiceError:
+    access.record("beatmapsets", beatmapset_id)
+
+    beatmapset = await cache.fetch_one(ctx, "beatmapsets", beatmapset_id)
     if beatmapset is None:
-        expired = False
-    else:
-        expired = is_expired(beatmapset)
-        if expired:
-            await mapset_repo.delete(beatmapset_id)
+        beatmapset = await _read_through(ctx, beatmapset_id)
 
-    if beatmapset is None or expired:
+    if beatmapset is None:
         # fetch from osu! api
-        try:
-            osu_beatmapset = await ctx.osu_api_client.get_beatmapset(beatmapset_id)
-        except OsuAPIRequestError as exc:
-            logger.error("Failed to fetch beatmapset from osu! api: ",
-                         response_code=exc.status_code, message=exc.message)
-            return ServiceError.BEATMAPSETS_NOT_FOUND
-
-        if osu_beatmapset["can_be_hyped"]:
-            current_hype = osu_beatmapset["hype"]["current"]
-            required_hype = osu_beatmapset["hype"]["required"]
+        beatmapset = await refresh(ctx, beatmapset_id)
+    elif is_expired(beatmapset):
+        if can_serve_stale(beatmapset):
+            # serve it as-is, and refresh it in the background
+            _revalidate(ctx, beatmapset)
         else:
-            current_hype = 0
-            required_hype = 0
-
-        beatmapset = await mapset_repo.create(beatmapset_id=osu_beatmapset['id'],
-                                              artist=osu_beatmapset['artist'],
-                                              artist_unicode=osu_beatmapset['artist_unicode'],
-                                              covers=osu_beatmapset['covers'],
-                                              creator=osu_beatmapset['creator'],
-                                              favourite_count=osu_beatmapset['favourite_count'],
-                                              nsfw=osu_beatmapset['nsfw'],
-                                              osu_play_count=osu_beatmapset['play_count'],
-                                              preview_url=osu_beatmapset['preview_url'],
-                                              source=osu_beatmapset['source'],
-                                              title=osu_beatmapset['title'],
-                                              title_unicode=osu_beatmapset['title_unicode'],
-                                              mapper_id=osu_beatmapset['user_id'],
-                                              mapper_name=osu_beatmapset['user']['username'],
-                                              video=osu_beatmapset['video'],
-                                              download_disabled=osu_beatmapset['availability']['download_disabled'],
-                                              availability_information=osu_beatmapset[
-            'availability']['more_information'],
-            bpm=osu_beatmapset['bpm'],
-            can_be_hyped=osu_beatmapset['can_be_hyped'],
-            discussion_locked=osu_beatmapset['discussion_locked'],
-            current_hype=current_hype,
-            required_hype=required_hype,
-            is_scoreable=osu_beatmapset['is_scoreable'],
-            legacy_thread_url=osu_beatmapset['legacy_thread_url'],
-            current_nominations=osu_beatmapset['nominations_summary']['current'],
-            required_nominations=osu_beatmapset['nominations_summary']['required'],
-            ranked_status=osu_beatmapset['ranked'],
-            storyboard=osu_beatmapset['storyboard'],
-            tags=osu_beatmapset['tags'],
-            osu_submitted_at=osu_beatmapset['submitted_date'].removesuffix(
-            'Z'),
-            osu_updated_at=osu_beatmapset['last_updated'].removesuffix(
-            'Z'),
-            osu_ranked_at=osu_beatmapset['ranked_date'].removesuffix(
-            'Z') if osu_beatmapset['ranked_date'] is not None else None,
-            status=Status.ACTIVE)
-
-        if beatmapset is None:
-            # return ServiceError.BEATMAPSETS_CANNOT_CREATE
-            return ServiceError.BEATMAPSETS_NOT_FOUND
-
-        for osu_beatmap in osu_beatmapset['beatmaps']:
-
-            existing_beatmap = await map_repo.fetch_one(beatmap_id=osu_beatmap['id'])
-            if existing_beatmap is None:
-                expired = False
-            else:
-                expired = is_expired(existing_beatmap)
-                if expired:
-                    await map_repo.delete(osu_beatmap['id'])
-
-            beatmap = await map_repo.create(beatmap_id=osu_beatmap["id"],
-                                            md5_hash=osu_beatmap["checksum"],
-                                            set_id=osu_beatmap["beatmapset_id"],
-                                            convert=osu_beatmap["convert"],
-                                            mode=osu_beatmap["mode"],
-                                            od=osu_beatmap["accuracy"],
-                                            ar=osu_beatmap["ar"],
-                                            cs=osu_beatmap["cs"],
-                                            hp=osu_beatmap["drain"],
-                                            bpm=osu_beatmap["bpm"],
-                                            hit_length=osu_beatmap["hit_length"],
-                                            total_length=osu_beatmap["total_length"],
-                                            count_circles=osu_beatmap["count_circles"],
-                                            count_sliders=osu_beatmap["count_sliders"],
-                                            count_spinners=osu_beatmap["count_spinners"],
-                                            difficulty_rating=osu_beatmap["difficulty_rating"],
-                                            is_scoreable=osu_beatmap["is_scoreable"],
-                                            pass_count=osu_beatmap["passcount"],
-                                            play_count=osu_beatmap["playcount"],
-                                            version=osu_beatmap["version"],
-                                            mapper_id=osu_beatmap["user_id"],
-                                            ranked_status=osu_beatmap["ranked"],
-                                            status=Status.ACTIVE)
-            if beatmap is None:
-                logger.error("Failed to save beatmap from osu! api",
-                             beatmap_id=osu_beatmap["id"])
-
-                # TODO: technically we should probably return error here, but saving
-                # beatmaps feels like a side effect more so than a part of the req?
+            beatmapset = await refresh(ctx, beatmapset_id, beatmapset)
 
     return beatmapset
 
 
+async def fetch_cached_response(ctx: Context, beatmapset_id: int
+                                ) -> tuple[bytes | None, Generation]:
+    """\
+    Fetch the encoded response for a fresh beatmapset, if we have it; along with
+    the generation to pass to `cache_response()` on a miss.
+    """
+    body, generation = await response_cache.fetch(ctx, "beatmapsets", beatmapset_id)
+    if body is not None:
+        access.record("beatmapsets", beatmapset_id)
+    return body, generation
+
+
+async def cache_response(ctx: Context, beatmapset: Mapping[str, Any],
+                         body: bytes, generation: Generation) -> None:
+    """Keep the encoded response for a beatmapset, to serve while it's fresh."""
+    if await pins.is_pinned(ctx, "beatmapsets", beatmapset["beatmapset_id"]):
+        return  # it may have been built from a replica read
+
+    await response_cache.store(ctx, "beatmapsets", beatmapset["beatmapset_id"],
+                               body, expires_at=expires_at(beatmapset),
+                               generation=generation)
+
+
 async def fetch_many(ctx: Context, artist: str | None = None,
                      creator: str | None = None,
                      title: str | None = None,
                      nsfw: bool | None = None,
                      ranked_status: int | None = None,
                      status: str | None = None,
+                     sort_by: str = "beatmapset_id",
+                     cursor: str | None = None,
                      page: int = 1,
                      page_size: int = settings.DEFAULT_PAGE_SIZE,
-                     ) -> list[Mapping[str, Any]] | ServiceError:
+                     ) -> Mapping[str, Any] | ServiceError:
+    """\
+    Fetch a page of beatmapsets, along with a cursor to the next page.
+
+    When a cursor is given, the page is read from the cursor's position
+    (keyset pagination) and `page` is ignored; otherwise `page` is used.
+    """
     repo = BeatmapsetsRepo(ctx)
 
+    after = None
+    if cursor is not None:
+        after = cursors.decode(cursor, sort_by)
+        if after is None:
+            return ServiceError.BEATMAPSETS_INVALID_CURSOR
+
     beatmapsets = await repo.fetch_many(artist=artist, creator=creator,
                                         title=title, nsfw=nsfw,
                                         ranked_status=ranked_status,
-                                        status=status, page=page,
+                                        status=status, sort_by=sort_by,
+                                        after=after, page=page,
                                         page_size=page_size)
 
+    next_cursor = cursors.next_cursor(
+        beatmapsets, sort_by, "beatmapset_id", page_size)
+
+    return {"beatmapsets": beatmapsets, "next_cursor": next_cursor}
+
+
+async def export_watermark(ctx: Context) -> datetime | None:
+    """The `updated_since` a client should pass to it's next export."""
+    return await exports.watermark(BeatmapsetsRepo(ctx))
+
+
+def export(ctx: Context, updated_since: datetime | None = None,
+           chunk_size: int = settings.EXPORT_CHUNK_SIZE,
+           ) -> AsyncIterator[list[Mapping[str, Any]]]:
+    """Iterate over all beatmapsets, or those updated since a time, in chunks."""
+    return exports.export(BeatmapsetsRepo(ctx), "beatmapset_id", updated_since, chunk_size)
+
+
+async def search(ctx: Context, query: str,
+                 nsfw: bool | None = None,
+                 ranked_status: int | None = None,
+                 mode: str | None = None,
+                 status: str | None = None,
+                 page: int = 1,
+                 page_size: int = settings.DEFAULT_PAGE_SIZE,
+                 ) -> list[Mapping[str, Any]]:
+    repo = BeatmapsetsRepo(ctx)
+
+    beatmapsets = await repo.search(text=query, nsfw=nsfw,
+                                    ranked_status=ranked_status,
+                                    mode=mode, status=status,
+                                    page=page, page_size=page_size)
+
     return beatmapsets
 
 
 async def delete(ctx: Context, beatmapset_id: int) -> Mapping[str, Any] | ServiceError:
     repo = BeatmapsetsRepo(ctx)
 
-    beatmapset = await repo.delete(beatmapset_id)
+    # the deleted beatmapset is returned; read it from the primary on a miss
+    beatmapset = await cache.fetch_one(ctx, "beatmapsets", beatmapset_id)
+    if beatmapset is None:
+        with ctx.db.primary_reads():
+            beatmapset = await repo.fetch_one(beatmapset_id)
     if beatmapset is None:
         return ServiceError.BEATMAPSETS_NOT_FOUND
 
+    await pins.pin(ctx, "beatmapsets", beatmapset_id)
+    await repo.delete(beatmapset_id)
+    await cache.invalidate(ctx, "beatmapsets", beatmapset_id)
+    await invalidation.publish(ctx, "beatmapsets", beatmapset_id)
+
     return beatmapset
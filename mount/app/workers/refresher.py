@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime
+from datetime import timedelta
+
+from app.common import access
+from app.common import settings
+from app.common.context import Context
+from app.common.errors import ServiceError
+from app.repositories.beatmaps import BeatmapsRepo
+from app.repositories.beatmapsets import BeatmapsetsRepo
+from app.usecases import beatmaps
+from app.usecases import beatmapsets
+from shared_modules import logger
+
+# the osu!api accepts at most 50 ids per /beatmaps request
+BEATMAPS_PER_REQUEST = 50
+
+
+def _request_budget() -> int:
+    """The number of upstream requests we may spend per refresh cycle."""
+    requests_per_second = settings.OSU_API_MAX_REQUESTS_PER_MINUTE / 60
+    return int(requests_per_second * settings.REFRESHER_INTERVAL
+               * settings.REFRESHER_BUDGET_SHARE)
+
+
+async def _refresh_beatmapsets(ctx: Context, budget: int) -> int:
+    """Refresh the most accessed beatmapsets nearing expiry; returns requests spent."""
+    repo = BeatmapsetsRepo(ctx)
+
+    ids = await access.fetch_most_accessed(ctx, "beatmapsets",
+                                           limit=settings.REFRESHER_CANDIDATES)
+    rows = {row["beatmapset_id"]: row
+            for row in await repo.fetch_many_by_ids(ids)}
+
+    horizon = datetime.now() + timedelta(seconds=settings.REFRESHER_LOOKAHEAD)
+    due = [id for id in ids  # most accessed first
+           if id in rows and beatmapsets.expires_at(rows[id]) <= horizon]
+
+    # sets we don't have, or the osu!api no longer has, would otherwise stay
+    # hot & be retried every cycle; they're re-tracked if accessed again
+    missing = [id for id in ids if id not in rows]
+    for beatmapset_id in due[:budget]:
+        result = await beatmapsets.refresh(ctx, beatmapset_id,
+                                           rows[beatmapset_id])
+        if result is ServiceError.BEATMAPSETS_NOT_FOUND:
+            missing.append(beatmapset_id)
+
+    await access.forget(ctx, "beatmapsets", *missing)
+
+    return min(len(due), budget)
+
+
+async def _refresh_beatmaps(ctx: Context, budget: int) -> int:
+    """Refresh the most accessed beatmaps nearing expiry; returns requests spent."""
+    repo = BeatmapsRepo(ctx)
+
+    ids = await access.fetch_most_accessed(ctx, "beatmaps",
+                                           limit=settings.REFRESHER_CANDIDATES)
+    rows = {row["beatmap_id"]: row
+            for row in await repo.fetch_many_by_ids(ids)}
+
+    horizon = datetime.now() + timedelta(seconds=settings.REFRESHER_LOOKAHEAD)
+    due = [id for id in ids  # most accessed first
+           if id in rows and beatmaps.expires_at(rows[id]) <= horizon]
+
+    batches = [[rows[id] for id in due[i:i + BEATMAPS_PER_REQUEST]]
+               for i in range(0, len(due), BEATMAPS_PER_REQUEST)]
+
+    # as with sets, stop tracking beatmaps we don't have, or the osu!api
+    # no longer has; an empty result may be a failed request, so is kept
+    missing = [id for id in ids if id not in rows]
+    for batch in batches[:budget]:
+        refreshed = await beatmaps.refresh_many(ctx, batch)
+        if refreshed:
+            refreshed_ids = {beatmap["beatmap_id"] for beatmap in refreshed}
+            missing.extend(row["beatmap_id"] for row in batch
+                           if row["beatmap_id"] not in refreshed_ids)
+
+    await access.forget(ctx, "beatmaps", *missing)
+
+    return min(len(batches), budget)
+
+
+async def refresh_once(ctx: Context) -> None:
+    budget = _request_budget()
+
+    # sets first; refreshing a set also refreshes all of it's beatmaps
+    spent = await _refresh_beatmapsets(ctx, budget)
+    spent += await _refresh_beatmaps(ctx, budget - spent)
+
+    await access.decay(ctx, "beatmapsets")
+    await access.decay(ctx, "beatmaps")
+
+    logger.info("Refreshed soon-to-expire data", requests=spent, budget=budget)
+
+
+async def run(ctx: Context) -> None:
+    """Proactively refresh hot data before it expires, within a share of our upstream budget."""
+    while True:
+        try:
+            await refresh_once(ctx)
+        except Exception as exc:
+            logger.error("Failed to refresh soon-to-expire data",
+                         error=repr(exc))
+
+        await asyncio.sleep(settings.REFRESHER_INTERVAL)
@@ -0,0 +1,345 @@
+"""\
+Drive the service with a mix of traffic and report latency per endpoint.
+
+By default the app is run in-process (over an ASGI transport), against the
+mysql & redis configured in the environment, with the osu!api replaced by
+the simulator from benchmarks/osu_api_simulator.py on a local socket. Pass
+--url to drive an already running service instead; it's upstream is then
+whatever it's configured with (e.g. a standalone simulator).
+
+The traffic mix is given as weights by scenario, e.g.
+--mix hot_read=70,md5_lookup=10,list_page=10,cold_miss=5,write=5
+
+- hot_read:   GET /v1/beatmaps/{id} for a beatmap seeded before the run
+- md5_lookup: POST /v1/beatmaps/lookup by a seeded beatmap's md5 hash
+- list_page:  GET /v1/beatmaps, following next_cursor page by page
+- cold_miss:  GET /v1/beatmapsets/{id} for a set never fetched before
+- write:      POST /v1/beatmaps for a new beatmap id
+
+The report is written as json (--output), and can be compared against a
+previous run's report (--compare) to see the change between commits.
+
+Usage: python -m benchmarks.load [--duration 30] [--concurrency 32]
+                                 [--output report.json] [--compare base.json]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import statistics
+import subprocess
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any
+from typing import AsyncIterator
+from typing import Awaitable
+from typing import Callable
+
+import httpx
+import orjson
+
+SCENARIOS = ("hot_read", "md5_lookup", "list_page", "cold_miss", "write")
+
+DEFAULT_MIX = "hot_read=70,md5_lookup=10,list_page=10,cold_miss=5,write=5"
+
+# ids far above any real beatmapset, so cold misses & writes don't collide
+# with seeded data; runs are offset by their start time, so that they
+# don't reuse the ids of previous runs against the same db
+UNSEEDED_ID_BASE = 100_000_000
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"unknown scenario: {name!r}")
+        mix[name] = float(weight)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def percentile(samples: list[float], pct: int) -> float:
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method="inclusive")[pct - 1]
+
+
+def summarize(latencies: list[float], errors: int, duration: float
+              ) -> dict[str, Any]:
+    summary: dict[str, Any] = {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / duration, 2),
+    }
+    if latencies:
+        ms = [latency * 1000 for latency in latencies]
+        summary["latency_ms"] = {
+            "mean": round(statistics.fmean(ms), 3),
+            "p50": round(percentile(ms, 50), 3),
+            "p95": round(percentile(ms, 95), 3),
+            "p99": round(percentile(ms, 99), 3),
+            "max": round(max(ms), 3),
+        }
+    return summary
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, mix: dict[str, float],
+                 seed: int) -> None:
+        self.client = client
+        self.mix = mix
+        self.rng = random.Random(seed)
+
+        self.beatmaps: list[dict[str, Any]] = []
+        self.next_unseeded_id = (UNSEEDED_ID_BASE +
+                                 time.time_ns() // 1_000_000 % 100_000_000)
+
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+
+    def _unseeded_id(self) -> int:
+        self.next_unseeded_id += 1
+        return self.next_unseeded_id
+
+    async def seed(self, beatmapsets: int) -> None:
+        """Pull beatmapsets through the miss path, to use as the hot set."""
+        semaphore = asyncio.Semaphore(16)
+
+        async def seed_one(beatmapset_id: int) -> None:
+            async with semaphore:
+                response = await self.client.get(
+                    f"/v1/beatmapsets/{beatmapset_id}")
+                if response.status_code != 200:
+                    return
+
+                response = await self.client.get(
+                    "/v1/beatmaps", params={"set_id": beatmapset_id})
+                if response.status_code == 200:
+                    self.beatmaps.extend(response.json()["data"])
+
+        await asyncio.gather(*(seed_one(beatmapset_id)
+                               for beatmapset_id in range(1, beatmapsets + 1)))
+        if not self.beatmaps:
+            raise RuntimeError("Failed to seed any beatmaps")
+
+    async def hot_read(self, state: dict[str, Any]) -> httpx.Response:
+        beatmap = self.rng.choice(self.beatmaps)
+        return await self.client.get(f"/v1/beatmaps/{beatmap['beatmap_id']}")
+
+    async def md5_lookup(self, state: dict[str, Any]) -> httpx.Response:
+        beatmap = self.rng.choice(self.beatmaps)
+        return await self.client.post("/v1/beatmaps/lookup",
+                                      json={"md5_hashes": [beatmap["md5_hash"]]})
+
+    async def list_page(self, state: dict[str, Any]) -> httpx.Response:
+        params = {"page_size": 50}
+        if state.get("cursor") is not None:
+            params["cursor"] = state["cursor"]
+
+        response = await self.client.get("/v1/beatmaps", params=params)
+        if response.status_code == 200:
+            state["cursor"] = response.json()["meta"]["next_cursor"]
+        return response
+
+    async def cold_miss(self, state: dict[str, Any]) -> httpx.Response:
+        return await self.client.get(f"/v1/beatmapsets/{self._unseeded_id()}")
+
+    async def write(self, state: dict[str, Any]) -> httpx.Response:
+        beatmap = dict(self.rng.choice(self.beatmaps))
+        beatmap["beatmap_id"] = self._unseeded_id()
+        beatmap["md5_hash"] = self.rng.randbytes(16).hex()
+        for key in ("created_at", "updated_at"):
+            beatmap.pop(key, None)
+        return await self.client.post("/v1/beatmaps", json=beatmap)
+
+    async def worker(self, deadline: float) -> None:
+        scenarios: dict[str, Callable[[dict[str, Any]],
+                                      Awaitable[httpx.Response]]] = {
+            name: getattr(self, name) for name in self.mix
+        }
+        names = list(self.mix)
+        weights = list(self.mix.values())
+        state: dict[str, Any] = {}
+
+        while time.monotonic() < deadline:
+            name = self.rng.choices(names, weights)[0]
+            start_time = time.perf_counter()
+            try:
+                response = await scenarios[name](state)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latency = time.perf_counter() - start_time
+
+            if failed:
+                self.errors[name] += 1
+            else:
+                self.latencies[name].append(latency)
+
+    async def run(self, duration: float, concurrency: int) -> float:
+        start_time = time.monotonic()
+        deadline = start_time + duration
+        await asyncio.gather(*(self.worker(deadline)
+                               for _ in range(concurrency)))
+        return time.monotonic() - start_time
+
+    def report(self, elapsed: float) -> dict[str, Any]:
+        all_latencies = [latency for latencies in self.latencies.values()
+                         for latency in latencies]
+        return {
+            "endpoints": {name: summarize(self.latencies[name],
+                                          self.errors[name], elapsed)
+                          for name in self.mix},
+            "total": summarize(all_latencies, sum(self.errors.values()),
+                               elapsed),
+        }
+
+
+@asynccontextmanager
+async def in_process_client(args: argparse.Namespace
+                            ) -> AsyncIterator[httpx.AsyncClient]:
+    import uvicorn
+    from app.common import settings
+    from benchmarks.osu_api_simulator import OsuAPISimulator
+
+    simulator = OsuAPISimulator(latency=args.upstream_latency,
+                                jitter=args.upstream_jitter,
+                                error_rate_429=args.upstream_error_rate_429,
+                                error_rate_5xx=args.upstream_error_rate_5xx,
+                                max_requests_per_minute=args.upstream_rpm,
+                                seed=args.seed)
+    server = uvicorn.Server(uvicorn.Config(simulator.app, host="127.0.0.1",
+                                           port=0, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    host, port = server.servers[0].sockets[0].getsockname()[:2]
+    settings.OSU_API_BASE_URL = f"http://{host}:{port}"
+
+    from app.api.rest import init_api
+
+    api = init_api()
+    await api.router.startup()
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api),
+                                     base_url="http://beatmaps-service",
+                                     timeout=None) as client:
+            yield client
+    finally:
+        await api.router.shutdown()
+        server.should_exit = True
+        await server_task
+
+
+@asynccontextmanager
+async def remote_client(args: argparse.Namespace
+                        ) -> AsyncIterator[httpx.AsyncClient]:
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits,
+                                 timeout=None) as client:
+        yield client
+
+
+def compare(report: dict[str, Any], baseline: dict[str, Any]) -> None:
+    print(f"\n{'':<12} {'rps':>18} {'p50 ms':>20} {'p99 ms':>20}")
+    rows = {**report["endpoints"], "total": report["total"]}
+    for name, current in rows.items():
+        if name == "total":
+            previous = baseline.get("total")
+        else:
+            previous = baseline.get("endpoints", {}).get(name)
+        if previous is None or "latency_ms" not in current or \
+                "latency_ms" not in previous:
+            continue
+
+        columns = [(previous["throughput_rps"], current["throughput_rps"])]
+        for pct in ("p50", "p99"):
+            columns.append((previous["latency_ms"][pct],
+                            current["latency_ms"][pct]))
+
+        cells = []
+        for before, after in columns:
+            change = (after - before) / before * 100 if before else 0.0
+            cells.append(f"{after:>10.2f} ({change:+6.1f}%)")
+        print(f"{name:<12} " + " ".join(cells))
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    make_client = remote_client if args.url else in_process_client
+    async with make_client(args) as client:
+        load_test = LoadTest(client, args.mix, args.seed)
+        await load_test.seed(args.hot_sets)
+
+        if args.warmup > 0:
+            await load_test.run(args.warmup, args.concurrency)
+            load_test.latencies.clear()
+            load_test.errors.clear()
+
+        elapsed = await load_test.run(args.duration, args.concurrency)
+
+    report = load_test.report(elapsed)
+    report["meta"] = {
+        "revision": git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "target": args.url or "in-process",
+        "duration": round(elapsed, 3),
+        "concurrency": args.concurrency,
+        "mix": args.mix,
+        "hot_beatmaps": len(load_test.beatmaps),
+        "seed": args.seed,
+    }
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default=None,
+                        help="base url of a running service")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--mix", type=parse_mix,
+                        default=parse_mix(DEFAULT_MIX))
+    parser.add_argument("--hot-sets", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--upstream-latency", type=float, default=0.05)
+    parser.add_argument("--upstream-jitter", type=float, default=0.02)
+    parser.add_argument("--upstream-error-rate-429", type=float, default=0.0)
+    parser.add_argument("--upstream-error-rate-5xx", type=float, default=0.0)
+    parser.add_argument("--upstream-rpm", type=int, default=0)
+    parser.add_argument("--output", default=None,
+                        help="path to write the json report to")
+    parser.add_argument("--compare", default=None,
+                        help="path of a previous report to compare against")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    encoded = orjson.dumps(report, option=orjson.OPT_INDENT_2)
+
+    if args.output is not None:
+        with open(args.output, "wb") as f:
+            f.write(encoded)
+    else:
+        print(encoded.decode())
+
+    if args.compare is not None:
+        with open(args.compare, "rb") as f:
+            compare(report, orjson.loads(f.read()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""\
+Microbenchmarks for the per-row hot paths of building a response.
+
+Each benchmark reports the best time per operation, in µs, over several
+repeats. Results may be saved as a baseline & later runs checked against
+it; any benchmark slower than the baseline by more than the threshold is
+reported as a regression, and the exit status is non-zero.
+
+With --database, reads through the repositories are also benchmarked,
+against the (already seeded) database configured in the environment; these
+include the round trip to mysql, so are only comparable on the same setup.
+
+Usage: python -m benchmarks.micro [--filter serialize] [--save base.json]
+                                  [--baseline base.json] [--threshold 0.15]
+                                  [--history history.jsonl] [--database]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json as stdlib_json
+import platform
+import sys
+import timeit
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any
+from typing import Callable
+from typing import Iterator
+
+import orjson
+from app.common import json
+from app.common import responses
+from app.common import settings
+from app.common.context import Context
+from app.models.beatmaps import Beatmap
+from app.models.beatmapsets import Beatmapset
+from app.repositories.beatmaps import BeatmapsRepo
+from app.repositories.beatmapsets import BeatmapsetsRepo
+from app.services import database
+from app.services import osu_api
+from app.services import redis
+from benchmarks.load import git_revision
+from benchmarks.serialization import beatmap_row
+from benchmarks.serialization import beatmapset_row
+
+RESPONSE_SIZES = (1, 50, 500)
+
+# rows read per call by the repository benchmarks
+DATABASE_PAGE_SIZE = 50
+
+
+def measure(fn: Callable[[], Any], ops: int = 1) -> float:
+    """Best time per operation in µs, for a callable performing `ops` ops."""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=5, number=number))
+    return best / number / ops * 1e6
+
+
+class BenchmarkContext(Context):
+    """A context with only a database; the benchmarks only read from it."""
+
+    def __init__(self, db: database.ServiceDatabase) -> None:
+        self._db = db
+
+    @property
+    def db(self) -> database.ServiceDatabase:
+        return self._db
+
+    @property
+    def redis(self) -> redis.ServiceRedis:
+        raise RuntimeError("Redis is not available to benchmarks")
+
+    @property
+    def osu_api_client(self) -> osu_api.OsuAPIClient:
+        raise RuntimeError("The osu!api is not available to benchmarks")
+
+
+@contextmanager
+def connected_database() -> Iterator[tuple[asyncio.AbstractEventLoop,
+                                           database.ServiceDatabase]]:
+    """The configured database, & a loop to run it's (sync-timed) queries on."""
+    loop = asyncio.new_event_loop()
+    db = database.ServiceDatabase(
+        read_dsns=[
+            database.dsn(
+                driver=settings.READ_DB_DRIVER,
+                user=settings.READ_DB_USER,
+                password=settings.READ_DB_PASS,
+                host=host,
+                port=port,
+                database=settings.READ_DB_NAME,
+            )
+            for host, port in settings.READ_DB_REPLICAS
+        ],
+        write_dsn=database.dsn(
+            driver=settings.WRITE_DB_DRIVER,
+            user=settings.WRITE_DB_USER,
+            password=settings.WRITE_DB_PASS,
+            host=settings.WRITE_DB_HOST,
+            port=settings.WRITE_DB_PORT,
+            database=settings.WRITE_DB_NAME,
+        ),
+        min_pool_size=settings.MIN_DB_POOL_SIZE,
+        max_pool_size=settings.MAX_DB_POOL_SIZE,
+        ssl=settings.DB_USE_SSL,
+    )
+    loop.run_until_complete(db.connect())
+    try:
+        yield loop, db
+    finally:
+        loop.run_until_complete(db.disconnect())
+        loop.close()
+
+
+def database_benchmarks(loop: asyncio.AbstractEventLoop,
+                        db: database.ServiceDatabase
+                        ) -> dict[str, tuple[Callable[[], Any], int]]:
+    """\
+    Benchmarks of reads through the public repository api, by name; the
+    mapping of result rows by `databases` is included, per row.
+    """
+    ctx = BenchmarkContext(db)
+    beatmaps_repo = BeatmapsRepo(ctx)
+    beatmapsets_repo = BeatmapsetsRepo(ctx)
+
+    beatmap_ids = [row["beatmap_id"] for row in loop.run_until_complete(
+        beatmaps_repo.fetch_many(page_size=DATABASE_PAGE_SIZE))]
+    beatmapset_ids = [row["beatmapset_id"] for row in loop.run_until_complete(
+        beatmapsets_repo.fetch_many(page_size=DATABASE_PAGE_SIZE))]
+    if not beatmap_ids or not beatmapset_ids:
+        raise RuntimeError("The database must be seeded to benchmark it")
+
+    def run(fn: Callable[[], Any]) -> Callable[[], Any]:
+        return lambda: loop.run_until_complete(fn())
+
+    return {
+        "repositories.beatmaps.fetch_one": (
+            run(lambda: beatmaps_repo.fetch_one(beatmap_ids[0])), 1),
+        f"repositories.beatmaps.fetch_many_by_ids.{len(beatmap_ids)}": (
+            run(lambda: beatmaps_repo.fetch_many_by_ids(beatmap_ids)),
+            len(beatmap_ids)),
+        "repositories.beatmapsets.fetch_one": (
+            run(lambda: beatmapsets_repo.fetch_one(beatmapset_ids[0])), 1),
+        f"repositories.beatmapsets.fetch_many_by_ids.{len(beatmapset_ids)}": (
+            run(lambda: beatmapsets_repo.fetch_many_by_ids(beatmapset_ids)),
+            len(beatmapset_ids)),
+    }
+
+
+def benchmarks() -> dict[str, tuple[Callable[[], Any], int]]:
+    """Benchmarks by name, as (callable, operations per call)."""
+    beatmap = beatmap_row(1)
+    beatmapset = beatmapset_row(1)
+    covers = stdlib_json.dumps(beatmapset["covers"])
+
+    beatmap_models = [Beatmap.from_mapping(beatmap_row(i)) for i in range(50)]
+
+    cases: dict[str, tuple[Callable[[], Any], int]] = {
+        "from_mapping.beatmap": (lambda: Beatmap.from_mapping(beatmap), 1),
+        "from_mapping.beatmapset": (
+            lambda: Beatmapset.from_mapping(beatmapset), 1),
+        "serialize.beatmap": (lambda: Beatmap.serialize(beatmap), 1),
+        "serialize.beatmapset": (lambda: Beatmapset.serialize(beatmapset), 1),
+        # a response of models falls back to the default processor per model
+        "json_dumps.models.50": (lambda: json.dumps(beatmap_models), 1),
+        # aiomysql's DeserializationCursor decodes json columns with the
+        # stdlib; orjson is measured alongside for comparison
+        "covers.json_loads": (lambda: stdlib_json.loads(covers), 1),
+        "covers.orjson_loads": (lambda: orjson.loads(covers), 1),
+    }
+
+    for size in RESPONSE_SIZES:
+        rows = [beatmap_row(i) for i in range(size)]
+        cases[f"responses.success.beatmaps.{size}"] = (
+            lambda rows=rows: responses.success(
+                [Beatmap.serialize(row) for row in rows]), 1)
+
+    return cases
+
+
+def compare(results: dict[str, float], baseline: dict[str, float],
+            threshold: float) -> list[str]:
+    """Print the change against a baseline; returns the regressed names."""
+    regressions = []
+    print(f"\n{'benchmark':<36} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+
+        change = (current - previous) / previous
+        regressed = change > threshold
+        if regressed:
+            regressions.append(name)
+
+        print(f"{name:<36} {previous:>10.3f} {current:>10.3f} "
+              f"{change * 100:>+7.1f}%" + ("  REGRESSED" if regressed else ""))
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--filter", default=None,
+                        help="only run benchmarks whose name contains this")
+    parser.add_argument("--save", default=None,
+                        help="path to write the results to, as a baseline")
+    parser.add_argument("--baseline", default=None,
+                        help="path of saved results to check against")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="slowdown (as a fraction) counted as a regression")
+    parser.add_argument("--history", default=None,
+                        help="path of a json lines file to append results to")
+    parser.add_argument("--database", action="store_true",
+                        help="also benchmark reads from the configured database")
+    args = parser.parse_args()
+
+    results: dict[str, float] = {}
+
+    def run(cases: dict[str, tuple[Callable[[], Any], int]]) -> None:
+        for name, (fn, ops) in cases.items():
+            if args.filter is not None and args.filter not in name:
+                continue
+
+            results[name] = round(measure(fn, ops), 4)
+            print(f"{name:<36} {results[name]:>10.3f} µs/op")
+
+    run(benchmarks())
+    if args.database:
+        with connected_database() as (loop, db):
+            run(database_benchmarks(loop, db))
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+        },
+        "results": results,
+    }
+
+    if args.save is not None:
+        with open(args.save, "wb") as f:
+            f.write(orjson.dumps(report, option=orjson.OPT_INDENT_2))
+
+    if args.history is not None:
+        with open(args.history, "ab") as f:
+            f.write(orjson.dumps(report) + b"\n")
+
+    if args.baseline is not None:
+        with open(args.baseline, "rb") as f:
+            baseline = orjson.loads(f.read())["results"]
+
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed by more than "
+                  f"{args.threshold * 100:.0f}%", file=sys.stderr)
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
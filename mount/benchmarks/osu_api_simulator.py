@@ -0,0 +1,369 @@
+"""\
+An offline simulator of the parts of the osu!api we depend on.
+
+Beatmapsets & beatmaps are generated deterministically from their ids, so
+any id can be fetched without a fixture. Set `n` has beatmaps `n * 10 + k`
+for k below it's difficulty count; other ids 404, as they would upstream.
+Checksums are md5-shaped, but carry the beatmap's id, so any beatmap can
+be looked up by it's checksum without having been fetched first.
+
+Run in-process by passing `simulator.transport()` to `OsuAPIClient`, or as
+a standalone server (e.g. for load benchmarks against a running service):
+
+    python -m benchmarks.osu_api_simulator --port 8081 --latency 0.05
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import random
+import re
+import secrets
+import time
+from collections import Counter
+from collections import deque
+from datetime import datetime
+from datetime import timedelta
+from typing import Any
+
+import httpx
+from fastapi import FastAPI
+from fastapi import Query
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from fastapi.responses import Response
+
+MODES = ("osu", "taiko", "fruits", "mania")
+
+# ranked status -> status string
+STATUSES = {-2: "graveyard", -1: "wip", 0: "pending", 1: "ranked",
+            2: "approved", 3: "qualified", 4: "loved"}
+
+MAX_BEATMAPS_PER_REQUEST = 50
+
+EPOCH = datetime(2010, 1, 1)
+
+
+def _checksum(beatmap_id: int) -> str:
+    # the hash's high half, followed by the id as the low half
+    digest = hashlib.md5(f"beatmap:{beatmap_id}".encode()).hexdigest()
+    return digest[:16] + f"{beatmap_id:016x}"
+
+
+def beatmap_id_from_checksum(checksum: str) -> int | None:
+    try:
+        beatmap_id = int(checksum[16:], 16)
+    except ValueError:
+        return None
+
+    if _checksum(beatmap_id) != checksum:
+        return None
+    return beatmap_id
+
+
+def _timestamp(value: datetime) -> str:
+    return value.isoformat(timespec="seconds") + "Z"
+
+
+def difficulty_count(beatmapset_id: int) -> int:
+    return random.Random(beatmapset_id).randint(1, 6)
+
+
+def generate_beatmapset(beatmapset_id: int, with_beatmaps: bool = True
+                        ) -> dict[str, Any]:
+    rng = random.Random(beatmapset_id)
+    ranked = rng.choice(tuple(STATUSES))
+    submitted_date = EPOCH + timedelta(seconds=rng.randint(0, 400_000_000))
+    last_updated = submitted_date + \
+        timedelta(seconds=rng.randint(0, 30_000_000))
+    ranked_date = last_updated if ranked > 0 else None
+    can_be_hyped = ranked in (-1, 0)
+    user_id = rng.randint(2, 30_000_000)
+    title = f"Simulated Song {beatmapset_id}"
+    artist = f"Simulated Artist {rng.randint(1, 5000)}"
+    creator = f"mapper{user_id}"
+    bpm = float(rng.randint(60, 300))
+    covers_url = f"https://assets.ppy.sh/beatmaps/{beatmapset_id}/covers"
+
+    beatmapset = {
+        "artist": artist,
+        "artist_unicode": artist,
+        "covers": {
+            "cover": f"{covers_url}/cover.jpg",
+            "cover@2x": f"{covers_url}/cover@2x.jpg",
+            "card": f"{covers_url}/card.jpg",
+            "card@2x": f"{covers_url}/card@2x.jpg",
+            "list": f"{covers_url}/list.jpg",
+            "list@2x": f"{covers_url}/list@2x.jpg",
+            "slimcover": f"{covers_url}/slimcover.jpg",
+            "slimcover@2x": f"{covers_url}/slimcover@2x.jpg",
+        },
+        "creator": creator,
+        "favourite_count": rng.randint(0, 50_000),
+        "hype": ({"current": rng.randint(0, 5), "required": 5}
+                 if can_be_hyped else None),
+        "id": beatmapset_id,
+        "nsfw": rng.random() < 0.02,
+        "offset": 0,
+        "play_count": rng.randint(0, 10_000_000),
+        "preview_url": f"//b.ppy.sh/preview/{beatmapset_id}.mp3",
+        "source": "",
+        "spotlight": False,
+        "status": STATUSES[ranked],
+        "title": title,
+        "title_unicode": title,
+        "track_id": None,
+        "user_id": user_id,
+        "video": rng.random() < 0.1,
+        "availability": {"download_disabled": False,
+                         "more_information": None},
+        "bpm": bpm,
+        "can_be_hyped": can_be_hyped,
+        "discussion_enabled": True,
+        "discussion_locked": False,
+        "is_scoreable": ranked > 0,
+        "last_updated": _timestamp(last_updated),
+        "legacy_thread_url": f"https://osu.ppy.sh/community/forums/topics/{beatmapset_id}",
+        "nominations_summary": {"current": rng.randint(0, 2), "required": 2},
+        "ranked": ranked,
+        "ranked_date": (_timestamp(ranked_date)
+                        if ranked_date is not None else None),
+        "storyboard": rng.random() < 0.05,
+        "submitted_date": _timestamp(submitted_date),
+        "tags": " ".join(f"tag{rng.randint(1, 1000)}" for _ in range(5)),
+        "user": {"id": user_id, "username": creator},
+    }
+    if with_beatmaps:
+        beatmapset["beatmaps"] = [
+            generate_beatmap(beatmapset_id * 10 + k, with_beatmapset=False)
+            for k in range(difficulty_count(beatmapset_id))
+        ]
+    return beatmapset
+
+
+def generate_beatmap(beatmap_id: int, with_beatmapset: bool = True
+                     ) -> dict[str, Any] | None:
+    beatmapset_id, k = divmod(beatmap_id, 10)
+    if beatmapset_id <= 0 or k >= difficulty_count(beatmapset_id):
+        return None
+
+    beatmapset = generate_beatmapset(beatmapset_id, with_beatmaps=False)
+    rng = random.Random(beatmap_id)
+    mode_int = rng.choices(range(4), weights=(70, 10, 5, 15))[0]
+    total_length = rng.randint(30, 600)
+    count_circles = rng.randint(50, 2000)
+    count_sliders = rng.randint(0, 1000)
+    count_spinners = rng.randint(0, 5)
+    passcount = rng.randint(0, 1_000_000)
+
+    beatmap = {
+        "beatmapset_id": beatmapset_id,
+        "difficulty_rating": round(rng.uniform(0.5, 10), 2),
+        "id": beatmap_id,
+        "mode": MODES[mode_int],
+        "status": beatmapset["status"],
+        "total_length": total_length,
+        "user_id": beatmapset["user_id"],
+        "version": f"Difficulty {k + 1}",
+        "accuracy": round(rng.uniform(0, 10), 1),
+        "ar": round(rng.uniform(0, 10), 1),
+        "bpm": beatmapset["bpm"],
+        "convert": False,
+        "count_circles": count_circles,
+        "count_sliders": count_sliders,
+        "count_spinners": count_spinners,
+        "cs": round(rng.uniform(2, 7), 1),
+        "deleted_at": None,
+        "drain": round(rng.uniform(0, 10), 1),
+        "hit_length": max(1, total_length - rng.randint(0, 30)),
+        "is_scoreable": beatmapset["is_scoreable"],
+        "last_updated": beatmapset["last_updated"],
+        "mode_int": mode_int,
+        "passcount": passcount,
+        "playcount": passcount + rng.randint(0, 5_000_000),
+        "ranked": beatmapset["ranked"],
+        "url": f"https://osu.ppy.sh/beatmaps/{beatmap_id}",
+        "checksum": _checksum(beatmap_id),
+        "max_combo": count_circles + count_sliders * 2 + count_spinners,
+    }
+    if with_beatmapset:
+        beatmap["beatmapset"] = beatmapset
+    return beatmap
+
+
+class OsuAPISimulator:
+    """\
+    A fake osu!api, with configurable latency, fault injection & rate limits.
+
+    - `latency` & `jitter` are in seconds; each response is delayed by
+      `latency` plus up to `jitter` (uniformly).
+    - `error_rate_429` & `error_rate_5xx` are the probabilities (0 to 1)
+      that an api request fails with the given status regardless of load.
+    - `max_requests_per_minute` is enforced over a sliding window; requests
+      past it get a 429, like upstream. 0 disables the limit.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate_429: float = 0.0, error_rate_5xx: float = 0.0,
+                 max_requests_per_minute: int = 0,
+                 token_expires_in: int = 86400, seed: int | None = None
+                 ) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate_429 = error_rate_429
+        self.error_rate_5xx = error_rate_5xx
+        self.max_requests_per_minute = max_requests_per_minute
+        self.token_expires_in = token_expires_in
+
+        self._rng = random.Random(seed)
+        self._tokens: dict[str, float] = {}  # access token -> expiry
+        self._window: deque[float] = deque()
+
+        # requests received, by endpoint & status
+        self.requests: Counter[tuple[str, int]] = Counter()
+
+        self.app = self._create_app()
+
+    def transport(self) -> httpx.AsyncBaseTransport:
+        return httpx.ASGITransport(app=self.app)
+
+    def total_requests(self, status: int | None = None) -> int:
+        return sum(count for (_, code), count in self.requests.items()
+                   if status is None or code == status)
+
+    def reset(self) -> None:
+        self.requests.clear()
+        self._window.clear()
+
+    def _rate_limited(self) -> bool:
+        if self.max_requests_per_minute <= 0:
+            return False
+
+        now = time.monotonic()
+        while self._window and self._window[0] <= now - 60:
+            self._window.popleft()
+
+        if len(self._window) >= self.max_requests_per_minute:
+            return True
+
+        self._window.append(now)
+        return False
+
+    def _fault(self) -> int | None:
+        roll = self._rng.random()
+        if roll < self.error_rate_429:
+            return 429
+        if roll < self.error_rate_429 + self.error_rate_5xx:
+            return self._rng.choice((500, 502, 503))
+        return None
+
+    def _authorized(self, request: Request) -> bool:
+        scheme, _, token = request.headers.get(
+            "Authorization", "").partition(" ")
+        expires_at = self._tokens.get(token)
+        return (scheme == "Bearer" and expires_at is not None and
+                time.monotonic() < expires_at)
+
+    def _create_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.middleware("http")
+        async def simulate(request: Request, call_next):
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            path = request.scope["path"]
+            if path.startswith("/api/"):
+                if not self._authorized(request):
+                    response = Response(status_code=401)
+                elif self._rate_limited():
+                    response = Response(status_code=429,
+                                        headers={"Retry-After": "60"})
+                elif (status_code := self._fault()) is not None:
+                    response = Response(status_code=status_code)
+                else:
+                    response = await call_next(request)
+            else:
+                response = await call_next(request)
+
+            endpoint = re.sub(r"/\d+", "/{id}", path)
+            self.requests[(endpoint, response.status_code)] += 1
+            return response
+
+        @app.post("/oauth/token")
+        async def oauth_token() -> JSONResponse:
+            access_token = secrets.token_hex(32)
+            self._tokens[access_token] = (time.monotonic() +
+                                          self.token_expires_in)
+            return JSONResponse({"token_type": "Bearer",
+                                 "expires_in": self.token_expires_in,
+                                 "access_token": access_token,
+                                 "refresh_token": secrets.token_hex(32)})
+
+        @app.get("/api/v2/beatmaps/lookup")
+        async def lookup_beatmap(checksum: str) -> Response:
+            beatmap_id = beatmap_id_from_checksum(checksum)
+            beatmap = (generate_beatmap(beatmap_id)
+                       if beatmap_id is not None else None)
+            if beatmap is None:
+                return JSONResponse({"error": None}, status_code=404)
+            return JSONResponse(beatmap)
+
+        @app.get("/api/v2/beatmaps/{beatmap_id}")
+        async def get_beatmap(beatmap_id: int) -> Response:
+            beatmap = generate_beatmap(beatmap_id)
+            if beatmap is None:
+                return JSONResponse({"error": None}, status_code=404)
+            return JSONResponse(beatmap)
+
+        @app.get("/api/v2/beatmaps")
+        async def get_beatmaps(ids: list[int] = Query([], alias="ids[]")
+                               ) -> Response:
+            beatmaps = []
+            for beatmap_id in ids[:MAX_BEATMAPS_PER_REQUEST]:
+                beatmap = generate_beatmap(beatmap_id)
+                if beatmap is not None:
+                    beatmaps.append(beatmap)
+            return JSONResponse({"beatmaps": beatmaps})
+
+        @app.get("/api/v2/beatmapsets/{beatmapset_id}")
+        async def get_beatmapset(beatmapset_id: int) -> Response:
+            if beatmapset_id <= 0:
+                return JSONResponse({"error": None}, status_code=404)
+
+            return JSONResponse(generate_beatmapset(beatmapset_id))
+
+        return app
+
+
+def main() -> int:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate-429", type=float, default=0.0)
+    parser.add_argument("--error-rate-5xx", type=float, default=0.0)
+    parser.add_argument("--max-requests-per-minute", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    simulator = OsuAPISimulator(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate_429=args.error_rate_429,
+        error_rate_5xx=args.error_rate_5xx,
+        max_requests_per_minute=args.max_requests_per_minute,
+        seed=args.seed,
+    )
+    uvicorn.run(simulator.app, host=args.host, port=args.port,
+                log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
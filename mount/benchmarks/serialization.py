@@ -0,0 +1,109 @@
+"""\
+Measure the per-row cost of turning database rows into a response body.
+
+Compares building a pydantic model per row (`from_mapping`, as responses
+were previously built) against shaping rows directly (`serialize`).
+
+Usage: python -m benchmarks.serialization [--rows 100] [--iterations 200]
+"""
+from __future__ import annotations
+
+import argparse
+import timeit
+import uuid
+from datetime import datetime
+from typing import Any
+from typing import Callable
+
+import orjson
+from app.common import json
+from app.models.beatmaps import Beatmap
+from app.models.beatmapsets import Beatmapset
+from pydantic import BaseModel
+
+
+def _legacy_default_processor(data: Any) -> Any:
+    # json._default_processor, before the fast path was introduced
+    if isinstance(data, BaseModel):
+        return _legacy_default_processor(data.dict())
+    elif isinstance(data, dict):
+        return {k: _legacy_default_processor(v) for k, v in data.items()}
+    elif isinstance(data, list):
+        return [_legacy_default_processor(v) for v in data]
+    elif isinstance(data, uuid.UUID):
+        return str(data)
+    else:
+        return data
+
+
+def beatmap_row(i: int) -> dict[str, Any]:
+    return {
+        "beatmap_id": i, "md5_hash": f"{i:032x}", "set_id": i // 4,
+        "mode": "osu", "convert": 0, "od": 8, "ar": 9, "cs": 4, "hp": 5,
+        "bpm": 180.0, "hit_length": 150, "total_length": 160,
+        "count_circles": 600, "count_sliders": 300, "count_spinners": 2,
+        "difficulty_rating": 5.75, "is_scoreable": 1, "pass_count": 1000,
+        "play_count": 10000, "version": "Insane", "mapper_id": 1000,
+        "ranked_status": 1, "status": "active",
+        "created_at": datetime(2022, 1, 1), "updated_at": datetime(2022, 1, 2),
+    }
+
+
+def beatmapset_row(i: int) -> dict[str, Any]:
+    return {
+        "beatmapset_id": i, "artist": "Camellia", "artist_unicode": "かめりあ",
+        "covers": {"cover": "https://assets.ppy.sh/beatmaps/1/covers/cover.jpg",
+                   "card": "https://assets.ppy.sh/beatmaps/1/covers/card.jpg"},
+        "creator": "mapper", "favourite_count": 100, "nsfw": 0,
+        "osu_play_count": 100000, "preview_url": "//b.ppy.sh/preview/1.mp3",
+        "source": "", "title": "Exit This Earth's Atomosphere",
+        "title_unicode": "Exit This Earth's Atomosphere", "mapper_id": 1000,
+        "mapper_name": "mapper", "video": 0, "download_disabled": 0,
+        "availability_information": None, "bpm": 180.0, "can_be_hyped": 0,
+        "discussion_locked": 0, "current_hype": 0, "required_hype": 0,
+        "is_scoreable": 1, "osu_updated_at": datetime(2022, 1, 1),
+        "legacy_thread_url": "https://osu.ppy.sh/community/forums/topics/1",
+        "current_nominations": 2, "required_nominations": 2,
+        "ranked_status": 1, "osu_ranked_at": datetime(2022, 1, 1),
+        "storyboard": 0, "osu_submitted_at": datetime(2021, 1, 1),
+        "tags": "camellia electronic", "status": "active",
+        "created_at": datetime(2022, 1, 1), "updated_at": datetime(2022, 1, 2),
+    }
+
+
+def bench(name: str, fn: Callable[[], bytes], rows: int, iterations: int) -> float:
+    fn()  # warm up
+    total = min(timeit.repeat(fn, number=iterations, repeat=5))
+    per_row_us = total / iterations / rows * 1e6
+    print(f"  {name:<12} {per_row_us:8.2f} µs/row")
+    return per_row_us
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    for model, make_row in ((Beatmap, beatmap_row), (Beatmapset, beatmapset_row)):
+        rows = [make_row(i) for i in range(args.rows)]
+
+        def before() -> bytes:
+            resp = [model.from_mapping(row) for row in rows]
+            return orjson.dumps({"status": "success", "data": resp},
+                                default=_legacy_default_processor)
+
+        def after() -> bytes:
+            resp = [model.serialize(row) for row in rows]
+            return json.dumps({"status": "success", "data": resp})
+
+        assert orjson.loads(before()) == orjson.loads(after())
+
+        print(f"{model.__name__} ({args.rows} rows per response)")
+        before_us = bench("from_mapping", before, args.rows, args.iterations)
+        after_us = bench("serialize", after, args.rows, args.iterations)
+        print(f"  speedup      {before_us / after_us:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2 @@
+DROP INDEX beatmapsets_updated_at_idx ON beatmapsets;
+DROP INDEX beatmaps_updated_at_idx ON beatmaps;
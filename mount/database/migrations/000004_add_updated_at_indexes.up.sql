@@ -0,0 +1,2 @@
+CREATE INDEX beatmaps_updated_at_idx ON beatmaps (updated_at, beatmap_id);
+CREATE INDEX beatmapsets_updated_at_idx ON beatmapsets (updated_at, beatmapset_id);
@@ -0,0 +1,7 @@
+DROP INDEX beatmapsets_ranked_status_idx ON beatmapsets;
+DROP INDEX beatmapsets_title_idx ON beatmapsets;
+DROP INDEX beatmapsets_creator_idx ON beatmapsets;
+DROP INDEX beatmapsets_artist_idx ON beatmapsets;
+
+DROP INDEX beatmaps_ranked_status_mode_idx ON beatmaps;
+DROP INDEX beatmaps_set_id_idx ON beatmaps;
@@ -0,0 +1,7 @@
+CREATE INDEX beatmaps_set_id_idx ON beatmaps (set_id);
+CREATE INDEX beatmaps_ranked_status_mode_idx ON beatmaps (ranked_status, mode);
+
+CREATE INDEX beatmapsets_artist_idx ON beatmapsets (artist);
+CREATE INDEX beatmapsets_creator_idx ON beatmapsets (creator);
+CREATE INDEX beatmapsets_title_idx ON beatmapsets (title);
+CREATE INDEX beatmapsets_ranked_status_idx ON beatmapsets (ranked_status);
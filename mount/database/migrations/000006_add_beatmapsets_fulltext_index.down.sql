@@ -0,0 +1,11 @@
+DROP INDEX beatmapsets_search_idx ON beatmapsets;
+
+-- restore the types from 000003_create_beatmapsets_table exactly
+ALTER TABLE beatmapsets
+    MODIFY artist VARCHAR(64) NOT NULL,
+    MODIFY artist_unicode NVARCHAR(64) NOT NULL,
+    MODIFY title VARCHAR(64) NOT NULL,
+    MODIFY title_unicode NVARCHAR(64) NOT NULL,
+    MODIFY source VARCHAR(64) NOT NULL,
+    MODIFY tags VARCHAR(256) NOT NULL,
+    MODIFY creator VARCHAR(64) NOT NULL;
@@ -0,0 +1,15 @@
+-- fulltext indexes require all of their columns to share a charset;
+-- the *_unicode columns are NVARCHAR (utf8mb3), while the others take the
+-- table's default, so declare the same charset on all of them explicitly
+ALTER TABLE beatmapsets
+    MODIFY artist VARCHAR(64) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL,
+    MODIFY artist_unicode VARCHAR(64) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL,
+    MODIFY title VARCHAR(64) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL,
+    MODIFY title_unicode VARCHAR(64) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL,
+    MODIFY source VARCHAR(64) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL,
+    MODIFY tags VARCHAR(256) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL,
+    MODIFY creator VARCHAR(64) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL;
+
+CREATE FULLTEXT INDEX beatmapsets_search_idx ON beatmapsets (
+    artist, artist_unicode, title, title_unicode, source, tags, creator
+);
@@ -0,0 +1,13 @@
+DROP INDEX beatmaps_search_pass_count_idx ON beatmaps;
+DROP INDEX beatmaps_search_play_count_idx ON beatmaps;
+DROP INDEX beatmaps_search_count_spinners_idx ON beatmaps;
+DROP INDEX beatmaps_search_count_sliders_idx ON beatmaps;
+DROP INDEX beatmaps_search_count_circles_idx ON beatmaps;
+DROP INDEX beatmaps_search_total_length_idx ON beatmaps;
+DROP INDEX beatmaps_search_hit_length_idx ON beatmaps;
+DROP INDEX beatmaps_search_hp_idx ON beatmaps;
+DROP INDEX beatmaps_search_cs_idx ON beatmaps;
+DROP INDEX beatmaps_search_od_idx ON beatmaps;
+DROP INDEX beatmaps_search_ar_idx ON beatmaps;
+DROP INDEX beatmaps_search_bpm_idx ON beatmaps;
+DROP INDEX beatmaps_search_difficulty_rating_idx ON beatmaps;
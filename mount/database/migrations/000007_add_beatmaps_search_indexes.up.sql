@@ -0,0 +1,15 @@
+-- searches filter by mode & ranked status, then by a range over (or sort
+-- by) one of the attributes in app.models.beatmaps; each is indexed
+CREATE INDEX beatmaps_search_difficulty_rating_idx ON beatmaps (mode, ranked_status, difficulty_rating);
+CREATE INDEX beatmaps_search_bpm_idx ON beatmaps (mode, ranked_status, bpm);
+CREATE INDEX beatmaps_search_ar_idx ON beatmaps (mode, ranked_status, ar);
+CREATE INDEX beatmaps_search_od_idx ON beatmaps (mode, ranked_status, od);
+CREATE INDEX beatmaps_search_cs_idx ON beatmaps (mode, ranked_status, cs);
+CREATE INDEX beatmaps_search_hp_idx ON beatmaps (mode, ranked_status, hp);
+CREATE INDEX beatmaps_search_hit_length_idx ON beatmaps (mode, ranked_status, hit_length);
+CREATE INDEX beatmaps_search_total_length_idx ON beatmaps (mode, ranked_status, total_length);
+CREATE INDEX beatmaps_search_count_circles_idx ON beatmaps (mode, ranked_status, count_circles);
+CREATE INDEX beatmaps_search_count_sliders_idx ON beatmaps (mode, ranked_status, count_sliders);
+CREATE INDEX beatmaps_search_count_spinners_idx ON beatmaps (mode, ranked_status, count_spinners);
+CREATE INDEX beatmaps_search_play_count_idx ON beatmaps (mode, ranked_status, play_count);
+CREATE INDEX beatmaps_search_pass_count_idx ON beatmaps (mode, ranked_status, pass_count);
@@ -0,0 +1,30 @@
+from app.api.rest.context import RequestContext
+from fastapi import FastAPI
+from fastapi import Request
+
+
+def request_to(api: FastAPI) -> Request:
+    return Request({"type": "http", "app": api, "headers": []})
+
+
+def test_requests_share_the_apps_database(fake_db):
+    api = FastAPI()
+    api.state.db = fake_db
+
+    # no connection is held per request; queries check one out themselves
+    assert RequestContext(request_to(api)).db is fake_db
+    assert RequestContext(request_to(api)).db is fake_db
+
+
+def test_detached_contexts_use_the_apps_services(fake_db, fake_redis,
+                                                 osu_api_client):
+    api = FastAPI()
+    api.state.db = fake_db
+    api.state.redis = fake_redis
+    api.state.osu_api_client = osu_api_client
+
+    ctx = RequestContext(request_to(api)).detached()
+
+    assert ctx.db is fake_db
+    assert ctx.redis is fake_redis
+    assert ctx.osu_api_client is osu_api_client
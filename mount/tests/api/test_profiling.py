@@ -0,0 +1,64 @@
+from typing import AsyncIterator
+
+import httpx
+import pytest
+from app.api.rest import init_profiling
+from app.common import settings
+from fastapi import FastAPI
+
+
+@pytest.fixture
+async def client(monkeypatch, tmp_path) -> AsyncIterator[httpx.AsyncClient]:
+    monkeypatch.setattr(settings, "PROFILING_TOKEN", "secret")
+    monkeypatch.setattr(settings, "PROFILING_SAMPLE_RATE", 0)
+    monkeypatch.setattr(settings, "PROFILING_SINK_DIR", str(tmp_path))
+
+    api = FastAPI()
+    init_profiling(api)
+
+    @api.get("/ping")
+    async def ping() -> dict:
+        return {"status": "ok"}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api),
+                                 base_url="http://test") as client:
+        yield client
+
+
+def test_profiling_is_not_installed_unless_configured(monkeypatch):
+    monkeypatch.setattr(settings, "PROFILING_TOKEN", "")
+    monkeypatch.setattr(settings, "PROFILING_SAMPLE_RATE", 0)
+
+    api = FastAPI()
+    init_profiling(api)
+
+    assert api.user_middleware == []
+    assert not any(route.path == "/profiles/{profile_id}"
+                   for route in api.routes)
+
+
+async def test_authorized_requests_are_profiled(client, tmp_path):
+    response = await client.get("/ping", headers={"X-Profile-Token": "secret"})
+
+    assert response.json() == {"status": "ok"}
+    profile_id = response.headers["X-Profile-Id"]
+    assert response.headers["X-Profile-Summary"].startswith("duration=")
+    assert (tmp_path / f"{profile_id}.speedscope.json").exists()
+
+
+async def test_other_requests_are_not_profiled(client, tmp_path):
+    response = await client.get("/ping", headers={"X-Profile-Token": "guess"})
+
+    assert "X-Profile-Id" not in response.headers
+    assert list(tmp_path.iterdir()) == []
+
+
+async def test_profiles_are_only_served_to_authorized_clients(client):
+    response = await client.get("/ping", headers={"X-Profile-Token": "secret"})
+    profile_url = f"/profiles/{response.headers['X-Profile-Id']}"
+
+    assert (await client.get(profile_url)).status_code == 403
+    response = await client.get(profile_url,
+                                headers={"X-Profile-Token": "secret"})
+    assert response.status_code == 200
+    assert "speedscope" in response.json()["$schema"]
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+from app.common.batching import MicroBatcher
+
+
+class Recorder:
+    def __init__(self, missing: set[int] = frozenset()) -> None:
+        self.batches: list[list[int]] = []
+        self.missing = missing
+
+    async def __call__(self, keys: list[int]) -> dict[int, str]:
+        self.batches.append(keys)
+        return {key: f"value-{key}" for key in keys if key not in self.missing}
+
+
+async def test_flushes_when_the_batch_is_full():
+    batch_fn = Recorder()
+    # a long wait, so only the size can trigger the flush
+    batcher = MicroBatcher(batch_fn, max_batch_size=3, max_wait=60)
+
+    results = await asyncio.wait_for(
+        asyncio.gather(*(batcher.load(key) for key in (1, 2, 3))), timeout=1)
+
+    assert results == ["value-1", "value-2", "value-3"]
+    assert batch_fn.batches == [[1, 2, 3]]
+
+
+async def test_flushes_after_the_max_wait():
+    batch_fn = Recorder()
+    batcher = MicroBatcher(batch_fn, max_batch_size=50, max_wait=0.01)
+
+    results = await asyncio.gather(batcher.load(1), batcher.load(2))
+
+    assert results == ["value-1", "value-2"]
+    assert batch_fn.batches == [[1, 2]]
+
+
+async def test_splits_loads_beyond_the_max_batch_size():
+    batch_fn = Recorder()
+    batcher = MicroBatcher(batch_fn, max_batch_size=2, max_wait=0.01)
+
+    results = await asyncio.gather(*(batcher.load(key) for key in range(5)))
+
+    assert results == [f"value-{key}" for key in range(5)]
+    assert batch_fn.batches == [[0, 1], [2, 3], [4]]
+
+
+async def test_duplicate_keys_share_a_slot():
+    batch_fn = Recorder()
+    batcher = MicroBatcher(batch_fn, max_batch_size=50, max_wait=0.01)
+
+    results = await asyncio.gather(batcher.load(1), batcher.load(1),
+                                   batcher.load(2))
+
+    assert results == ["value-1", "value-1", "value-2"]
+    assert batch_fn.batches == [[1, 2]]
+
+
+async def test_missing_keys_resolve_to_none():
+    batch_fn = Recorder(missing={2})
+    batcher = MicroBatcher(batch_fn, max_batch_size=50, max_wait=0.01)
+
+    results = await asyncio.gather(batcher.load(1), batcher.load(2))
+
+    assert results == ["value-1", None]
+
+
+async def test_a_failed_batch_is_raised_to_each_of_its_waiters():
+    async def batch_fn(keys: list[int]) -> dict[int, str]:
+        raise RuntimeError("upstream failed")
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=50, max_wait=0.01)
+
+    results = await asyncio.gather(batcher.load(1), batcher.load(2),
+                                   return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+async def test_a_failed_batch_does_not_affect_the_next():
+    failures = [RuntimeError("upstream failed")]
+
+    async def batch_fn(keys: list[int]) -> dict[int, str]:
+        if failures:
+            raise failures.pop()
+        return {key: f"value-{key}" for key in keys}
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=50, max_wait=0.01)
+
+    with pytest.raises(RuntimeError):
+        await batcher.load(1)
+    assert await batcher.load(1) == "value-1"
+
+
+async def test_a_cancelled_waiter_does_not_cancel_the_batch():
+    batch_fn = Recorder()
+    batcher = MicroBatcher(batch_fn, max_batch_size=50, max_wait=0.01)
+
+    cancelled = asyncio.create_task(batcher.load(1))
+    waiting = asyncio.create_task(batcher.load(1))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+
+    assert await waiting == "value-1"
+    assert batch_fn.batches == [[1]]
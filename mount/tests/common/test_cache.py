@@ -0,0 +1,74 @@
+from datetime import datetime
+
+from aioredis.exceptions import RedisError
+from app.common import cache
+
+ROW = {"beatmap_id": 1, "version": "Insane"}
+
+
+async def test_each_lookup_is_counted_once_per_tier(fake_ctx):
+    l1_misses = cache.local_stats()["misses"]
+    redis_stats = cache.stats("test-tiers")
+
+    await cache.store(fake_ctx, "test-tiers", 1, ROW, ttl=60)
+    cache.clear_local()
+
+    # 1 is served by redis, 2 is missed by both tiers
+    rows = await cache.fetch_many(fake_ctx, "test-tiers", [1, 2])
+
+    assert set(rows) == {1}
+    assert cache.local_stats()["misses"] - l1_misses == 2
+    assert (redis_stats.hits, redis_stats.misses) == (1, 1)
+
+
+async def test_l1_hits_do_not_reach_redis(fake_ctx, fake_redis):
+    redis_stats = cache.stats("test-l1-hits")
+
+    await cache.store(fake_ctx, "test-l1-hits", 1, ROW, ttl=60)
+    await cache.fetch_one(fake_ctx, "test-l1-hits", 1)  # admitted to l1
+    fake_redis.values.clear()
+
+    assert await cache.fetch_one(fake_ctx, "test-l1-hits", 1) == ROW
+    assert await cache.fetch_many(fake_ctx, "test-l1-hits", [1]) == {1: ROW}
+    assert (redis_stats.hits, redis_stats.misses) == (1, 0)
+
+
+async def test_rows_round_trip_through_redis(fake_ctx):
+    row = {**ROW, "created_at": datetime(2022, 1, 1, 12, 30),
+           "ranked_at": None}
+    await cache.store(fake_ctx, "test-round-trip", 1, row, ttl=60)
+    cache.clear_local()
+
+    assert await cache.fetch_one(fake_ctx, "test-round-trip", 1) == row
+    cache.clear_local()
+    assert await cache.fetch_many(fake_ctx, "test-round-trip", [1]) == {1: row}
+
+
+async def test_invalidation_evicts_both_tiers(fake_ctx):
+    await cache.store_many(fake_ctx, "test-invalidate", {1: ROW, 2: ROW},
+                           ttl=60)
+
+    await cache.invalidate(fake_ctx, "test-invalidate", 1)
+
+    assert await cache.fetch_many(fake_ctx, "test-invalidate", [1, 2]) == {
+        2: ROW}
+    cache.clear_local()
+    assert await cache.fetch_one(fake_ctx, "test-invalidate", 1) is None
+
+
+async def test_nothing_is_stored_without_a_ttl(fake_ctx, fake_redis):
+    await cache.store(fake_ctx, "test-disabled", 1, ROW, ttl=0)
+
+    assert fake_redis.values == {}
+    assert await cache.fetch_one(fake_ctx, "test-disabled", 1) is None
+
+
+async def test_redis_errors_are_misses(fake_ctx, fake_redis, monkeypatch):
+    async def fail(*args, **kwargs):
+        raise RedisError("connection lost")
+
+    monkeypatch.setattr(fake_redis, "get", fail)
+    monkeypatch.setattr(fake_redis, "mget", fail)
+
+    assert await cache.fetch_one(fake_ctx, "test-errors", 1) is None
+    assert await cache.fetch_many(fake_ctx, "test-errors", [1]) == {}
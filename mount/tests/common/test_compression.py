@@ -0,0 +1,37 @@
+import gzip
+
+import pytest
+import zstandard
+from app.common import compression
+
+
+@pytest.mark.parametrize("accept_encoding, coding", [
+    (None, None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("gzip, zstd", "zstd"),
+    ("zstd;q=0, gzip", "gzip"),
+    ("br, GZIP;q=0.5", "gzip"),
+])
+def test_negotiate(accept_encoding, coding):
+    assert compression.negotiate(accept_encoding) == coding
+
+
+@pytest.mark.parametrize("coding, decompress", [
+    ("gzip", gzip.decompress),
+    ("zstd", lambda data: zstandard.ZstdDecompressor().decompressobj()
+     .decompress(data)),
+])
+def test_streamed_output_decompresses(coding, decompress):
+    compressor = compression.compressor(coding)
+
+    data = b"".join([compressor.compress(b'{"beatmap_id": 1}\n'),
+                     compressor.compress(b'{"beatmap_id": 2}\n'),
+                     compressor.flush()])
+
+    assert decompress(data) == b'{"beatmap_id": 1}\n{"beatmap_id": 2}\n'
+
+
+def test_unsupported_codings_are_rejected():
+    with pytest.raises(ValueError):
+        compression.compressor("br")
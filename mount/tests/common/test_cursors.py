@@ -0,0 +1,73 @@
+import base64
+from datetime import datetime
+
+import pytest
+from app.common import cursors
+
+
+def _raw(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("sort_by, after", [
+    ("beatmap_id", (123, 123)),
+    ("difficulty_rating", (5.25, 321)),
+    ("title", ("Blue Zenith", 7)),
+    ("updated_at", (datetime(2022, 1, 2, 3, 4, 5), 42)),
+])
+def test_round_trip(sort_by, after):
+    assert cursors.decode(cursors.encode(sort_by, after), sort_by) == after
+
+
+def test_cursors_are_url_safe():
+    cursor = cursors.encode("title", ("??>>~~", 1))
+
+    assert "=" not in cursor
+    assert set(cursor) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+                              "abcdefghijklmnopqrstuvwxyz0123456789-_")
+
+
+def test_mismatched_sort_by_is_rejected():
+    cursor = cursors.encode("updated_at", (datetime(2022, 1, 1), 1))
+
+    assert cursors.decode(cursor, "beatmap_id") is None
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not a cursor",
+    "!!!!",
+    _raw(b"not json"),
+    _raw(b"[]"),
+    _raw(b'{"sort": "beatmap_id"}'),
+    _raw(b'{"sort": "beatmap_id", "after": [1]}'),
+    _raw(b'{"sort": "beatmap_id", "after": [1, 2, 3]}'),
+    _raw(b'{"sort": "beatmap_id", "after": [1, "2"]}'),
+    _raw(b'{"sort": "beatmap_id", "after": [1, 2.5]}'),
+    _raw(b'{"after": [1, 2]}'),
+])
+def test_tampered_cursors_are_rejected(cursor):
+    assert cursors.decode(cursor, "beatmap_id") is None
+
+
+@pytest.mark.parametrize("value", ["yesterday", 12345, None])
+def test_tampered_datetimes_are_rejected(value):
+    cursor = cursors.encode("updated_at", (value, 1))
+
+    assert cursors.decode(cursor, "updated_at") is None
+
+
+def test_next_cursor_points_after_a_full_page():
+    rows = [{"beatmap_id": 1, "bpm": 120}, {"beatmap_id": 2, "bpm": 180}]
+
+    cursor = cursors.next_cursor(rows, "bpm", "beatmap_id", page_size=2)
+
+    assert cursor is not None
+    assert cursors.decode(cursor, "bpm") == (180, 2)
+
+
+def test_a_short_page_is_the_last():
+    rows = [{"beatmap_id": 1, "bpm": 120}]
+
+    assert cursors.next_cursor(rows, "bpm", "beatmap_id", page_size=2) is None
+    assert cursors.next_cursor([], "bpm", "beatmap_id", page_size=2) is None
@@ -0,0 +1,66 @@
+from datetime import datetime
+from datetime import timedelta
+
+import pytest
+from app.common import freshness
+from app.common import settings
+from app.models import RankedStatus
+
+UPDATED_AT = datetime(2022, 1, 1)
+LONG_AGO = datetime(2000, 1, 1)
+
+
+@pytest.mark.parametrize("ranked_status, setting", [
+    (RankedStatus.RANKED, "FRESHNESS_TTL_RANKED"),
+    (RankedStatus.APPROVED, "FRESHNESS_TTL_RANKED"),
+    (RankedStatus.LOVED, "FRESHNESS_TTL_RANKED"),
+    (RankedStatus.QUALIFIED, "FRESHNESS_TTL_QUALIFIED"),
+    (RankedStatus.PENDING, "FRESHNESS_TTL_PENDING"),
+    (RankedStatus.WORK_IN_PROGRESS, "FRESHNESS_TTL_PENDING"),
+    (RankedStatus.GRAVEYARD, "FRESHNESS_TTL_GRAVEYARD"),
+])
+def test_ttl_by_ranked_status(ranked_status, setting):
+    assert freshness.ttl(ranked_status, LONG_AGO) == \
+        timedelta(seconds=getattr(settings, setting))
+
+
+def test_ttl_is_shortened_after_a_recent_upstream_update():
+    recently = datetime.now() - timedelta(hours=1)
+
+    assert freshness.ttl(RankedStatus.RANKED, recently) == \
+        timedelta(seconds=settings.FRESHNESS_TTL_RECENTLY_UPDATED)
+
+
+@pytest.mark.parametrize("ranked_status", list(RankedStatus))
+def test_expires_at_is_within_the_jitter_bounds(ranked_status):
+    ttl = freshness.ttl(ranked_status, LONG_AGO)
+    earliest = UPDATED_AT + ttl * (1 - settings.FRESHNESS_JITTER)
+    latest = UPDATED_AT + ttl
+
+    for id in range(1000):
+        expires_at = freshness.expires_at(f"beatmaps:{id}", UPDATED_AT,
+                                          ranked_status, LONG_AGO)
+        assert earliest <= expires_at <= latest
+
+
+def test_expires_at_is_stable_per_key():
+    args = (UPDATED_AT, RankedStatus.RANKED, LONG_AGO)
+
+    assert freshness.expires_at("beatmaps:1", *args) == \
+        freshness.expires_at("beatmaps:1", *args)
+
+
+def test_expires_at_is_spread_across_keys():
+    expiries = {freshness.expires_at(f"beatmaps:{id}", UPDATED_AT,
+                                     RankedStatus.RANKED, LONG_AGO)
+                for id in range(100)}
+
+    assert len(expiries) > 90
+
+
+def test_expires_at_without_jitter(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(settings, "FRESHNESS_JITTER", 0.0)
+
+    assert freshness.expires_at("beatmaps:1", UPDATED_AT, RankedStatus.RANKED,
+                                LONG_AGO) == \
+        UPDATED_AT + timedelta(seconds=settings.FRESHNESS_TTL_RANKED)
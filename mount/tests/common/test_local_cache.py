@@ -0,0 +1,151 @@
+import pytest
+from app.common import local_cache
+from app.common.local_cache import LocalCache
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(local_cache.time, "monotonic", clock)
+    return clock
+
+
+def _cache(max_entries: int = 100, max_bytes: int = 10_000, ttl: float = 60,
+           admission: bool = False) -> LocalCache:
+    return LocalCache(max_entries=max_entries, max_bytes=max_bytes, ttl=ttl,
+                      admission=admission)
+
+
+def test_get_and_put():
+    cache = _cache()
+    cache.put("a", {"id": 1}, size=10)
+
+    assert cache.get("a") == {"id": 1}
+    assert cache.get("b") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = _cache(max_entries=2)
+    cache.put("a", 1, size=1)
+    cache.put("b", 2, size=1)
+    cache.get("a")  # b is now the least recently used
+    cache.put("c", 3, size=1)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_entries_are_evicted_beyond_the_byte_cap():
+    cache = _cache(max_bytes=100)
+    cache.put("a", 1, size=40)
+    cache.put("b", 2, size=40)
+    cache.put("c", 3, size=40)
+
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] == 80
+
+
+def test_replacing_an_entry_updates_its_size():
+    cache = _cache(max_bytes=100)
+    cache.put("a", 1, size=60)
+    cache.put("a", 2, size=30)
+
+    assert cache.get("a") == 2
+    assert cache.stats()["bytes"] == 30
+
+
+def test_entries_larger_than_the_byte_cap_are_rejected():
+    cache = _cache(max_bytes=100)
+    cache.put("a", 1, size=10)
+    cache.put("b", 2, size=101)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.rejections == 1
+
+
+def test_entries_expire(clock: Clock):
+    cache = _cache(ttl=60)
+    cache.put("a", 1, size=1)
+    cache.put("b", 2, size=1, ttl=10)
+    cache.put("c", 3, size=1, ttl=3600)  # capped at the cache's ttl
+
+    clock.now += 30
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+
+    clock.now += 30
+    assert cache.get("a") is None
+    assert cache.get("c") is None
+    assert cache.expirations == 3
+    assert cache.stats()["bytes"] == 0
+
+
+def test_the_doorkeeper_admits_keys_stored_twice():
+    cache = _cache(admission=True)
+
+    cache.put("a", 1, size=1)
+    assert cache.get("a") is None
+
+    cache.put("a", 1, size=1)
+    assert cache.get("a") == 1
+
+
+def test_the_doorkeeper_does_not_hold_back_updates():
+    cache = _cache(admission=True)
+    cache.put("a", 1, size=1)
+    cache.put("a", 1, size=1)
+
+    cache.put("a", 2, size=1)
+    assert cache.get("a") == 2
+
+
+def test_the_doorkeeper_is_bounded():
+    cache = _cache(max_entries=2, admission=True)
+    for key in ("a", "b", "c"):
+        cache.put(key, key, size=1)
+
+    # "a" was forgotten, so must be offered twice again
+    cache.put("a", "a", size=1)
+    assert cache.get("a") is None
+    cache.put("c", "c", size=1)
+    assert cache.get("c") == "c"
+
+
+def test_eviction_also_resets_admission():
+    cache = _cache(admission=True)
+    cache.put("a", 1, size=1)
+    cache.evict("a")
+
+    cache.put("a", 1, size=1)
+    assert cache.get("a") is None
+
+
+def test_clear():
+    cache = _cache()
+    cache.put("a", 1, size=10)
+    cache.clear()
+
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] == 0
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"max_entries": 0}, {"max_bytes": 0}, {"ttl": 0},
+])
+def test_a_disabled_cache_stores_nothing(kwargs):
+    cache = _cache(**kwargs)
+    cache.put("a", 1, size=1)
+
+    assert cache.get("a") is None
@@ -0,0 +1,31 @@
+from aioredis.exceptions import ConnectionError
+from app.common import pins
+
+
+class UnavailableRedis:
+    async def mget(self, *args):
+        raise ConnectionError("redis is unavailable")
+
+
+class UnavailableContext:
+    redis = UnavailableRedis()
+
+
+async def test_pinned_rows(fake_ctx):
+    await pins.pin(fake_ctx, "beatmaps", 1, 2)
+
+    assert await pins.pinned(fake_ctx, "beatmaps", [1, 2, 3]) == {1, 2}
+    assert await pins.pinned(fake_ctx, "beatmapsets", [1]) == set()
+    assert await pins.is_pinned(fake_ctx, "beatmaps", 1)
+    assert not await pins.is_pinned(fake_ctx, "beatmaps", 3)
+
+
+async def test_pins_expire_after_the_read_your_writes_window(fake_ctx, fake_redis):
+    await pins.pin(fake_ctx, "beatmaps", 1)
+
+    [key] = fake_redis.values
+    assert 0 < await fake_redis.pttl(key) <= 5000
+
+
+async def test_nothing_is_pinned_when_redis_is_unavailable():
+    assert await pins.pinned(UnavailableContext(), "beatmaps", [1]) == set()
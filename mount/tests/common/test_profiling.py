@@ -0,0 +1,53 @@
+import json
+
+from app.common import profiling
+from app.common import settings
+
+
+def test_only_the_configured_token_is_authorized(monkeypatch):
+    monkeypatch.setattr(settings, "PROFILING_TOKEN", "secret")
+
+    assert profiling.authorized("secret")
+    assert not profiling.authorized("guess")
+    assert not profiling.authorized(None)
+
+
+def test_no_token_is_authorized_unless_configured(monkeypatch):
+    monkeypatch.setattr(settings, "PROFILING_TOKEN", "")
+
+    assert not profiling.authorized("")
+
+
+def test_requests_are_sampled(monkeypatch):
+    monkeypatch.setattr(settings, "PROFILING_TOKEN", "")
+
+    monkeypatch.setattr(settings, "PROFILING_SAMPLE_RATE", 0)
+    assert not profiling.enabled()
+    assert not profiling.should_profile(None)
+
+    monkeypatch.setattr(settings, "PROFILING_SAMPLE_RATE", 1)
+    assert profiling.enabled()
+    assert profiling.should_profile(None)
+
+
+def test_profile_paths_stay_within_the_sink(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "PROFILING_SINK_DIR", str(tmp_path))
+
+    assert profiling.path_for("1666000000-0123456789ab") == (
+        tmp_path / "1666000000-0123456789ab.speedscope.json")
+    assert profiling.path_for("../../etc/passwd") is None
+    assert profiling.path_for("1666000000-0123456789ab/..") is None
+
+
+async def test_profiles_are_saved_as_speedscope_json(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "PROFILING_SINK_DIR", str(tmp_path))
+
+    profiler = profiling.start()
+    sum(range(10_000))
+    profiler.stop()
+    profile_id = await profiling.save(profiler)
+
+    path = profiling.path_for(profile_id)
+    assert path is not None
+    assert "speedscope" in json.loads(path.read_text())["$schema"]
+    assert profiling.summary(profiler).startswith("duration=")
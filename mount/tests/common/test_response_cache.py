@@ -0,0 +1,91 @@
+from datetime import datetime
+from datetime import timedelta
+
+from app.common import response_cache
+from app.common import settings
+
+BODY = b'{"beatmap_id": 1}'
+
+
+def expires_at() -> datetime:
+    return datetime.now() + timedelta(hours=1)
+
+
+async def test_stored_bodies_are_served(fake_ctx):
+    body, generation = await response_cache.fetch(fake_ctx, "beatmaps", 1)
+    assert body is None
+
+    await response_cache.store(fake_ctx, "beatmaps", 1, BODY,
+                               expires_at=expires_at(), generation=generation)
+
+    body, _ = await response_cache.fetch(fake_ctx, "beatmaps", 1)
+    assert body == BODY
+
+
+async def test_invalidated_bodies_are_not_served(fake_ctx):
+    _, generation = await response_cache.fetch(fake_ctx, "beatmaps", 1)
+    await response_cache.store(fake_ctx, "beatmaps", 1, BODY,
+                               expires_at=expires_at(), generation=generation)
+
+    await response_cache.invalidate(fake_ctx, "beatmaps", 1)
+
+    body, _ = await response_cache.fetch(fake_ctx, "beatmaps", 1)
+    assert body is None
+
+
+async def test_bodies_built_before_an_invalidation_are_not_stored(fake_ctx):
+    _, generation = await response_cache.fetch(fake_ctx, "beatmaps", 1)
+
+    # the row is written (& invalidated) while the body is being built
+    await response_cache.invalidate(fake_ctx, "beatmaps", 1)
+    await response_cache.store(fake_ctx, "beatmaps", 1, BODY,
+                               expires_at=expires_at(), generation=generation)
+
+    body, _ = await response_cache.fetch(fake_ctx, "beatmaps", 1)
+    assert body is None
+
+
+async def test_invalidations_only_affect_their_keys(fake_ctx):
+    _, generation = await response_cache.fetch(fake_ctx, "beatmaps", 1)
+
+    await response_cache.invalidate(fake_ctx, "beatmapsets", 1)
+    await response_cache.store(fake_ctx, "beatmaps", 1, BODY,
+                               expires_at=expires_at(), generation=generation)
+
+    body, _ = await response_cache.fetch(fake_ctx, "beatmaps", 1)
+    assert body == BODY
+
+
+async def test_expired_data_is_not_stored(fake_ctx):
+    _, generation = await response_cache.fetch(fake_ctx, "beatmaps", 1)
+
+    await response_cache.store(fake_ctx, "beatmaps", 1, BODY,
+                               expires_at=datetime.now() - timedelta(seconds=1),
+                               generation=generation)
+
+    body, _ = await response_cache.fetch(fake_ctx, "beatmaps", 1)
+    assert body is None
+
+
+async def test_invalidations_bump_the_shared_generation(fake_ctx, monkeypatch):
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_REDIS", True)
+
+    _, before = await response_cache.fetch(fake_ctx, "beatmaps", 1)
+    await response_cache.invalidate(fake_ctx, "beatmaps", 1)
+    _, after = await response_cache.fetch(fake_ctx, "beatmaps", 1)
+
+    assert after.shared == before.shared + 1
+    assert after.local != before.local
+
+
+async def test_bodies_in_redis_are_kept_locally(fake_ctx, fake_redis,
+                                                monkeypatch):
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_REDIS", True)
+    await fake_redis.set(response_cache._key("beatmaps", 1), BODY, ex=60)
+
+    body, _ = await response_cache.fetch(fake_ctx, "beatmaps", 1)
+    assert body == BODY
+
+    fake_redis.values.clear()
+    body, _ = await response_cache.fetch(fake_ctx, "beatmaps", 1)
+    assert body == BODY
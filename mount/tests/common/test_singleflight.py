@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+from app.common import settings
+from app.common import singleflight
+from app.common.errors import ServiceError
+
+
+@pytest.fixture(autouse=True)
+def local_singleflight(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "SINGLEFLIGHT_DISTRIBUTED", False)
+
+
+async def test_concurrent_calls_are_coalesced():
+    calls = 0
+    release = asyncio.Event()
+
+    async def fn():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return {"beatmap_id": 1}
+
+    # ctx is only used by the distributed mode
+    tasks = [asyncio.create_task(singleflight.run(None, "beatmaps", 1, fn))
+             for _ in range(5)]
+    await asyncio.sleep(0)
+    assert singleflight.in_flight("beatmaps", 1)
+
+    release.set()
+    results = await asyncio.gather(*tasks)
+
+    assert calls == 1
+    assert results == [{"beatmap_id": 1}] * 5
+    assert not singleflight.in_flight("beatmaps", 1)
+
+
+async def test_distinct_keys_are_not_coalesced():
+    calls = []
+
+    async def fn(id):
+        calls.append(id)
+        await asyncio.sleep(0)
+        return {"beatmap_id": id}
+
+    results = await asyncio.gather(
+        singleflight.run(None, "beatmaps", 1, lambda: fn(1)),
+        singleflight.run(None, "beatmaps", 2, lambda: fn(2)),
+        singleflight.run(None, "beatmapsets", 1, lambda: fn(1)),
+    )
+
+    assert sorted(calls) == [1, 1, 2]
+    assert results == [{"beatmap_id": 1}, {"beatmap_id": 2},
+                       {"beatmap_id": 1}]
+
+
+async def test_errors_are_propagated_to_every_caller():
+    calls = 0
+
+    async def fn():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0)
+        raise RuntimeError("upstream failed")
+
+    results = await asyncio.gather(
+        *(singleflight.run(None, "beatmaps", 1, fn) for _ in range(3)),
+        return_exceptions=True,
+    )
+
+    assert calls == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert not singleflight.in_flight("beatmaps", 1)
+
+
+async def test_service_errors_are_shared_results():
+    async def fn():
+        await asyncio.sleep(0)
+        return ServiceError.BEATMAPS_NOT_FOUND
+
+    results = await asyncio.gather(
+        *(singleflight.run(None, "beatmaps", 1, fn) for _ in range(3)))
+
+    assert results == [ServiceError.BEATMAPS_NOT_FOUND] * 3
+
+
+async def test_a_finished_flight_is_not_reused():
+    calls = 0
+
+    async def fn():
+        nonlocal calls
+        calls += 1
+        return {"calls": calls}
+
+    assert await singleflight.run(None, "beatmaps", 1, fn) == {"calls": 1}
+    assert await singleflight.run(None, "beatmaps", 1, fn) == {"calls": 2}
+
+
+async def test_a_cancelled_caller_does_not_cancel_the_others():
+    release = asyncio.Event()
+
+    async def fn():
+        await release.wait()
+        return {"beatmap_id": 1}
+
+    cancelled = asyncio.create_task(singleflight.run(None, "beatmaps", 1, fn))
+    waiting = asyncio.create_task(singleflight.run(None, "beatmaps", 1, fn))
+    await asyncio.sleep(0)
+
+    cancelled.cancel()
+    release.set()
+
+    assert await waiting == {"beatmap_id": 1}
+    with pytest.raises(asyncio.CancelledError):
+        await cancelled
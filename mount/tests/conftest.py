@@ -1,11 +1,17 @@
 from typing import AsyncIterator
 
 import pytest
+from app.common import cache
+from app.common import response_cache
 from app.common import settings
 from app.common.context import Context
 from app.services.database import dsn
 from app.services.database import ServiceDatabase
+from app.services.osu_api import OsuAPIClient
 from app.services.redis import ServiceRedis
+from benchmarks.osu_api_simulator import OsuAPISimulator
+from tests.services.database import FakeDatabase
+from tests.services.redis import FakeRedis
 
 
 # https://docs.pytest.org/en/7.1.x/reference/reference.html#globalvar-pytestmark
@@ -13,9 +19,11 @@ pytestmark = pytest.mark.asyncio
 
 
 class TestContext(Context):
-    def __init__(self, db: ServiceDatabase, redis: ServiceRedis) -> None:
+    def __init__(self, db: ServiceDatabase, redis: ServiceRedis,
+                 osu_api_client: OsuAPIClient) -> None:
         self._db = db
         self._redis = redis
+        self._osu_api_client = osu_api_client
 
     @property
     def db(self) -> ServiceDatabase:
@@ -25,6 +33,10 @@ class TestContext(Context):
     def redis(self) -> ServiceRedis:
         return self._redis
 
+    @property
+    def osu_api_client(self) -> OsuAPIClient:
+        return self._osu_api_client
+
 
 @pytest.fixture
 async def db() -> AsyncIterator[ServiceDatabase]:
@@ -37,14 +49,14 @@ async def db() -> AsyncIterator[ServiceDatabase]:
             port=settings.WRITE_DB_PORT,
             database=settings.WRITE_DB_NAME,
         ),
-        read_dsn=dsn(
-            driver=settings.WRITE_DB_DRIVER,
+        read_dsns=[dsn(
+            driver=settings.READ_DB_DRIVER,
             user=settings.READ_DB_USER,
             password=settings.READ_DB_PASS,
             host=settings.READ_DB_HOST,
             port=settings.READ_DB_PORT,
             database=settings.READ_DB_NAME,
-        ),
+        )],
         min_pool_size=settings.MIN_DB_POOL_SIZE,
         max_pool_size=settings.MAX_DB_POOL_SIZE,
         ssl=settings.DB_USE_SSL,
@@ -62,5 +74,53 @@ async def redis() -> AsyncIterator[ServiceRedis]:
 
 
 @pytest.fixture
-async def ctx(db: ServiceDatabase, redis: ServiceRedis) -> TestContext:
-    return TestContext(db=db, redis=redis)
+def osu_api_simulator() -> OsuAPISimulator:
+    return OsuAPISimulator()
+
+
+@pytest.fixture
+async def osu_api_client(osu_api_simulator: OsuAPISimulator
+                         ) -> AsyncIterator[OsuAPIClient]:
+    async with OsuAPIClient(
+        client_id=settings.OSU_API_CLIENT_ID,
+        client_secret=settings.OSU_API_CLIENT_SECRET,
+        scope=settings.OSU_API_SCOPE,
+        username=settings.OSU_API_USERNAME,
+        password=settings.OSU_API_PASSWORD,
+        request_interval=0,
+        max_requests_per_minute=60_000,
+        base_url="http://osu-api.simulator",
+        transport=osu_api_simulator.transport(),
+    ) as osu_api_client:
+        yield osu_api_client
+
+
+@pytest.fixture
+async def ctx(db: ServiceDatabase, redis: ServiceRedis,
+              osu_api_client: OsuAPIClient) -> TestContext:
+    return TestContext(db=db, redis=redis, osu_api_client=osu_api_client)
+
+
+@pytest.fixture(autouse=True)
+def clear_local_caches() -> None:
+    # the per-process caches would otherwise outlive each test
+    cache.clear_local()
+    response_cache.clear_local()
+
+
+@pytest.fixture
+def fake_db() -> FakeDatabase:
+    return FakeDatabase()
+
+
+@pytest.fixture
+def fake_redis() -> FakeRedis:
+    return FakeRedis()
+
+
+@pytest.fixture
+async def fake_ctx(fake_db: FakeDatabase, fake_redis: FakeRedis,
+                   osu_api_client: OsuAPIClient) -> TestContext:
+    """A context whose database & redis are in-memory fakes."""
+    return TestContext(db=fake_db, redis=fake_redis,
+                       osu_api_client=osu_api_client)
@@ -0,0 +1,67 @@
+from datetime import datetime
+
+from app.models import BaseModel
+
+
+class Example(BaseModel):
+    id: int
+    name: str
+    tags: list[str]
+    enabled: bool
+    ratio: float
+    rating: float | None
+    created_at: datetime
+
+
+# as mysql hands it to us: tinyints for booleans, & ints for whole floats
+ROW = {
+    "id": 1,
+    "name": "example",
+    "tags": ["a", "b"],
+    "enabled": 1,
+    "ratio": 5,
+    "rating": None,
+    "created_at": datetime(2022, 1, 1),
+    "not_a_field": "ignored",
+}
+
+
+def test_serialize_casts_booleans():
+    assert Example.serialize(ROW)["enabled"] is True
+    assert Example.serialize({**ROW, "enabled": 0})["enabled"] is False
+
+
+def test_serialize_casts_floats():
+    data = Example.serialize(ROW)
+
+    assert data["ratio"] == 5.0
+    assert isinstance(data["ratio"], float)
+
+
+def test_serialize_keeps_nulls():
+    assert Example.serialize(ROW)["rating"] is None
+    assert Example.serialize({**ROW, "rating": 7})["rating"] == 7.0
+
+
+def test_serialize_strips_strings():
+    data = Example.serialize({**ROW, "name": "  example\n"})
+
+    assert data["name"] == "example"
+    assert data == Example.from_mapping({**ROW, "name": "  example\n"}).dict()
+
+
+def test_serialize_passes_other_types_through():
+    data = Example.serialize(ROW)
+
+    assert data["id"] == 1
+    assert data["name"] == "example"
+    assert data["tags"] == ["a", "b"]
+    assert data["created_at"] == datetime(2022, 1, 1)
+
+
+def test_serialize_only_includes_fields():
+    assert list(Example.serialize(ROW)) == list(Example.__fields__)
+
+
+def test_serialize_matches_validation_for_trusted_rows():
+    assert Example.serialize(ROW) == Example.from_mapping(ROW).dict()
@@ -0,0 +1,109 @@
+import re
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from app.repositories.beatmaps import BeatmapsRepo
+from app.usecases.beatmaps import beatmap_from_osu_api
+from benchmarks.osu_api_simulator import generate_beatmap
+
+CREATED_AT = datetime(2020, 1, 1)
+
+MIGRATIONS = Path(__file__).parents[2] / "database" / "migrations"
+
+
+async def test_upsert_many_returns_the_written_rows(fake_ctx, fake_db):
+    beatmaps = [beatmap_from_osu_api(generate_beatmap(beatmap_id))
+                for beatmap_id in (10, 11)]
+
+    written = await BeatmapsRepo(fake_ctx).upsert_many(beatmaps)
+
+    assert [beatmap["beatmap_id"] for beatmap in written] == [10, 11]
+    for beatmap, row in zip(beatmaps, written):
+        assert row == {**beatmap, "created_at": row["created_at"],
+                       "updated_at": row["updated_at"]}
+        assert row["created_at"] == row["updated_at"]
+
+
+async def test_upsert_many_is_a_single_statement(fake_ctx, fake_db):
+    beatmaps = [beatmap_from_osu_api(generate_beatmap(beatmap_id))
+                for beatmap_id in (10, 11)]
+
+    await BeatmapsRepo(fake_ctx).upsert_many(beatmaps)
+
+    [(query, params, primary)] = fake_db.queries
+    assert query.startswith("INSERT INTO beatmaps")
+    assert "`created_at` = VALUES" not in query
+    assert params["beatmap_id_1"] == 11
+    assert fake_db.transactions == 0
+
+
+async def test_upsert_keeps_a_refreshed_rows_created_at(fake_ctx, fake_db):
+    beatmap = beatmap_from_osu_api(generate_beatmap(10))
+
+    written = await BeatmapsRepo(fake_ctx).upsert(**beatmap,
+                                                  created_at=CREATED_AT)
+
+    assert written["created_at"] == CREATED_AT
+    assert written["updated_at"] > CREATED_AT
+    [(_, params, _)] = fake_db.queries
+    assert params["created_at_0"] == CREATED_AT
+
+
+async def test_partial_update_sets_updated_at(fake_ctx, fake_db):
+    beatmap = {**beatmap_from_osu_api(generate_beatmap(10)),
+               "created_at": CREATED_AT, "updated_at": CREATED_AT}
+
+    updated = await BeatmapsRepo(fake_ctx).partial_update(beatmap, play_count=5)
+
+    [(query, params, _)] = fake_db.queries
+    assert query.startswith("UPDATE beatmaps")
+    assert params["updated_at"] == updated["updated_at"] > CREATED_AT
+    assert updated == {**beatmap, "play_count": 5,
+                       "updated_at": params["updated_at"]}
+
+
+async def test_delete_is_a_single_statement(fake_ctx, fake_db):
+    await BeatmapsRepo(fake_ctx).delete(10)
+
+    [(query, params, _)] = fake_db.queries
+    assert query.startswith("DELETE FROM beatmaps")
+    assert params == {"beatmap_id": 10}
+
+
+async def test_search_filters_by_ranges(fake_ctx, fake_db):
+    await BeatmapsRepo(fake_ctx).search(
+        mode="osu", ranked_status=1,
+        ranges={"difficulty_rating": (5.5, 6.5), "ar": (9, None),
+                "hit_length": (None, 180), "bpm": (None, None)},
+        sort_by="bpm", order="desc", page=3, page_size=20)
+
+    [(query, params, _)] = fake_db.queries
+    assert ("WHERE mode = :mode AND ranked_status = :ranked_status "
+            "AND difficulty_rating >= :min_difficulty_rating "
+            "AND difficulty_rating <= :max_difficulty_rating "
+            "AND ar >= :min_ar AND hit_length <= :max_hit_length "
+            "ORDER BY bpm desc, beatmap_id desc") in query
+    assert params == {"mode": "osu", "ranked_status": 1,
+                      "min_difficulty_rating": 5.5,
+                      "max_difficulty_rating": 6.5,
+                      "min_ar": 9, "max_hit_length": 180,
+                      "limit": 20, "offset": 40}
+
+
+async def test_search_rejects_unknown_columns(fake_ctx):
+    repo = BeatmapsRepo(fake_ctx)
+
+    with pytest.raises(ValueError):
+        await repo.search(sort_by="version")
+    with pytest.raises(ValueError):
+        await repo.search(ranges={"mapper_id": (1, 2)})
+
+
+def test_search_columns_are_indexed():
+    migration = MIGRATIONS / "000007_add_beatmaps_search_indexes.up.sql"
+    indexed = set(re.findall(r"\(mode, ranked_status, (\w+)\)",
+                             migration.read_text()))
+
+    assert set(BeatmapsRepo.RANGE_COLUMNS) <= indexed
+    assert set(BeatmapsRepo.SEARCH_SORT_COLUMNS) - {"beatmap_id"} <= indexed
@@ -0,0 +1,80 @@
+import re
+from datetime import datetime
+from pathlib import Path
+
+from app.repositories.beatmapsets import BeatmapsetsRepo
+from app.usecases.beatmapsets import beatmapset_from_osu_api
+from benchmarks.osu_api_simulator import generate_beatmapset
+
+CREATED_AT = datetime(2020, 1, 1)
+
+MIGRATIONS = Path(__file__).parents[2] / "database" / "migrations"
+
+
+async def test_upsert_returns_the_written_row(fake_ctx, fake_db):
+    beatmapset = beatmapset_from_osu_api(generate_beatmapset(1))
+
+    written = await BeatmapsetsRepo(fake_ctx).upsert(**beatmapset)
+
+    assert written == {**beatmapset, "created_at": written["created_at"],
+                       "updated_at": written["updated_at"]}
+    assert written["created_at"] == written["updated_at"]
+
+    [(query, params, _)] = fake_db.queries
+    assert query.startswith("INSERT INTO beatmapsets")
+    assert isinstance(params["covers"], str)  # stored as json
+    assert fake_db.transactions == 0
+
+
+async def test_upsert_keeps_a_refreshed_rows_created_at(fake_ctx, fake_db):
+    beatmapset = beatmapset_from_osu_api(generate_beatmapset(1))
+
+    written = await BeatmapsetsRepo(fake_ctx).upsert(**beatmapset,
+                                                     created_at=CREATED_AT)
+
+    assert written["created_at"] == CREATED_AT
+    assert written["updated_at"] > CREATED_AT
+
+
+async def test_delete_is_a_single_statement(fake_ctx, fake_db):
+    await BeatmapsetsRepo(fake_ctx).delete(1)
+
+    [(query, params, _)] = fake_db.queries
+    assert query.startswith("DELETE FROM beatmapsets")
+    assert params == {"beatmapset_id": 1}
+
+
+async def test_search_matches_text_and_filters(fake_ctx, fake_db):
+    await BeatmapsetsRepo(fake_ctx).search(text="camellia", nsfw=False,
+                                           ranked_status=1, page=3,
+                                           page_size=20)
+
+    [(query, params, _)] = fake_db.queries
+    match = (f"MATCH ({BeatmapsetsRepo.SEARCH_PARAMS}) "
+             "AGAINST (:text IN NATURAL LANGUAGE MODE)")
+    assert (f"WHERE {match} AND nsfw = :nsfw "
+            "AND ranked_status = :ranked_status "
+            f"ORDER BY {match} DESC, beatmapset_id") in query
+    assert params == {"text": "camellia", "nsfw": False, "ranked_status": 1,
+                      "limit": 20, "offset": 40}
+
+
+async def test_search_by_mode_matches_any_difficulty(fake_ctx, fake_db):
+    await BeatmapsetsRepo(fake_ctx).search(text="camellia", mode="mania")
+
+    [(query, params, _)] = fake_db.queries
+    assert ("EXISTS ( SELECT 1 FROM beatmaps "
+            "WHERE beatmaps.set_id = beatmapsets.beatmapset_id "
+            "AND beatmaps.mode = :mode )") in query
+    assert params["mode"] == "mania"
+
+
+def test_search_matches_the_fulltext_index():
+    migration = MIGRATIONS / "000006_add_beatmapsets_fulltext_index.up.sql"
+    [indexed] = re.findall(r"FULLTEXT INDEX \w+ ON beatmapsets \(([^)]+)\)",
+                           migration.read_text())
+
+    # MATCH must name exactly the index's columns, in any order
+    assert ({column.strip() for column in indexed.split(",")} ==
+            {column.strip()
+             for column in BeatmapsetsRepo.SEARCH_PARAMS.split(",")})
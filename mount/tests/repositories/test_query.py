@@ -0,0 +1,53 @@
+from app.repositories.query import WhereClause
+
+
+def test_an_empty_clause_renders_nothing():
+    where = WhereClause()
+
+    assert str(where) == ""
+    assert where.params == {}
+
+
+def test_none_filters_are_skipped():
+    where = (WhereClause()
+             .equals("set_id", None)
+             .equals("mode", "osu")
+             .between("bpm", None, None))
+
+    assert str(where) == "WHERE mode = :mode"
+    assert where.params == {"mode": "osu"}
+
+
+def test_falsy_values_are_not_skipped():
+    where = WhereClause().equals("ranked_status", 0).equals("nsfw", False)
+
+    assert str(where) == ("WHERE ranked_status = :ranked_status\n"
+                          "   AND nsfw = :nsfw")
+    assert where.params == {"ranked_status": 0, "nsfw": False}
+
+
+def test_between_with_both_bounds():
+    where = WhereClause().between("difficulty_rating", 4.5, 6)
+
+    assert str(where) == ("WHERE difficulty_rating >= :min_difficulty_rating\n"
+                          "   AND difficulty_rating <= :max_difficulty_rating")
+    assert where.params == {"min_difficulty_rating": 4.5,
+                            "max_difficulty_rating": 6}
+
+
+def test_between_with_one_bound():
+    assert str(WhereClause().between("ar", 9, None)) == "WHERE ar >= :min_ar"
+    assert str(WhereClause().between("ar", None, 9)) == "WHERE ar <= :max_ar"
+
+
+def test_add_takes_arbitrary_predicates():
+    where = (WhereClause()
+             .equals("mode", "osu")
+             .add("(updated_at, beatmap_id) > (:after_value, :after_id)",
+                  after_value="2022-01-01", after_id=1))
+
+    assert str(where) == (
+        "WHERE mode = :mode\n"
+        "   AND (updated_at, beatmap_id) > (:after_value, :after_id)")
+    assert where.params == {"mode": "osu", "after_value": "2022-01-01",
+                            "after_id": 1}
@@ -1 +1,63 @@
+from __future__ import annotations
+
+from contextlib import asynccontextmanager
+from contextlib import contextmanager
+from typing import Any
+from typing import AsyncIterator
+from typing import Callable
+from typing import Iterator
+from typing import Mapping
+
 from app.services.database import ServiceDatabase
+
+
+class FakeDatabase(ServiceDatabase):
+    """\
+    A database recording the queries sent to it, without connecting anywhere.
+
+    Reads are answered by `rows`, a function of the query & values returning
+    the matching rows; by default, nothing matches.
+    """
+
+    def __init__(self, rows: Callable[[str, dict], list[Mapping[str, Any]]]
+                 | None = None) -> None:
+        self.rows = rows or (lambda query, values: [])
+        # (query, values, whether it was sent to the primary)
+        self.queries: list[tuple[str, dict, bool]] = []
+        self.transactions = 0
+        self._primary = False
+
+    def _record(self, query: str, values: dict | None, primary: bool) -> None:
+        self.queries.append((" ".join(query.split()), values or {},
+                             primary or self._primary))
+
+    @contextmanager
+    def primary_reads(self) -> Iterator[None]:
+        primary, self._primary = self._primary, True
+        try:
+            yield
+        finally:
+            self._primary = primary
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[None]:
+        self.transactions += 1
+        with self.primary_reads():
+            yield
+
+    async def fetch_one(self, query: str, values: dict | None = None) -> Mapping[str, Any] | None:
+        self._record(query, values, primary=False)
+        rows = self.rows(query, values or {})
+        return rows[0] if rows else None
+
+    async def fetch_all(self, query: str, values: dict | None = None) -> list[Mapping[str, Any]]:
+        self._record(query, values, primary=False)
+        return self.rows(query, values or {})
+
+    async def fetch_val(self, query: str, values: dict | None = None) -> Any:
+        row = await self.fetch_one(query, values)
+        return next(iter(row.values())) if row is not None else None
+
+    async def execute(self, query: str, values: dict | None = None) -> Any:
+        self._record(query, values, primary=True)
+        return 0
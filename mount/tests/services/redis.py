@@ -1 +1,111 @@
+from __future__ import annotations
+
+import time
+from typing import Any
+
 from app.services.redis import ServiceRedis
+
+
+def _encode(value: Any) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode()
+
+
+class FakeRedis(ServiceRedis):
+    """An in-memory redis, covering the commands the service sends outside of scripts."""
+
+    def __init__(self) -> None:
+        self.connection = None  # never connected
+        self.values: dict[str, bytes] = {}
+        self.deadlines: dict[str, float] = {}
+        self.published: list[tuple[str, Any]] = []
+
+    def _expire_keys(self) -> None:
+        now = time.monotonic()
+        for key, deadline in list(self.deadlines.items()):
+            if now >= deadline:
+                del self.deadlines[key]
+                self.values.pop(key, None)
+
+    async def get(self, key: str) -> bytes | None:
+        self._expire_keys()
+        return self.values.get(key)
+
+    async def mget(self, keys: list[str]) -> list[bytes | None]:
+        self._expire_keys()
+        return [self.values.get(key) for key in keys]
+
+    async def set(self, key: str, value: Any, ex: float | None = None,
+                  px: int | None = None, nx: bool = False) -> bool | None:
+        self._expire_keys()
+        if nx and key in self.values:
+            return None
+
+        self.values[key] = _encode(value)
+        self.deadlines.pop(key, None)
+        if ex is not None:
+            self.deadlines[key] = time.monotonic() + ex
+        elif px is not None:
+            self.deadlines[key] = time.monotonic() + px / 1000
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        self._expire_keys()
+        deleted = 0
+        for key in keys:
+            self.deadlines.pop(key, None)
+            deleted += self.values.pop(key, None) is not None
+        return deleted
+
+    async def incr(self, key: str) -> int:
+        self._expire_keys()
+        value = int(self.values.get(key, b"0")) + 1
+        self.values[key] = _encode(value)
+        return value
+
+    async def expire(self, key: str, seconds: int) -> bool:
+        self._expire_keys()
+        if key not in self.values:
+            return False
+        self.deadlines[key] = time.monotonic() + seconds
+        return True
+
+    async def pttl(self, key: str) -> int:
+        self._expire_keys()
+        if key not in self.values:
+            return -2
+        if key not in self.deadlines:
+            return -1
+        return int((self.deadlines[key] - time.monotonic()) * 1000)
+
+    async def publish(self, channel: str, message: Any) -> int:
+        self.published.append((channel, message))
+        return 0
+
+    def pipeline(self, transaction: bool = True) -> FakePipeline:  # type: ignore
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis) -> None:
+        self.redis = redis
+        self.commands: list[tuple[str, tuple, dict]] = []
+
+    async def __aenter__(self) -> FakePipeline:
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        self.commands.clear()
+
+    def __getattr__(self, name: str) -> Any:
+        def queue(*args: Any, **kwargs: Any) -> FakePipeline:
+            self.commands.append((name, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self) -> list[Any]:
+        results = [await getattr(self.redis, name)(*args, **kwargs)
+                   for name, args, kwargs in self.commands]
+        self.commands.clear()
+        return results
@@ -0,0 +1,185 @@
+import itertools
+from typing import Any
+
+import pytest
+from app.services import database
+from app.services.database import ServiceDatabase
+
+_connection_ids = itertools.count()
+
+
+class FakeTransactionBackend:
+    def __init__(self, connection: "FakeConnectionBackend") -> None:
+        self.connection = connection
+
+    async def start(self, is_root: bool, extra_options: Any) -> None:
+        self.connection.log("BEGIN" if is_root else "SAVEPOINT")
+
+    async def commit(self) -> None:
+        self.connection.log("COMMIT")
+
+    async def rollback(self) -> None:
+        self.connection.log("ROLLBACK")
+
+
+class FakeConnectionBackend:
+    def __init__(self, backend: "FakeBackend") -> None:
+        self.backend = backend
+        self.id = next(_connection_ids)
+
+    def log(self, statement: str) -> None:
+        self.backend.statements.append((self.id, statement))
+
+    async def acquire(self) -> None:
+        self.backend.checked_out += 1
+
+    async def release(self) -> None:
+        self.backend.checked_out -= 1
+
+    async def fetch_one(self, query: Any) -> dict:
+        self.log(str(query))
+        return {}
+
+    async def execute(self, query: Any) -> int:
+        self.log(str(query))
+        return 0
+
+    def transaction(self) -> FakeTransactionBackend:
+        return FakeTransactionBackend(self)
+
+
+class FakeBackend:
+    """A `databases` backend logging the statements sent over each connection."""
+
+    def __init__(self) -> None:
+        self.statements: list[tuple[int, str]] = []
+        self.checked_out = 0
+
+    def connection(self) -> FakeConnectionBackend:
+        return FakeConnectionBackend(self)
+
+
+@pytest.fixture
+def db() -> ServiceDatabase:
+    db = ServiceDatabase(read_dsns=["mysql://u:p@replica-0/db",
+                                    "mysql://u:p@replica-1/db"],
+                         write_dsn="mysql://u:p@primary/db",
+                         min_pool_size=1, max_pool_size=1, ssl=False,
+                         read_your_writes_window=5)
+    for pool in (db.write_pool, *db.read_pools):
+        pool._backend = FakeBackend()
+    return db
+
+
+def statements(pool) -> list[str]:
+    return [statement for _, statement in pool._backend.statements]
+
+
+async def test_reads_are_balanced_across_replicas(db: ServiceDatabase):
+    for _ in range(4):
+        await db.fetch_one("SELECT 1")
+
+    assert statements(db.write_pool) == []
+    for pool in db.read_pools:
+        assert statements(pool) == ["SELECT 1", "SELECT 1"]
+
+
+async def test_reads_follow_a_write_to_the_primary(db: ServiceDatabase):
+    await db.execute("UPDATE beatmaps SET bpm = 1")
+    await db.fetch_one("SELECT 1")
+
+    assert statements(db.write_pool) == ["UPDATE beatmaps SET bpm = 1",
+                                         "SELECT 1"]
+
+
+async def test_reads_follow_a_write_only_within_the_window(
+        db: ServiceDatabase, monkeypatch: pytest.MonkeyPatch):
+    await db.execute("UPDATE beatmaps SET bpm = 1")
+
+    monotonic = database.time.monotonic
+    monkeypatch.setattr(database.time, "monotonic", lambda: monotonic() + 6)
+    await db.fetch_one("SELECT 1")
+
+    assert statements(db.write_pool) == ["UPDATE beatmaps SET bpm = 1"]
+
+
+async def test_primary_reads(db: ServiceDatabase):
+    with db.primary_reads():
+        await db.fetch_one("SELECT 1")
+    await db.fetch_one("SELECT 2")
+
+    assert statements(db.write_pool) == ["SELECT 1"]
+
+
+async def test_transaction_queries_share_its_connection(db: ServiceDatabase):
+    # the context already holds a connection to the primary
+    with db.primary_reads():
+        await db.fetch_one("SELECT 1")
+
+    async with db.transaction():
+        await db.execute("INSERT INTO beatmapsets VALUES (1)")
+        await db.execute("INSERT INTO beatmaps VALUES (1)")
+        await db.fetch_one("SELECT 2")
+
+    [(_, first), *transaction] = db.write_pool._backend.statements
+    assert first == "SELECT 1"
+    assert [statement for _, statement in transaction] == [
+        "BEGIN",
+        "INSERT INTO beatmapsets VALUES (1)",
+        "INSERT INTO beatmaps VALUES (1)",
+        "SELECT 2",
+        "COMMIT",
+    ]
+    assert len({connection_id for connection_id, _ in transaction}) == 1
+
+
+async def test_transaction_rolls_back_on_error(db: ServiceDatabase):
+    with pytest.raises(ValueError):
+        async with db.transaction():
+            await db.execute("INSERT INTO beatmaps VALUES (1)")
+            raise ValueError
+
+    assert statements(db.write_pool) == ["BEGIN",
+                                         "INSERT INTO beatmaps VALUES (1)",
+                                         "ROLLBACK"]
+
+
+async def test_nested_transactions_share_the_outer_connection(db: ServiceDatabase):
+    async with db.transaction():
+        async with db.transaction():
+            await db.execute("INSERT INTO beatmaps VALUES (1)")
+
+    assert statements(db.write_pool) == ["BEGIN", "SAVEPOINT",
+                                         "INSERT INTO beatmaps VALUES (1)",
+                                         "COMMIT", "COMMIT"]
+    assert len({id for id, _ in db.write_pool._backend.statements}) == 1
+
+
+async def test_connections_are_returned_after_each_query(db: ServiceDatabase):
+    await db.fetch_one("SELECT 1")
+    await db.execute("UPDATE beatmaps SET bpm = 1")
+
+    for pool in (db.write_pool, *db.read_pools):
+        assert pool._backend.checked_out == 0
+
+
+async def test_connections_are_held_for_a_transaction(db: ServiceDatabase):
+    async with db.transaction():
+        await db.execute("INSERT INTO beatmaps VALUES (1)")
+        assert db.write_pool._backend.checked_out == 1
+
+    assert db.write_pool._backend.checked_out == 0
+
+
+def test_pool_stats_skip_pools_which_are_not_connected(db: ServiceDatabase):
+    assert db.pool_stats() == {}
+
+
+def test_pool_stats_survive_an_unexpected_layout(db: ServiceDatabase):
+    class Pool:
+        size, freesize, maxsize = 3, 1, 10
+
+    db.write_pool._backend._pool = Pool()
+    db.read_pools[0]._backend._pool = object()  # e.g. after an upgrade
+
+    assert db.pool_stats() == {"primary": {"size": 3, "free": 1, "max": 10}}
@@ -0,0 +1,102 @@
+import asyncio
+
+import httpx
+import pytest
+from app.services.osu_api import OsuAPIClient
+from app.services.osu_api import OsuAPIRequestError
+from benchmarks.osu_api_simulator import difficulty_count
+from benchmarks.osu_api_simulator import generate_beatmap
+from benchmarks.osu_api_simulator import OsuAPISimulator
+
+
+def _client(handler) -> OsuAPIClient:
+    return OsuAPIClient(client_id=1, client_secret="secret", scope="public",
+                        username="username", password="password",
+                        request_interval=0, max_requests_per_minute=60_000,
+                        base_url="http://osu-api.test",
+                        transport=httpx.MockTransport(handler))
+
+
+def _authorized(handler):
+    def wrapped(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/oauth/token":
+            return httpx.Response(200, json={"access_token": "token",
+                                             "expires_in": 86400})
+        return handler(request)
+    return wrapped
+
+
+async def test_batched_transport_errors_are_request_errors():
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("connection refused", request=request)
+
+    async with _client(_authorized(handler)) as client:
+        results = await asyncio.gather(
+            *(client.get_beatmap_batched(id) for id in (1, 2, 3)),
+            return_exceptions=True)
+
+    assert all(isinstance(result, OsuAPIRequestError) for result in results)
+
+
+async def test_batched_authorization_failures_are_request_errors():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(401)
+
+    async with _client(handler) as client:
+        with pytest.raises(OsuAPIRequestError) as exc_info:
+            await client.get_beatmap_batched(1)
+
+    assert exc_info.value.status_code == 401
+
+
+async def test_get_beatmapset(osu_api_client: OsuAPIClient):
+    beatmapset = await osu_api_client.get_beatmapset(123)
+
+    assert beatmapset["id"] == 123
+    assert [beatmap["id"] for beatmap in beatmapset["beatmaps"]] == \
+        [1230 + k for k in range(difficulty_count(123))]
+
+
+async def test_missing_beatmaps_are_not_found(osu_api_client: OsuAPIClient):
+    with pytest.raises(OsuAPIRequestError) as exc_info:
+        await osu_api_client.get_beatmap(1239)
+
+    assert exc_info.value.status_code == 404
+    assert await osu_api_client.get_beatmap_batched(1239) is None
+
+
+async def test_a_cold_lookup_by_checksum(osu_api_client: OsuAPIClient,
+                                         osu_api_simulator: OsuAPISimulator):
+    checksum = generate_beatmap(1230)["checksum"]
+
+    beatmap = await osu_api_client.lookup_beatmap(checksum)
+
+    assert beatmap["id"] == 1230
+    assert osu_api_simulator.requests[("/api/v2/beatmaps/lookup", 200)] == 1
+
+
+async def test_an_unknown_checksum_is_not_found(osu_api_client: OsuAPIClient):
+    with pytest.raises(OsuAPIRequestError) as exc_info:
+        await osu_api_client.lookup_beatmap("0" * 32)
+
+    assert exc_info.value.status_code == 404
+
+
+async def test_concurrent_beatmaps_are_fetched_in_one_request(
+        osu_api_client: OsuAPIClient, osu_api_simulator: OsuAPISimulator):
+    beatmaps = await asyncio.gather(
+        *(osu_api_client.get_beatmap_batched(id) for id in (1230, 1240, 1250)))
+
+    assert [beatmap["id"] for beatmap in beatmaps] == [1230, 1240, 1250]
+    assert osu_api_simulator.requests[("/api/v2/beatmaps", 200)] == 1
+
+
+async def test_rate_limited_requests_fail(osu_api_client: OsuAPIClient,
+                                          osu_api_simulator: OsuAPISimulator):
+    osu_api_simulator.max_requests_per_minute = 1
+    await osu_api_client.get_beatmapset(1)
+
+    with pytest.raises(OsuAPIRequestError) as exc_info:
+        await osu_api_client.get_beatmapset(2)
+
+    assert exc_info.value.status_code == 429
@@ -0,0 +1,91 @@
+import pytest
+from aioredis.exceptions import ConnectionError
+from app.services import rate_limit
+from app.services.rate_limit import LocalTokenBucket
+from app.services.rate_limit import RedisTokenBucket
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    return clock
+
+
+class UnavailableRedis:
+    async def eval(self, *args):
+        raise ConnectionError("redis is unavailable")
+
+
+class ReservingRedis:
+    def __init__(self, wait_us: int) -> None:
+        self.wait_us = wait_us
+        self.calls = []
+
+    async def eval(self, script, numkeys, key, rate, capacity):
+        self.calls.append((key, rate, capacity))
+        return self.wait_us
+
+
+def test_local_bucket_allows_a_burst_up_to_its_capacity(clock: Clock):
+    bucket = LocalTokenBucket(rate=1, capacity=3)
+
+    assert [bucket.reserve() for _ in range(3)] == [0, 0, 0]
+    assert bucket.reserve() == pytest.approx(1)
+
+
+def test_local_bucket_queues_reservations_in_order(clock: Clock):
+    bucket = LocalTokenBucket(rate=2, capacity=1)
+
+    waits = [bucket.reserve() for _ in range(4)]
+
+    assert waits == pytest.approx([0, 0.5, 1, 1.5])
+
+
+def test_local_bucket_refills_over_time(clock: Clock):
+    bucket = LocalTokenBucket(rate=1, capacity=2)
+    bucket.reserve()
+    bucket.reserve()
+
+    clock.now += 1
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(1)
+
+
+def test_local_bucket_does_not_refill_past_its_capacity(clock: Clock):
+    bucket = LocalTokenBucket(rate=1, capacity=2)
+
+    clock.now += 3600
+    assert [bucket.reserve() for _ in range(2)] == [0, 0]
+    assert bucket.reserve() == pytest.approx(1)
+
+
+async def test_redis_bucket_returns_the_reserved_wait():
+    redis = ReservingRedis(wait_us=250_000)
+    bucket = RedisTokenBucket(redis, key="rate-limit", rate=2, capacity=1)
+
+    assert await bucket.reserve() == 0.25
+    assert redis.calls == [("rate-limit", 2, 1)]
+
+
+async def test_redis_bucket_falls_back_to_a_local_bucket(clock: Clock):
+    bucket = RedisTokenBucket(UnavailableRedis(), key="rate-limit",
+                              rate=1, capacity=2)
+
+    waits = [await bucket.reserve() for _ in range(3)]
+
+    assert waits == pytest.approx([0, 0, 1])
+
+
+def test_create_rejects_unknown_backends():
+    with pytest.raises(ValueError):
+        rate_limit.create(backend="memcached", redis=None, key="rate-limit",
+                          rate=1, capacity=1)
@@ -0,0 +1,187 @@
+import asyncio
+from datetime import datetime
+from datetime import timedelta
+
+from app.common import background
+from app.common import cache
+from app.common import pins
+from app.common.errors import ServiceError
+from app.usecases import beatmaps
+from benchmarks.osu_api_simulator import beatmap_id_from_checksum
+from benchmarks.osu_api_simulator import generate_beatmap
+
+
+def stored_beatmap(beatmap_id: int, updated_at: datetime | None = None) -> dict:
+    updated_at = updated_at or datetime.now().replace(microsecond=0)
+    return {**beatmaps.beatmap_from_osu_api(generate_beatmap(beatmap_id)),
+            "created_at": datetime(2020, 1, 1), "updated_at": updated_at}
+
+
+def stored_beatmaps(query: str, values: dict) -> list[dict]:
+    beatmap_ids = [value if key.startswith("beatmap_id")
+                   else beatmap_id_from_checksum(value)
+                   for key, value in values.items()]
+    return [stored_beatmap(beatmap_id) for beatmap_id in beatmap_ids
+            if beatmap_id is not None]
+
+
+def md5(beatmap_id: int) -> str:
+    return generate_beatmap(beatmap_id)["checksum"]
+
+
+async def test_pinned_beatmaps_are_read_from_the_primary(fake_ctx, fake_db):
+    fake_db.rows = stored_beatmaps
+    await pins.pin(fake_ctx, "beatmaps", 11)
+
+    read = await beatmaps._read_through(fake_ctx, [10, 11])
+
+    assert set(read) == {10, 11}
+    [(_, replica_values, from_primary),
+     (_, primary_values, primary)] = fake_db.queries
+    assert not from_primary and replica_values == {"beatmap_id_0": 10,
+                                                   "beatmap_id_1": 11}
+    assert primary and primary_values == {"beatmap_id_0": 11}
+
+
+async def test_pinned_beatmaps_are_not_cached(fake_ctx, fake_db):
+    fake_db.rows = stored_beatmaps
+    await pins.pin(fake_ctx, "beatmaps", 11)
+
+    await beatmaps._read_through(fake_ctx, [10, 11])
+
+    cache.clear_local()
+    assert set(await cache.fetch_many(fake_ctx, "beatmaps", [10, 11])) == {10}
+
+
+async def test_lookup_reads_uncached_beatmaps_through_the_cache(fake_ctx, fake_db):
+    fake_db.rows = stored_beatmaps
+    await cache.store(fake_ctx, "beatmaps", 10, stored_beatmap(10), ttl=60)
+
+    results = await beatmaps.lookup(fake_ctx, beatmap_ids=[10, 11, 10],
+                                    md5_hashes=[])
+
+    assert list(results) == ["10", "11"]
+    [(_, values, _)] = fake_db.queries
+    assert values == {"beatmap_id_0": 11}
+    assert set(await cache.fetch_many(fake_ctx, "beatmaps", [11])) == {11}
+
+
+async def test_lookup_by_md5_prefers_cached_beatmaps(fake_ctx, fake_db):
+    fake_db.rows = stored_beatmaps
+    cached = {**stored_beatmap(10), "play_count": 123}
+    await cache.store(fake_ctx, "beatmaps", 10, cached, ttl=60)
+
+    results = await beatmaps.lookup(fake_ctx, beatmap_ids=[],
+                                    md5_hashes=[md5(10), md5(11)])
+
+    assert results[md5(10)]["play_count"] == 123
+    assert results[md5(11)]["beatmap_id"] == 11
+    assert set(await cache.fetch_many(fake_ctx, "beatmaps", [11])) == {11}
+
+
+async def test_lookup_by_md5_rereads_pinned_beatmaps_from_the_primary(
+        fake_ctx, fake_db):
+    fake_db.rows = stored_beatmaps
+    await pins.pin(fake_ctx, "beatmaps", 11)
+
+    results = await beatmaps.lookup(fake_ctx, beatmap_ids=[],
+                                    md5_hashes=[md5(11)])
+
+    assert results[md5(11)]["beatmap_id"] == 11
+    [_, (_, values, primary)] = fake_db.queries
+    assert primary and values == {"beatmap_id_0": 11}
+    assert await cache.fetch_many(fake_ctx, "beatmaps", [11]) == {}
+
+
+async def test_lookup_falls_back_to_the_osu_api(fake_ctx, fake_db):
+    results = await beatmaps.lookup(fake_ctx, beatmap_ids=[10],
+                                    md5_hashes=[md5(20)])
+
+    assert results["10"]["beatmap_id"] == 10
+    assert results[md5(20)]["beatmap_id"] == 20
+    assert [query.split()[0] for query, _, _ in fake_db.queries
+            if not query.startswith("SELECT")] == ["INSERT", "INSERT"]
+
+
+async def test_lookup_limits_the_number_of_keys(fake_ctx, monkeypatch):
+    monkeypatch.setattr(beatmaps.settings, "BEATMAPS_LOOKUP_MAX_KEYS", 2)
+
+    results = await beatmaps.lookup(fake_ctx, beatmap_ids=[1, 2],
+                                    md5_hashes=[md5(10)])
+
+    assert results is ServiceError.BEATMAPS_TOO_MANY_KEYS
+
+
+def expired(monkeypatch, ago: timedelta) -> None:
+    monkeypatch.setattr(beatmaps, "expires_at",
+                        lambda beatmap: datetime.now() - ago)
+
+
+async def test_stale_beatmaps_are_served_while_revalidated(
+        fake_ctx, fake_db, monkeypatch):
+    expired(monkeypatch, timedelta(minutes=5))
+    stale = {**stored_beatmap(10), "play_count": 123}
+    await cache.store(fake_ctx, "beatmaps", 10, stale, ttl=60)
+
+    beatmap = await beatmaps.fetch_one(fake_ctx, 10)
+
+    assert beatmap["play_count"] == 123
+    assert fake_db.queries == []
+
+    await asyncio.gather(*background._tasks)
+    [(query, values, _)] = fake_db.queries
+    assert query.startswith("INSERT INTO beatmaps")
+    assert values["created_at_0"] == datetime(2020, 1, 1)
+    refreshed = await cache.fetch_one(fake_ctx, "beatmaps", 10)
+    assert refreshed["play_count"] != 123
+
+
+async def test_too_stale_beatmaps_are_refreshed_first(
+        fake_ctx, fake_db, monkeypatch):
+    max_staleness = beatmaps.settings.BEATMAPS_MAX_STALENESS
+    expired(monkeypatch, timedelta(seconds=max_staleness + 60))
+    stale = {**stored_beatmap(10), "play_count": 123}
+    await cache.store(fake_ctx, "beatmaps", 10, stale, ttl=60)
+
+    beatmap = await beatmaps.fetch_one(fake_ctx, 10)
+
+    assert beatmap["play_count"] != 123
+    assert beatmap["created_at"] == datetime(2020, 1, 1)
+    assert not background._tasks
+
+
+async def test_stale_beatmaps_are_refreshed_first_unless_enabled(
+        fake_ctx, monkeypatch):
+    monkeypatch.setattr(beatmaps.settings, "STALE_WHILE_REVALIDATE", False)
+    expired(monkeypatch, timedelta(minutes=5))
+    stale = {**stored_beatmap(10), "play_count": 123}
+    await cache.store(fake_ctx, "beatmaps", 10, stale, ttl=60)
+
+    beatmap = await beatmaps.fetch_one(fake_ctx, 10)
+
+    assert beatmap["play_count"] != 123
+    assert not background._tasks
+
+
+async def test_cached_beatmaps_are_served_without_a_query(fake_ctx, fake_db):
+    cached = {**stored_beatmap(10), "play_count": 123}
+    await cache.store(fake_ctx, "beatmaps", 10, cached, ttl=60)
+    cache.clear_local()  # served by redis
+
+    beatmap = await beatmaps.fetch_one(fake_ctx, 10)
+
+    assert beatmap == cached
+    assert fake_db.queries == []
+
+
+async def test_uncached_beatmaps_are_read_through(fake_ctx, fake_db):
+    fake_db.rows = stored_beatmaps
+
+    beatmap = await beatmaps.fetch_one(fake_ctx, 10)
+
+    assert beatmap["beatmap_id"] == 10
+    assert await cache.fetch_one(fake_ctx, "beatmaps", 10) == beatmap
+
+    fake_db.queries.clear()
+    assert await beatmaps.fetch_one(fake_ctx, 10) == beatmap
+    assert fake_db.queries == []
@@ -0,0 +1,58 @@
+from datetime import datetime
+
+from app.common import cache
+from app.usecases import beatmaps
+from app.usecases import beatmapsets
+from benchmarks.osu_api_simulator import generate_beatmap
+
+# set 5 has 5 difficulties, 50 to 54
+BEATMAPSET_ID = 5
+BEATMAP_IDS = [50, 51, 52, 53, 54]
+
+
+def writes(fake_db) -> list[tuple[str, dict, bool]]:
+    return [(query, values, primary) for query, values, primary
+            in fake_db.queries if not query.startswith("SELECT")]
+
+
+async def test_sets_are_written_in_one_transaction(fake_ctx, fake_db):
+    beatmapset = await beatmapsets.refresh(fake_ctx, BEATMAPSET_ID)
+
+    assert beatmapset["beatmapset_id"] == BEATMAPSET_ID
+    assert fake_db.transactions == 1
+    [(mapset_query, _, _), (map_query, map_values, _)] = writes(fake_db)
+    assert mapset_query.startswith("INSERT INTO beatmapsets")
+    assert map_query.startswith("INSERT INTO beatmaps")
+    assert [map_values[f"beatmap_id_{i}"]
+            for i in range(len(BEATMAP_IDS))] == BEATMAP_IDS
+
+
+async def test_refreshed_sets_keep_their_created_at(fake_ctx, fake_db):
+    created_at = datetime(2020, 1, 1)
+    current = {"beatmapset_id": BEATMAPSET_ID, "created_at": created_at}
+
+    beatmapset = await beatmapsets.refresh(fake_ctx, BEATMAPSET_ID, current)
+
+    assert beatmapset["created_at"] == created_at
+    [(_, mapset_values, _), _] = writes(fake_db)
+    assert mapset_values["created_at"] == created_at
+
+
+async def test_only_cached_difficulties_are_recached(fake_ctx, fake_db):
+    created_at = datetime(2020, 1, 1)
+    for beatmap_id in (50, 51):
+        cached = {**beatmaps.beatmap_from_osu_api(generate_beatmap(beatmap_id)),
+                  "created_at": created_at, "updated_at": created_at}
+        await cache.store(fake_ctx, "beatmaps", beatmap_id, cached, ttl=60)
+
+    await beatmapsets.refresh(fake_ctx, BEATMAPSET_ID)
+
+    [_, (_, map_values, _)] = writes(fake_db)
+    assert map_values["created_at_0"] == created_at
+    assert map_values["created_at_2"] != created_at
+
+    cache.clear_local()
+    rows = await cache.fetch_many(fake_ctx, "beatmaps", BEATMAP_IDS)
+    assert set(rows) == {50, 51}
+    assert rows[50]["created_at"] == created_at
+    assert rows[50]["updated_at"] != created_at
@@ -0,0 +1,117 @@
+import asyncio
+from datetime import datetime
+from datetime import timedelta
+
+import pytest
+from app.common import settings
+from app.usecases import exports
+
+T0 = datetime(2022, 1, 1)
+
+
+class ExportableRepo:
+    def __init__(self, rows: list[dict]) -> None:
+        self.rows = rows
+        self.reads: list[tuple] = []
+
+    async def fetch_last_updated_at(self) -> datetime | None:
+        return max((row["updated_at"] for row in self.rows), default=None)
+
+    async def fetch_many(self, *, updated_since, sort_by, after, page_size):
+        self.reads.append((sort_by, after))
+        rows = sorted((row for row in self.rows
+                       if updated_since is None or
+                       row["updated_at"] >= updated_since),
+                      key=lambda row: (row[sort_by], row["id"]))
+        if after is not None:
+            rows = [row for row in rows if (row[sort_by], row["id"]) > after]
+        return rows[:page_size]
+
+
+def rows(n: int) -> list[dict]:
+    return [{"id": id, "updated_at": T0 + timedelta(seconds=n - id)}
+            for id in range(1, n + 1)]
+
+
+async def collect(chunks) -> list[list[dict]]:
+    return [chunk async for chunk in chunks]
+
+
+async def test_full_export_reads_chunks_by_keyset():
+    repo = ExportableRepo(rows(5))
+
+    chunks = await collect(exports.export(repo, "id", updated_since=None,
+                                          chunk_size=2))
+
+    assert [[row["id"] for row in chunk] for chunk in chunks] == [[1, 2],
+                                                                  [3, 4],
+                                                                  [5]]
+    assert repo.reads == [("id", None), ("id", (2, 2)), ("id", (4, 4))]
+
+
+async def test_an_exact_multiple_ends_on_an_empty_chunk():
+    repo = ExportableRepo(rows(4))
+
+    chunks = await collect(exports.export(repo, "id", updated_since=None,
+                                          chunk_size=2))
+
+    assert [len(chunk) for chunk in chunks] == [2, 2]
+    assert len(repo.reads) == 3
+
+
+async def test_incremental_export_follows_updated_at():
+    repo = ExportableRepo(rows(5))
+
+    chunks = await collect(exports.export(
+        repo, "id", updated_since=T0 + timedelta(seconds=2), chunk_size=2))
+
+    # the most recently updated rows are those with the lowest ids
+    assert [[row["id"] for row in chunk] for chunk in chunks] == [[3, 2], [1]]
+    assert [sort_by for sort_by, _ in repo.reads] == ["updated_at"] * 2
+
+
+async def test_the_next_chunk_is_read_ahead():
+    repo = ExportableRepo(rows(5))
+    chunks = exports.export(repo, "id", updated_since=None, chunk_size=2)
+
+    await chunks.__anext__()
+    await asyncio.sleep(0)
+
+    assert len(repo.reads) == 2
+    await chunks.aclose()
+
+
+async def test_stopping_early_cancels_the_read_ahead():
+    repo = ExportableRepo(rows(5))
+    started = asyncio.Event()
+
+    async def fetch_many(**kwargs):
+        if kwargs["after"] is not None:
+            started.set()
+            await asyncio.sleep(60)
+        return await ExportableRepo.fetch_many(repo, **kwargs)
+
+    repo.fetch_many = fetch_many
+    chunks = exports.export(repo, "id", updated_since=None, chunk_size=2)
+
+    await chunks.__anext__()
+    await started.wait()
+    await asyncio.wait_for(chunks.aclose(), timeout=1)
+
+    tasks = [task for task in asyncio.all_tasks()
+             if task is not asyncio.current_task()]
+    await asyncio.sleep(0)
+    assert all(task.done() for task in tasks)
+
+
+async def test_watermark_is_floored_and_set_back_by_the_margin():
+    repo = ExportableRepo([{"id": 1, "updated_at": T0.replace(microsecond=5)}])
+
+    watermark = await exports.watermark(repo)
+
+    assert watermark == T0 - \
+        timedelta(seconds=settings.EXPORT_WATERMARK_MARGIN)
+
+
+async def test_no_watermark_without_rows():
+    assert await exports.watermark(ExportableRepo([])) is None
@@ -0,0 +1,138 @@
+from datetime import datetime
+from datetime import timedelta
+
+import pytest
+from app.common import access
+from app.common import settings
+from app.usecases import beatmaps
+from app.usecases import beatmapsets
+from app.workers import refresher
+from benchmarks.osu_api_simulator import generate_beatmap
+from benchmarks.osu_api_simulator import generate_beatmapset
+
+CREATED_AT = datetime(2020, 1, 1)
+
+
+class Tracker:
+    """Stands in for the access counts in redis."""
+
+    def __init__(self, monkeypatch: pytest.MonkeyPatch,
+                 most_accessed: list[int]) -> None:
+        self.most_accessed = most_accessed
+        self.forgotten: list[int] = []
+        monkeypatch.setattr(access, "fetch_most_accessed",
+                            self.fetch_most_accessed)
+        monkeypatch.setattr(access, "forget", self.forget)
+
+    async def fetch_most_accessed(self, ctx, namespace, limit):
+        return self.most_accessed[:limit]
+
+    async def forget(self, ctx, namespace, *ids):
+        self.forgotten.extend(ids)
+
+
+# ids we don't store
+UNKNOWN_ID = 404
+
+
+def stored_beatmap(beatmap_id: int) -> dict:
+    # we store beatmap 12, but set 1 only has 2 difficulties upstream
+    osu_beatmap = generate_beatmap(10 if beatmap_id == 12 else beatmap_id)
+    return {**beatmaps.beatmap_from_osu_api(osu_beatmap),
+            "beatmap_id": beatmap_id,
+            "created_at": CREATED_AT, "updated_at": CREATED_AT}
+
+
+def stored_beatmapset(beatmapset_id: int) -> dict:
+    osu_beatmapset = generate_beatmapset(beatmapset_id)
+    return {**beatmapsets.beatmapset_from_osu_api(osu_beatmapset),
+            "created_at": CREATED_AT, "updated_at": CREATED_AT}
+
+
+def stored_rows(query: str, values: dict) -> list[dict]:
+    stored = stored_beatmapset if "FROM beatmapsets" in query else stored_beatmap
+    return [stored(id) for id in values.values() if id != UNKNOWN_ID]
+
+
+def due(monkeypatch: pytest.MonkeyPatch, module, *ids: int) -> None:
+    """Have the given rows expire within the lookahead, & others much later."""
+    id_column = "beatmapset_id" if module is beatmapsets else "beatmap_id"
+    soon = datetime.now() + timedelta(minutes=1)
+    later = datetime.now() + timedelta(days=30)
+    monkeypatch.setattr(module, "expires_at",
+                        lambda row: soon if row[id_column] in ids else later)
+
+
+def written_ids(fake_db, table: str, id_column: str) -> list[int]:
+    return [value for query, values, _ in fake_db.queries
+            if query.startswith(f"INSERT INTO {table} ")
+            for key, value in values.items()
+            if key == id_column or key.startswith(f"{id_column}_")]
+
+
+def test_request_budget_is_a_share_of_the_rate_limit(monkeypatch):
+    monkeypatch.setattr(settings, "OSU_API_MAX_REQUESTS_PER_MINUTE", 600)
+    monkeypatch.setattr(settings, "REFRESHER_INTERVAL", 60)
+    monkeypatch.setattr(settings, "REFRESHER_BUDGET_SHARE", 0.25)
+
+    assert refresher._request_budget() == 150
+
+
+async def test_only_due_beatmapsets_are_refreshed(fake_ctx, fake_db,
+                                                  monkeypatch):
+    fake_db.rows = stored_rows
+    Tracker(monkeypatch, most_accessed=[5, 1, 3])
+    due(monkeypatch, beatmapsets, 5, 3)
+
+    spent = await refresher._refresh_beatmapsets(fake_ctx, budget=10)
+
+    assert spent == 2
+    assert written_ids(fake_db, "beatmapsets", "beatmapset_id") == [5, 3]
+
+
+async def test_the_most_accessed_beatmapsets_are_refreshed_first(
+        fake_ctx, fake_db, monkeypatch):
+    fake_db.rows = stored_rows
+    Tracker(monkeypatch, most_accessed=[5, 1, 3])
+    due(monkeypatch, beatmapsets, 5, 1, 3)
+
+    spent = await refresher._refresh_beatmapsets(fake_ctx, budget=2)
+
+    assert spent == 2
+    assert written_ids(fake_db, "beatmapsets", "beatmapset_id") == [5, 1]
+
+
+async def test_beatmapsets_we_dont_have_are_forgotten(fake_ctx, fake_db,
+                                                      monkeypatch):
+    fake_db.rows = stored_rows
+    tracker = Tracker(monkeypatch, most_accessed=[UNKNOWN_ID, 1])
+    due(monkeypatch, beatmapsets)
+
+    await refresher._refresh_beatmapsets(fake_ctx, budget=10)
+
+    assert tracker.forgotten == [UNKNOWN_ID]
+
+
+async def test_due_beatmaps_are_refreshed_in_batches(fake_ctx, fake_db,
+                                                     monkeypatch):
+    monkeypatch.setattr(refresher, "BEATMAPS_PER_REQUEST", 2)
+    fake_db.rows = stored_rows
+    Tracker(monkeypatch, most_accessed=[10, 50, 11, 51, 30])
+    due(monkeypatch, beatmaps, 10, 11, 51, 30)
+
+    spent = await refresher._refresh_beatmaps(fake_ctx, budget=1)
+
+    assert spent == 1
+    assert written_ids(fake_db, "beatmaps", "beatmap_id") == [10, 11]
+
+
+async def test_beatmaps_the_osu_api_no_longer_has_are_forgotten(
+        fake_ctx, fake_db, monkeypatch):
+    fake_db.rows = stored_rows
+    tracker = Tracker(monkeypatch, most_accessed=[UNKNOWN_ID, 10, 12])
+    due(monkeypatch, beatmaps, 10, 12)
+
+    await refresher._refresh_beatmaps(fake_ctx, budget=10)
+
+    assert written_ids(fake_db, "beatmaps", "beatmap_id") == [10]
+    assert tracker.forgotten == [UNKNOWN_ID, 12]
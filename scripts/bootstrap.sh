@@ -32,6 +32,10 @@ case $APP_COMPONENT in
     exec /scripts/run-api.sh
     ;;
 
+  "refresher")
+    exec /scripts/run-refresher.sh
+    ;;
+
   *)
     echo "'$APP_COMPONENT' is not a known value for APP_COMPONENT"
     ;;
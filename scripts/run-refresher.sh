@@ -0,0 +1,9 @@
+#!/usr/bin/env bash
+set -euo pipefail
+
+if [ -z "$APP_ENV" ]; then
+  echo "Please set APP_ENV"
+  exit 1
+fi
+
+exec python -m app.refresher_boot